@@ -0,0 +1,108 @@
+"""
+Size and time of the package archive compressions.
+
+Packs a folder (an installed package, by default the Python standard library
+as a stand-in for a large SDK) with the former single-threaded ``tarfile``
+gzip, then with the parallel gzip writer (one thread and all cores) and,
+when ``zstandard`` is installed, with zstd. Each archive is read back to
+check it.
+
+Usage: python benchmark/archive_compression.py [--path <package folder>]
+       [--level 6] [--threads 0] [--zstd-levels 3,10]
+"""
+
+import argparse
+import os
+import sys
+import sysconfig
+import tarfile
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from depmanager.api.internal.compression import (
+    Compression,
+    open_tar_file,
+    zstd_available,
+)
+
+
+def files_of(folder: Path):
+    return sorted(content for content in folder.rglob("*") if content.is_file())
+
+
+def legacy_pack(folder: Path, archive: Path, level: int):
+    with tarfile.open(archive, "w:gz", compresslevel=level) as tar:
+        for content in files_of(folder):
+            tar.add(content, arcname=content.relative_to(folder))
+
+
+def pack(folder: Path, archive: Path, compression: Compression):
+    with open(archive, "wb") as fp, compression.writer(fp) as writer, tarfile.open(
+        fileobj=writer, mode="w|"
+    ) as tar:
+        for content in files_of(folder):
+            tar.add(content, arcname=content.relative_to(folder))
+
+
+def measure(label: str, archive: Path, run, raw_size: int):
+    start = perf_counter()
+    run()
+    elapsed = perf_counter() - start
+    with open_tar_file(archive) as tar:
+        count = sum(1 for member in tar if member.isfile())
+    size = archive.stat().st_size
+    print(
+        f"{label:<24} {elapsed:7.2f} s {raw_size / elapsed / 1024**2:8.1f} MiB/s"
+        f" {size / 1024**2:9.1f} MiB  ratio {raw_size / size:5.2f}  ({count} files)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--path", type=Path, default=Path(sysconfig.get_path("stdlib")))
+    parser.add_argument("--level", type=int, default=6)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--zstd-levels", type=str, default="3,10")
+    args = parser.parse_args()
+    folder = args.path.resolve()
+    raw_size = sum(content.stat().st_size for content in files_of(folder))
+    threads = args.threads or os.cpu_count()
+    print(f"{folder}: {raw_size / 1024**2:.1f} MiB, {threads} threads")
+    with TemporaryDirectory() as tmp:
+        archive = Path(tmp) / "package.tgz"
+        measure(
+            "tarfile w:gz",
+            archive,
+            lambda: legacy_pack(folder, archive, args.level),
+            raw_size,
+        )
+        measure(
+            "parallel gzip, 1 thread",
+            archive,
+            lambda: pack(folder, archive, Compression("gzip", args.level, 1)),
+            raw_size,
+        )
+        measure(
+            f"parallel gzip, {threads} thr.",
+            archive,
+            lambda: pack(folder, archive, Compression("gzip", args.level, threads)),
+            raw_size,
+        )
+        if not zstd_available():
+            print("zstd: zstandard not installed, skipped.")
+            return
+        archive = Path(tmp) / "package.tar.zst"
+        for level in [int(level) for level in args.zstd_levels.split(",")]:
+            measure(
+                f"zstd -{level}, {threads} thr.",
+                archive,
+                lambda: pack(folder, archive, Compression("zstd", level, threads)),
+                raw_size,
+            )
+
+
+if __name__ == "__main__":
+    main()
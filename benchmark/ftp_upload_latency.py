@@ -0,0 +1,75 @@
+"""
+Upload latency of ``RemoteDatabaseFtp`` against a local FTP server.
+
+Starts a pyftpdlib server on localhost (``pip install pyftpdlib``) and pushes
+small packages, each in its own ``name/`` directory. With ``--no-cache`` the
+directory listing cache is dropped before each upload, which mimics the former
+behaviour of listing the remote tree on every upload.
+
+Usage: python benchmark/ftp_upload_latency.py [--count 100] [--no-cache]
+"""
+
+import argparse
+import sys
+import threading
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from depmanager.api.internal.database_remote_ftp import RemoteDatabaseFtp
+
+
+def start_server(root: Path):
+    """
+    Start an FTP server serving the given folder.
+    :param root: Folder to serve.
+    :return: The server and its port.
+    """
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("bench", "bench", str(root), perm="elradfmwMT")
+    handler = FTPHandler
+    handler.authorizer = authorizer
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+    with TemporaryDirectory() as tmp:
+        root = Path(tmp) / "ftp"
+        root.mkdir()
+        server, port = start_server(root)
+        archive = Path(tmp) / "archive.tgz"
+        archive.write_bytes(b"x" * 4096)
+        remote = RemoteDatabaseFtp("127.0.0.1", port, user="bench", cred="bench")
+        remote.connect()
+        latencies = []
+        start = perf_counter()
+        for i in range(args.count):
+            if args.no_cache:
+                remote.dir_cache.clear()
+            begin = perf_counter()
+            remote.send_file(archive, f"lib{i}/{i:040d}.tgz")
+            latencies.append(perf_counter() - begin)
+        total = perf_counter() - start
+        server.close_all()
+    latencies.sort()
+    print(f"uploads: {args.count}, listing cache: {not args.no_cache}")
+    print(f"total: {total * 1000:.1f} ms")
+    print(f"mean: {total / args.count * 1000:.2f} ms")
+    print(f"p50: {latencies[len(latencies) // 2] * 1000:.2f} ms")
+    print(f"p95: {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Download throughput of ``RemoteDatabaseServer`` against a local HTTP server.
+
+Serves a generated file of the given size from a local HTTP server and
+downloads it twice: once with the former path (``iter_content`` by 1 KiB
+chunks, a progress update per chunk) and once with
+``RemoteDatabaseServer.download`` (large reusable buffer, throttled progress).
+Both report progress into a rich progress bar, as ``pull`` does.
+
+Usage: python benchmark/http_download_throughput.py [--size-gb 2]
+"""
+
+import argparse
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from requests import get as http_get
+from rich.progress import BarColumn, DownloadColumn, Progress, TransferSpeedColumn
+
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+
+block = b"\x5a" * (4 * 1024 * 1024)
+
+
+def make_handler(size: int):
+    """
+    Create a request handler serving ``size`` bytes on any path.
+    :param size: Size of the served file.
+    :return: The handler class.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(size))
+            self.end_headers()
+            remaining = size
+            view = memoryview(block)
+            while remaining > 0:
+                count = min(remaining, len(block))
+                self.wfile.write(view[:count])
+                remaining -= count
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def legacy_download(url: str, file_name: Path, callback):
+    resp = http_get(url)
+    total_size = int(resp.headers.get("content-length", 0))
+    with open(file_name, "wb") as fp:
+        for chunk in resp.iter_content(chunk_size=1024):
+            fp.write(chunk)
+            callback(len(chunk), total_size)
+
+
+def timed(label: str, size: int, run):
+    with Progress(BarColumn(), DownloadColumn(), TransferSpeedColumn()) as progress:
+        task = progress.add_task(label, total=size)
+
+        def callback(advance: int, total: int):
+            progress.update(task, advance=advance, total=total)
+
+        start = perf_counter()
+        run(callback)
+        elapsed = perf_counter() - start
+    print(f"{label}: {elapsed:.2f} s, {size / elapsed / 1024 ** 2:.0f} MiB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-gb", type=float, default=2.0)
+    args = parser.parse_args()
+    size = int(args.size_gb * 1024**3)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(size))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    remote = RemoteDatabaseServer("127.0.0.1", port)
+    with TemporaryDirectory() as tmp:
+        target = Path(tmp) / "archive.tgz"
+        timed(
+            "iter_content(1024)",
+            size,
+            lambda cb: legacy_download(f"http://127.0.0.1:{port}/a.tgz", target, cb),
+        )
+        target.unlink()
+        timed(
+            "download()",
+            size,
+            lambda cb: remote.download("/a.tgz", target, cb),
+        )
+        assert target.stat().st_size == size
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
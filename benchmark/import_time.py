@@ -0,0 +1,106 @@
+"""
+Start time of the command line and the modules it imports.
+
+Runs ``depmanager info --raw basedir`` (or the given command) several times
+in a fresh DEPMANAGER_HOME, the daemon disabled, and reports the best wall
+time next to the one of a bare interpreter. One more run under
+``python -X importtime`` lists the slowest depmanager modules and checks that
+the heavy dependencies (rich, requests, cryptography, ftplib, http.server)
+are not loaded. Exits with 1 if the time exceeds the limit or a heavy
+dependency is imported: it can guard the start time in CI.
+
+Usage: python benchmark/import_time.py [--runs 10] [--max-ms 100] [--top 10]
+       [-- command ...]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+source = Path(__file__).resolve().parent.parent / "src"
+
+# Modules a fast command must not load.
+heavy_modules = ["rich", "requests", "cryptography", "ftplib", "http.server"]
+
+
+def best_time(command: list, env: dict, runs: int):
+    best = None
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run(command, env=env, check=True, capture_output=True)
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def import_times(command: list, env: dict):
+    """
+    Parse the ``-X importtime`` report: module -> (self, cumulative) in us.
+    """
+    report = subprocess.run(
+        [sys.executable, "-X", "importtime"] + command[1:],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_time), int(cumulative))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=100.0)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("command", nargs="*", default=["info", "--raw", "basedir"])
+    args = parser.parse_args()
+    command = [sys.executable, "-m", "depmanager.manager"] + args.command
+    failed = False
+    with TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env["DEPMANAGER_HOME"] = tmp
+        env["DEPMANAGER_NO_DAEMON"] = "1"
+        env["PYTHONPATH"] = os.pathsep.join(
+            [str(source)] + [path for path in [env.get("PYTHONPATH")] if path]
+        )
+        # the first run creates the configuration.
+        subprocess.run(command, env=env, check=True, capture_output=True)
+        bare = best_time([sys.executable, "-c", "pass"], env, args.runs)
+        elapsed = best_time(command, env, args.runs)
+        print(f"{' '.join(['depmanager'] + args.command)}")
+        print(f"{'interpreter alone':<24} {bare * 1000:7.1f} ms")
+        print(f"{'command':<24} {elapsed * 1000:7.1f} ms (limit {args.max_ms:.0f} ms)")
+        if elapsed * 1000 > args.max_ms:
+            print("FAIL: the command exceeds the time limit.")
+            failed = True
+        modules = import_times(command, env)
+    ours = sorted(
+        (item for item in modules.items() if item[0].startswith("depmanager")),
+        key=lambda item: item[1][1],
+        reverse=True,
+    )
+    print(f"{len(modules)} modules imported, slowest depmanager ones (cumulative):")
+    for name, (self_time, cumulative) in ours[: args.top]:
+        print(
+            f"  {name:<44} {cumulative / 1000:7.1f} ms  (self {self_time / 1000:.1f})"
+        )
+    loaded = [name for name in heavy_modules if name in modules]
+    if loaded:
+        print(f"FAIL: heavy modules imported: {', '.join(loaded)}.")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
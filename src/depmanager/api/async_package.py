@@ -0,0 +1,250 @@
+"""
+Asynchronous manager for package.
+"""
+
+import asyncio
+from pathlib import Path
+
+from depmanager.api.internal.messaging import log
+from depmanager.api.package import PackageManager
+
+
+class AsyncPackageManager:
+    """
+    Asynchronous manager for package.
+
+    Transfers with the remotes run concurrently on the event loop, the
+    modifications of the local database are serialized.
+    """
+
+    def __init__(self, system=None, max_concurrency: int = 4):
+        from depmanager.api.internal.system import LocalSystem
+        from depmanager.api.local import LocalManager
+
+        if type(system) is LocalSystem:
+            self.__sys = system
+        elif type(system) is LocalManager:
+            self.__sys = system.get_sys()
+        else:
+            self.__sys = LocalSystem()
+        self.max_concurrency = max(1, max_concurrency)
+        self.pacman = PackageManager(self.__sys)
+        self.__clients = {}
+        self.__local_lock = None
+        self.__pending = {}
+        # pending install -> the pending installs it waits for.
+        self.__waits = {}
+
+    def _local_lock(self):
+        # one lock per event loop: each asyncio.run() has its own.
+        loop = asyncio.get_running_loop()
+        if self.__local_lock is None or self.__local_lock[0] is not loop:
+            self.__local_lock = (loop, asyncio.Lock())
+        return self.__local_lock[1]
+
+    def _remote_name(self, remote_name: str):
+        if remote_name == "default":
+            return self.__sys.default_remote
+        return remote_name
+
+    def get_client(self, remote_name: str):
+        """
+        Get the asynchronous client of a remote.
+        :param remote_name: The remote's name.
+        :return: The client or None.
+        """
+        from depmanager.api.internal.database_remote_server import (
+            RemoteDatabaseServer,
+        )
+        from depmanager.api.internal.database_remote_server_async import (
+            AsyncRemoteDatabaseServer,
+        )
+
+        remote_name = self._remote_name(remote_name)
+        if remote_name not in self.__sys.remote_database:
+            log.error(f"no remote named {remote_name} found.")
+            return None
+        if remote_name not in self.__clients:
+            remote = self.__sys.remote_database[remote_name]
+            if not isinstance(remote, RemoteDatabaseServer):
+                log.error(
+                    f"remote {remote_name} is not a server remote, no asynchronous access."
+                )
+                return None
+            self.__clients[remote_name] = AsyncRemoteDatabaseServer(
+                remote, self.max_concurrency
+            )
+        return self.__clients[remote_name]
+
+    async def query(self, query, remote_name: str = ""):
+        """
+        Do a query into database.
+        :param query: Query's data.
+        :param remote_name: Remote's name to search of empty for local.
+        :return: List of packages matching the query.
+        """
+        remote_name = self._remote_name(remote_name)
+        if remote_name in self.__sys.remote_database:
+            client = self.get_client(remote_name)
+            if client is None:
+                return []
+            await client.query()
+        return self.pacman.query(query, remote_name)
+
+    async def _install(self, file: Path):
+        async with self._local_lock():
+            await asyncio.to_thread(self.pacman.add_from_location, file)
+        file.unlink(missing_ok=True)
+
+    async def add_from_remote(self, dep, remote_name: str):
+        """
+        Get a package and its dependencies from remote to local.
+        :param dep: The dependency to get.
+        :param remote_name: The remote server to use.
+        :return: True if success.
+        """
+        remote_name = self._remote_name(remote_name)
+        client = self.get_client(remote_name)
+        if client is None:
+            return False
+        finds = await client.query(dep)
+        if len(finds) != 1:
+            log.error(
+                f"{len(finds)} packages match the request, only one package per pull allowed."
+            )
+            return False
+        return await self.__add(client, finds[0], remote_name)
+
+    def __waits_for(self, key: str, other: str):
+        """
+        Check if a pending install waits, even indirectly, for another one.
+        :param key: The key of the pending install.
+        :param other: The key of the other install.
+        :return: True if waiting for it.
+        """
+        seen = set()
+        stack = [key]
+        while len(stack) > 0:
+            current = stack.pop()
+            if current == other:
+                return True
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(self.__waits.get(current, []))
+        return False
+
+    async def __add(self, client, depp, remote_name: str, parent: str = None):
+        key = f"{remote_name}:{depp.properties.hash()}:{depp.properties.build_date}"
+        if parent is not None:
+            if self.__waits_for(key, parent):
+                # a dependency cycle: the package is being installed and waits
+                # for this one.
+                log.warn(
+                    f"WARNING: dependency cycle on {depp.properties.get_as_str()}."
+                )
+                return True
+            self.__waits.setdefault(parent, set()).add(key)
+        if key not in self.__pending:
+            future = asyncio.ensure_future(
+                self.__pull_and_install(client, depp, remote_name, key)
+            )
+            self.__pending[key] = future
+            # forgotten once done: a later request pulls the package again.
+            future.add_done_callback(lambda _: self.__pending.pop(key, None))
+        return await self.__pending[key]
+
+    async def __pull_and_install(self, client, depp, remote_name: str, key: str):
+        tasks = []
+        try:
+            for sub_dep in depp.get_dependency_list():
+                if len(self.pacman.query(sub_dep)) != 0:
+                    continue
+                sub_matches = await client.query(sub_dep)
+                if len(sub_matches) == 0:
+                    log.error(
+                        f"Cannot find dependency {sub_dep['name']}/{sub_dep['version']} on remote {remote_name}."
+                    )
+                    continue
+                tasks.append(
+                    asyncio.ensure_future(
+                        self.__add(client, sub_matches[0], remote_name, key)
+                    )
+                )
+            file = await client.pull(depp, self.__sys.temp_path)
+        finally:
+            # the dependencies are awaited, even when the pull failed.
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            self.__waits.pop(key, None)
+        if file is None:
+            log.error(f"Cannot pull {depp.properties.get_as_str()}.")
+            return False
+        await self._install(file)
+        return all(result is True for result in results)
+
+    async def add_many_from_remote(self, deps: list, remote_name: str):
+        """
+        Get several packages from remote to local concurrently.
+        :param deps: The dependencies to get.
+        :param remote_name: The remote server to use.
+        :return: List of success flags.
+        """
+        return await asyncio.gather(
+            *[self.add_from_remote(dep, remote_name) for dep in deps]
+        )
+
+    async def add_to_remote(self, dep, remote_name: str, force: bool = False):
+        """
+        Send a package from local to remote.
+        :param dep: The dependency to send.
+        :param remote_name: The remote server to use.
+        :param force: If true, re-upload a package that already exists.
+        :return: True if success.
+        """
+        client = self.get_client(remote_name)
+        if client is None:
+            return False
+        finds = self.__sys.local_database.query(dep)
+        if len(finds) != 1:
+            log.error(
+                f"{len(finds)} packages match the request, only one package per push allowed."
+            )
+            return False
+        depp = finds[0]
+        file = self.__sys.temp_path / (Path(depp.get_path()).name + ".tgz")
+        await asyncio.to_thread(
+            self.__sys.local_database.pack, depp, self.__sys.temp_path, "tgz"
+        )
+        success = await client.push(depp, file, force)
+        file.unlink(missing_ok=True)
+        return success
+
+    async def add_many_to_remote(
+        self, deps: list, remote_name: str, force: bool = False
+    ):
+        """
+        Send several packages from local to remote concurrently.
+        :param deps: The dependencies to send.
+        :param remote_name: The remote server to use.
+        :param force: If true, re-upload packages that already exist.
+        :return: List of success flags.
+        """
+        return await asyncio.gather(
+            *[self.add_to_remote(dep, remote_name, force) for dep in deps]
+        )
+
+    async def remove_package(self, dep, remote_name: str = ""):
+        """
+        Suppress package in local database or in a remote.
+        :param dep: The package to remove.
+        :param remote_name: The remote server to use, empty for local.
+        :return: True if success.
+        """
+        if remote_name == "":
+            async with self._local_lock():
+                self.__sys.remove_local(dep)
+            return True
+        client = self.get_client(remote_name)
+        if client is None:
+            return False
+        return await client.delete(dep)
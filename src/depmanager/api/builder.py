@@ -240,6 +240,7 @@ class Builder:
         # Distinguish recipes to build or to pull
         #
         recipe_to_build = []
+        to_pull = []
         if self.skip_pull:
             recipe_to_build = self.recipes
         else:
@@ -258,9 +259,11 @@ class Builder:
                         f"Package {recipe.to_str()} found on remote for {mac}, pulling, no build."
                     )
                     if not self.dry_run:
-                        self.pacman.add_from_remote(query_result[0], "default")
+                        to_pull.append(query_result[0])
                     continue
                 recipe_to_build.append(recipe)
+        if len(to_pull) > 0:
+            self.pacman.add_list_from_remote(to_pull, "default")
         nb = len(recipe_to_build)
         if nb == 0:
             log.info("Nothing to build!")
@@ -299,6 +302,7 @@ class Builder:
         #
         # do the push
         #
+        to_push = []
         for recipe in recipe_to_build:
             if not self.dry_run:
                 packs = self.pacman.query(self.query_from_recipe(recipe, mac))
@@ -318,10 +322,12 @@ class Builder:
                     log.info(
                         f"Pushing {packs[0].properties.get_as_str()} for {mac} to te remote!"
                     )
-                    self.pacman.add_to_remote(packs[0], "default")
+                    to_push.append(packs[0])
             else:
                 if self.skip_push:
                     log.info(f"SKIP pushing {recipe.to_str()} for {mac} to te remote!")
                 else:
                     log.info(f"Pushing {recipe.to_str()} for {mac} to te remote!")
+        if len(to_push) > 0:
+            self.pacman.add_list_to_remote(to_push, "default")
         return error
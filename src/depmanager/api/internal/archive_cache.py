@@ -0,0 +1,167 @@
+"""
+Machine-wide cache of package archives.
+
+Archives are stored by content: ``sha256/<2 chars>/<sha256>.tgz`` when the
+catalog gives the checksum, ``package/<package hash>-<build date>.tgz``
+otherwise. Several DEPMANAGER_HOME instances can share the same cache: an
+entry is written to a temporary file then renamed, so readers only ever see
+complete archives. The least recently used entries are removed when the
+cache exceeds its size limit.
+"""
+
+import os
+from pathlib import Path
+from uuid import uuid4
+
+from depmanager.api.internal.common import default_max_size
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import copy_file, file_checksum
+
+size_units = {"k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(value):
+    """
+    Read a size given as a number of bytes or with a unit (``500M``, ``20G``).
+    :param value: The size.
+    :return: Number of bytes, None if invalid or not positive.
+    """
+    text = f"{value}".strip().lower().removesuffix("b").removesuffix("i")
+    factor = 1
+    if text[-1:] in size_units:
+        factor = size_units[text[-1]]
+        text = text[:-1]
+    try:
+        size = int(float(text) * factor)
+    except (ValueError, OverflowError):
+        return None
+    if size <= 0:
+        return None
+    return size
+
+
+class ArchiveCache:
+    """
+    Content-addressed store of package archives, with an LRU size limit.
+    """
+
+    def __init__(self, path: Path, max_size: int = default_max_size):
+        self.path = Path(path)
+        self.max_size = max_size
+
+    @staticmethod
+    def from_config(config: dict):
+        """
+        Create the cache described by the ``archive_cache`` entry of the
+        configuration.
+        :param config: The entry, with ``path`` and optional ``max_size``.
+        :return: The cache or None.
+        """
+        if type(config) is not dict or "path" not in config:
+            log.error("archive_cache: missing path in configuration.")
+            return None
+        max_size = parse_size(config.get("max_size", default_max_size))
+        if max_size is None:
+            log.error(f"archive_cache: invalid max_size {config['max_size']}.")
+            return None
+        return ArchiveCache(Path(config["path"]).expanduser().resolve(), max_size)
+
+    def entry(self, dep: Dependency):
+        """
+        Get the cache file of a dependency's archive.
+        :param dep: Dependency from a remote catalog.
+        :return: The path of the entry.
+        """
+        if dep.sha256 not in ["", None]:
+            return self.path / "sha256" / dep.sha256[:2] / f"{dep.sha256}.tgz"
+        props = dep.properties
+        date = f"{props.build_date}".replace(":", "").replace(" ", "T")
+        return self.path / "package" / f"{props.hash()}-{date}.tgz"
+
+    def get(self, dep: Dependency, destination: Path):
+        """
+        Get a dependency's archive from the cache. An entry not matching the
+        checksum of the catalog is removed.
+        :param dep: Dependency from a remote catalog.
+        :param destination: Destination directory.
+        :return: The archive placed in destination, None if not cached.
+        """
+        entry = self.entry(dep)
+        try:
+            size = entry.stat().st_size
+            checksum = None
+            if dep.sha256 not in ["", None]:
+                checksum = file_checksum(entry)
+        except OSError:
+            return None
+        if (dep.size > 0 and size != dep.size) or not dep.check_integrity(checksum):
+            log.warn(f"WARNING: dropping damaged cache entry {entry}.")
+            entry.unlink(missing_ok=True)
+            return None
+        destination.mkdir(parents=True, exist_ok=True)
+        file = destination / entry.name
+        file.unlink(missing_ok=True)
+        try:
+            copy_file(entry, file, link=True)
+            # the modification time orders the entries for eviction.
+            os.utime(entry)
+        except OSError as err:
+            log.warn(f"WARNING: cannot read cache entry {entry}: {err}")
+            file.unlink(missing_ok=True)
+            return None
+        log.debug(f"{dep.properties.get_as_str()} found in archive cache.")
+        return file
+
+    def put(self, dep: Dependency, file: Path):
+        """
+        Store a dependency's archive in the cache.
+        :param dep: Dependency from a remote catalog.
+        :param file: The downloaded archive, left in place.
+        :return: True if stored.
+        """
+        entry = self.entry(dep)
+        temp = entry.parent / f".{entry.name}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            copy_file(file, temp, link=True)
+            os.replace(temp, entry)
+        except OSError as err:
+            log.warn(f"WARNING: cannot write cache entry {entry}: {err}")
+            return False
+        finally:
+            temp.unlink(missing_ok=True)
+        self.evict()
+        return True
+
+    def entries(self):
+        """
+        List the entries of the cache.
+        :return: List of (modification time, size, path).
+        """
+        found = []
+        for file in self.path.glob("*/**/*.tgz"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            found.append((stat.st_mtime, stat.st_size, file))
+        return found
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits its limit.
+        :return: Number of removed entries.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, file in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_size:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed > 0:
+            log.debug(f"Archive cache: {removed} entries evicted.")
+        return removed
@@ -5,6 +5,10 @@ Common helper function.
 from argparse import ArgumentParser
 
 client_api = "2.1.0"
+# Seconds during which the remote catalogs are reused.
+default_catalog_ttl = 60.0
+# Default size limit of the archive caches.
+default_max_size = 10 * 1024**3
 
 
 def add_common_arguments(parser: ArgumentParser):
@@ -21,6 +25,20 @@ def add_common_arguments(parser: ArgumentParser):
     parser.add_argument("--raw", action="store_true", default=False, help="Raw output")
 
 
+def apply_common_arguments(args):
+    """
+    Set the verbosity and the output given by the common options.
+    :param args: The parsed arguments.
+    """
+    from depmanager.api.internal.messaging import set_logging_level, set_raw_output
+
+    logging_level = args.verbose + 2
+    if args.quiet:
+        logging_level = 0
+    set_logging_level(logging_level)
+    set_raw_output(args.raw)
+
+
 def add_remote_selection_arguments(parser: ArgumentParser):
     """
     Add the common option to the parser.
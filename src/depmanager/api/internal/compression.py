@@ -0,0 +1,343 @@
+"""
+Compression of package archives.
+
+Gzip streams are compressed by blocks on several threads, in the manner of
+pigz: each block is deflated with the end of the previous one as dictionary
+and ends on a byte boundary (sync flush), so the concatenated blocks form a
+single standard gzip member that any gzip reader accepts. ``zlib`` releases
+the GIL while it compresses, hence the threads run in parallel.
+
+Zstandard archives are optional: they need the ``zstandard`` module (``zstd``
+extra), and are only sent to remotes whose readers accept them
+(``archive_formats``). Readers recognize the format by its magic number,
+whatever the file name.
+"""
+
+import os
+import struct
+import tarfile
+import zlib
+from collections import deque
+
+from depmanager.api.internal.messaging import log
+
+archive_formats = ["gzip", "zstd"]
+# Default and valid compression levels by format.
+default_levels = {"gzip": 6, "zstd": 3}
+level_ranges = {"gzip": (1, 9), "zstd": (1, 22)}
+# Number of compression threads, 0 for one per core.
+default_threads = 0
+# Uncompressed size of the blocks compressed in parallel.
+block_size = 128 * 1024
+# Size of the deflate window, primed with the end of the previous block.
+dictionary_size = 32 * 1024
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+# Archive suffixes by format.
+suffixes = {"gzip": ".tgz", "zstd": ".tar.zst"}
+
+
+def zstd_available():
+    """
+    Check if the zstandard module is installed.
+    :return: True if zstd archives can be read and written.
+    """
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parse_formats(value):
+    """
+    Read the ``archive_formats`` entry of a remote configuration.
+    :param value: List of format names (or a single one).
+    :return: The known formats, gzip always included.
+    """
+    if type(value) is str:
+        value = [value]
+    if type(value) is not list:
+        log.warn(f"WARNING: invalid archive_formats {value}, ignored.")
+        return ["gzip"]
+    unknown = [item for item in value if item not in archive_formats]
+    if len(unknown) > 0:
+        log.warn(f"WARNING: unknown archive formats {unknown}, ignored.")
+    return ["gzip"] + [item for item in value if item in archive_formats[1:]]
+
+
+def deflate_block(block: bytes, dictionary: bytes, level: int, last: bool):
+    """
+    Compress a block as a piece of a raw deflate stream.
+    :param block: The data.
+    :param dictionary: The data preceding the block in the stream.
+    :param level: The compression level.
+    :param last: If the block ends the stream.
+    :return: The compressed data, ending on a byte boundary.
+    """
+    if len(dictionary) > 0:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 8, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 8)
+    return compressor.compress(block) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+
+
+class ParallelGzipWriter:
+    """
+    Writable stream compressing its data into a gzip stream, by blocks
+    compressed on a pool of threads and written in order to the target.
+    """
+
+    def __init__(
+        self,
+        target,
+        level: int = default_levels["gzip"],
+        threads: int = default_threads,
+    ):
+        self.target = target
+        self.level = level
+        self.closed = False
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = threads or os.cpu_count() or 1
+        self.__pool = ThreadPoolExecutor(max_workers=workers)
+        # bounds the memory: blocks waiting to be written.
+        self.__max_pending = 2 * workers
+        self.__pending = deque()
+        self.__buffer = bytearray()
+        self.__dictionary = b""
+        self.__crc = 0
+        self.__size = 0
+        # no name and a null time: the same data gives the same archive.
+        self.target.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        """
+        Compress data.
+        :param data: The bytes.
+        :return: The number of bytes taken.
+        """
+        self.__buffer += data
+        while len(self.__buffer) >= block_size:
+            block = bytes(self.__buffer[:block_size])
+            del self.__buffer[:block_size]
+            self.__submit(block, False)
+        return len(data)
+
+    def flush(self):
+        """
+        Nothing to do: the blocks are written once compressed.
+        """
+
+    def close(self):
+        """
+        Compress the remaining data and write the end of the gzip stream.
+        The target is not closed.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.__submit(bytes(self.__buffer), True)
+            self.__buffer = bytearray()
+            while self.__pending:
+                self.target.write(self.__pending.popleft().result())
+            self.target.write(struct.pack("<II", self.__crc, self.__size & 0xFFFFFFFF))
+        finally:
+            self.__pool.shutdown(wait=True, cancel_futures=True)
+
+    def abort(self):
+        """
+        Stop the compression without ending the gzip stream.
+        """
+        self.closed = True
+        self.__pool.shutdown(wait=False, cancel_futures=True)
+
+    def __submit(self, block: bytes, last: bool):
+        self.__crc = zlib.crc32(block, self.__crc)
+        self.__size += len(block)
+        self.__pending.append(
+            self.__pool.submit(
+                deflate_block, block, self.__dictionary, self.level, last
+            )
+        )
+        self.__dictionary = block[-dictionary_size:]
+        while len(self.__pending) > self.__max_pending or (
+            self.__pending and self.__pending[0].done()
+        ):
+            self.target.write(self.__pending.popleft().result())
+
+
+class Compression:
+    """
+    Format, level and number of threads of the archive compression.
+    """
+
+    def __init__(
+        self, archive_format: str = "gzip", level=None, threads: int = default_threads
+    ):
+        self.format = archive_format
+        self.level = level or default_levels[archive_format]
+        self.threads = threads
+
+    @staticmethod
+    def from_config(config: dict):
+        """
+        Create the compression described by the ``compression`` entry of the
+        configuration.
+        :param config: The entry, with optional ``format``, ``level`` and ``threads``.
+        :return: The compression or None.
+        """
+        if type(config) is not dict:
+            log.error("compression: the entry must be a dictionary.")
+            return None
+        archive_format = config.get("format", "gzip")
+        if archive_format not in archive_formats:
+            log.error(f"compression: unknown format {archive_format}.")
+            return None
+        level = config.get("level", default_levels[archive_format])
+        low, high = level_ranges[archive_format]
+        if type(level) is not int or not low <= level <= high:
+            log.error(
+                f"compression: {archive_format} level must be in [{low}, {high}]."
+            )
+            return None
+        threads = config.get("threads", default_threads)
+        if type(threads) is not int or threads < 0:
+            log.error("compression: threads must be a positive number.")
+            return None
+        return Compression(archive_format, level, threads)
+
+    @property
+    def suffix(self):
+        """
+        Suffix of the archive files.
+        """
+        return suffixes[self.format]
+
+    def with_format(self, archive_format: str):
+        """
+        Get the compression of another format with the same threads. The
+        level is moved to the same place in the range of the other format,
+        the default level giving the default one.
+        :param archive_format: The format.
+        :return: The compression.
+        """
+        if archive_format == self.format:
+            return self
+        if self.level == default_levels[self.format]:
+            return Compression(archive_format, None, self.threads)
+        low, high = level_ranges[self.format]
+        new_low, new_high = level_ranges[archive_format]
+        level = new_low + round(
+            (self.level - low) * (new_high - new_low) / (high - low)
+        )
+        return Compression(
+            archive_format, min(max(level, new_low), new_high), self.threads
+        )
+
+    def negotiate(self, accepted: list):
+        """
+        Get the compression to use for a remote.
+        :param accepted: The formats read by the remote's clients.
+        :return: This compression, or a gzip one if zstd cannot be used.
+        """
+        if self.format == "gzip":
+            return self
+        if self.format not in accepted:
+            log.debug(f"remote does not accept {self.format} archives, using gzip.")
+        elif not zstd_available():
+            log.warn("WARNING: zstandard module not installed, using gzip.")
+        else:
+            return self
+        return self.with_format("gzip")
+
+    def writer(self, target):
+        """
+        Get a writable stream compressing into a target, to use as a context
+        manager: its end completes the compressed stream, without closing the
+        target.
+        :param target: Object with a ``write`` method.
+        :return: The compressing stream.
+        """
+        if self.format == "zstd":
+            import zstandard
+
+            compressor = zstandard.ZstdCompressor(
+                level=self.level, threads=self.threads or -1
+            )
+            return compressor.stream_writer(target, closefd=False)
+        return ParallelGzipWriter(target, self.level, self.threads)
+
+
+def open_tar_stream(fileobj):
+    """
+    Open a compressed tar stream for reading, the format being recognized by
+    its magic number.
+    :param fileobj: Readable stream with a ``peek`` method.
+    :return: The tarfile in stream mode.
+    """
+    if fileobj.peek(4)[:4] == zstd_magic:
+        if not zstd_available():
+            raise tarfile.CompressionError("zstd archive: zstandard not installed")
+        import zstandard
+
+        reader = zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+        return tarfile.open(fileobj=reader, mode="r|")
+    return tarfile.open(fileobj=fileobj, mode="r|gz")
+
+
+class TemporaryTarFile(tarfile.TarFile):
+    """
+    Tar archive read from a temporary file, closed with the archive.
+    """
+
+    def close(self):
+        """
+        Close the archive and its temporary file.
+        """
+        data = self.fileobj
+        try:
+            super().close()
+        finally:
+            data.close()
+
+
+def open_tar_file(file):
+    """
+    Open a compressed tar archive for random access, the format being
+    recognized by its magic number. A zstd archive is decompressed into a
+    temporary file first.
+    :param file: Path to the archive.
+    :return: The tarfile.
+    """
+    with open(file, "rb") as fp:
+        magic = fp.read(4)
+    if magic != zstd_magic:
+        return tarfile.open(file, "r:gz")
+    if not zstd_available():
+        raise tarfile.CompressionError("zstd archive: zstandard not installed")
+    from tempfile import TemporaryFile
+
+    import zstandard
+
+    data = TemporaryFile()
+    try:
+        with open(file, "rb") as fp:
+            zstandard.ZstdDecompressor().copy_stream(fp, data)
+        data.seek(0)
+        return TemporaryTarFile.open(fileobj=data, mode="r:")
+    except BaseException:
+        data.close()
+        raise
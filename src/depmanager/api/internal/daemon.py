@@ -0,0 +1,239 @@
+"""
+Resident depmanager daemon.
+
+The daemon keeps a local system in memory: configuration, local database,
+remote catalogs and sessions, machine information. It listens on a Unix
+socket of the DEPMANAGER_HOME folder (``daemon.sock``, readable by its owner
+only) and runs the ``get`` and ``pack ls`` command lines sent by the clients
+as the command line would, sending back their exit code and output.
+
+Requests are a JSON object on one line, ``{"argv": [...], "cwd": "..."}``;
+``{"status": true}`` and ``{"stop": true}`` query and stop the daemon. The
+commands run one at a time, each in the folder of its client and under the
+shared lock of the local data; a client waiting too long for its turn is
+answered ``{"busy": true}`` and runs the command itself. The local database is read again when the
+data folder changes, the whole system when the configuration changes, and
+the remote catalogs once they are older than the catalog TTL.
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from time import monotonic
+
+from depmanager.api.internal.common import default_catalog_ttl
+from depmanager.api.internal.daemon_client import is_served
+from depmanager.api.internal.messaging import log
+
+# Seconds a command waits for the one running before the daemon answers busy.
+busy_timeout = 1.0
+
+
+def modification_time(path: Path):
+    """
+    Get the modification time of a file or folder.
+    :param path: The path.
+    :return: The time in nanoseconds, None if missing.
+    """
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ResidentSystem:
+    """
+    The local system of the daemon and the commands run on it.
+    """
+
+    def __init__(self, local=None, catalog_ttl: float = default_catalog_ttl):
+        self.catalog_ttl = catalog_ttl
+        self.local = None
+        self.requests = 0
+        self.started = monotonic()
+        self.__config_time = None
+        self.__data_time = None
+        self.__catalog_time = None
+        # the commands change the working folder and the output.
+        self.__lock = threading.Lock()
+        self.open(local)
+
+    def open(self, local=None, locked: bool = False):
+        """
+        Load the local system.
+        :param local: A local manager to use, created if None.
+        :param locked: Keep the shared lock of the data, else release it.
+        """
+        from depmanager.api.local import LocalManager
+
+        if self.local is not None:
+            self.local.get_sys().release()
+        if local is None:
+            local = LocalManager(shared=True)
+        self.local = local
+        system = local.get_sys()
+        if locked:
+            system.locker.request_lock(shared=True)
+        else:
+            system.locker.release_lock()
+        self.__config_time = modification_time(system.file)
+        self.__data_time = modification_time(system.data_path)
+        self.__catalog_time = monotonic()
+
+    def close(self):
+        """
+        Release the local system.
+        """
+        self.local.get_sys().clear_tmp()
+        self.local.get_sys().release()
+
+    def refresh(self):
+        """
+        Read again what changed since the last command, the shared lock of
+        the data being held: the system may be replaced, still locked.
+        """
+        system = self.local.get_sys()
+        if modification_time(system.file) != self.__config_time:
+            log.debug("daemon: configuration changed, reloading.")
+            self.open(locked=True)
+            return
+        data_time = modification_time(system.data_path)
+        if data_time != self.__data_time:
+            system.local_database.reload()
+            self.__data_time = data_time
+        if monotonic() - self.__catalog_time > self.catalog_ttl:
+            for remote in system.remote_database.values():
+                remote.initiated = False
+            self.__catalog_time = monotonic()
+
+    def status(self):
+        """
+        Get the state of the daemon.
+        :return: Dictionary of the state.
+        """
+        return {
+            "pid": os.getpid(),
+            "requests": self.requests,
+            "uptime": round(monotonic() - self.started, 3),
+            "base_path": str(self.local.get_base_path()),
+        }
+
+    def run(self, argv: list, cwd: str):
+        """
+        Run a command line as the command line interface would.
+        :param argv: The command line arguments, without the program.
+        :param cwd: The working folder of the client.
+        :return: (exit code, standard output, error output), None if busy.
+        """
+        from depmanager.api.internal import messaging
+        from depmanager.api.internal.common import apply_common_arguments
+        from depmanager.manager import get_parser
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        if not is_served(argv):
+            return 2, "", f"daemon: command not served: {' '.join(argv)}\n"
+        if not self.__lock.acquire(timeout=busy_timeout):
+            return None
+        try:
+            self.requests += 1
+            previous = os.getcwd()
+            level, raw = log.level, messaging.raw_output
+            system = None
+            try:
+                os.chdir(cwd)
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    try:
+                        args = get_parser(argv[0]).parse_args(argv)
+                        # read the data only once no writer holds it.
+                        system = self.local.get_sys()
+                        system.locker.request_lock(shared=True)
+                        self.refresh()
+                        system = self.local.get_sys()
+                        apply_common_arguments(args)
+                        code = args.func(args, self.local)
+                    except SystemExit as err:
+                        code = err.code
+                    except Exception as err:
+                        log.fatal(f"daemon: {' '.join(argv)} failed: {err}")
+                        code = 1
+            except OSError as err:
+                return 1, "", f"daemon: cannot run in {cwd}: {err}\n"
+            finally:
+                if system is not None:
+                    system.locker.release_lock()
+                    system.clear_tmp()
+                os.chdir(previous)
+                log.setLevel(level)
+                messaging.set_raw_output(raw)
+        finally:
+            self.__lock.release()
+        if code is None:
+            code = 0
+        elif not isinstance(code, int):
+            code = 1
+        return code, stdout.getvalue(), stderr.getvalue()
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of a daemon connection: one request, one answer.
+    """
+
+    def handle(self):
+        try:
+            data = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        resident = self.server.resident
+        if data.get("stop", False):
+            answer = {"stopped": True}
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif data.get("status", False):
+            answer = resident.status()
+        else:
+            argv = data.get("argv", [])
+            if not isinstance(argv, list) or not all(
+                isinstance(arg, str) for arg in argv
+            ):
+                return
+            result = resident.run(argv, str(data.get("cwd", ".")))
+            if result is None:
+                answer = {"busy": True}
+            else:
+                code, out, err = result
+                answer = {"code": code, "stdout": out, "stderr": err}
+        self.wfile.write(json.dumps(answer).encode("utf8") + b"\n")
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix socket server of the daemon, one thread per connection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, resident: ResidentSystem, path: Path):
+        self.resident = resident
+        self.path = Path(path)
+        if self.path.exists():
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(str(self.path)) == 0:
+                    raise OSError(f"a daemon already listens on {self.path}")
+            # left by a daemon that did not stop cleanly.
+            self.path.unlink()
+        previous = os.umask(0o077)
+        try:
+            super().__init__(str(self.path), DaemonHandler)
+        finally:
+            os.umask(previous)
+
+    def server_close(self):
+        super().server_close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,92 @@
+"""
+Client of the resident depmanager daemon.
+
+The command line sends the ``get`` and ``pack ls`` commands to the daemon when
+it is running, instead of loading the whole program; ``load``, which installs
+packages, always runs locally. This module
+only uses the standard library: it is imported before anything else, and
+only loads the socket and json modules when a daemon socket exists.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Name of the daemon socket in the DEPMANAGER_HOME folder.
+socket_name = "daemon.sock"
+# Environment variable disabling the use of the daemon.
+no_daemon_variable = "DEPMANAGER_NO_DAEMON"
+# Seconds to wait for the daemon to accept a connection.
+connect_timeout = 2.0
+
+
+def socket_path():
+    """
+    Get the socket of the daemon of the current DEPMANAGER_HOME.
+    :return: Path of the socket.
+    """
+    home = os.environ.get("DEPMANAGER_HOME")
+    return (Path(home) if home is not None else Path.home()) / ".edm" / socket_name
+
+
+def is_served(argv: list):
+    """
+    Check if a command line is run by the daemon.
+    :param argv: The command line arguments, without the program.
+    :return: True for get and pack ls.
+    """
+    if len(argv) == 0:
+        return False
+    if argv[0] == "get":
+        return True
+    return argv[0] == "pack" and argv[1:2] == ["ls"]
+
+
+def request(data: dict, timeout=None):
+    """
+    Send a request to the daemon.
+    :param data: The request.
+    :param timeout: Optional timeout in seconds of the answer.
+    :return: The answer, None if no daemon answered.
+    """
+    path = socket_path()
+    if not path.exists():
+        return None
+    import json
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(connect_timeout)
+            sock.connect(str(path))
+            sock.settimeout(timeout)
+            sock.sendall(json.dumps(data).encode("utf8") + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return json.loads(b"".join(chunks))
+    except (OSError, ValueError):
+        return None
+
+
+def forward(argv: list):
+    """
+    Run a command line by the daemon, if it is running.
+    :param argv: The command line arguments, without the program.
+    :return: The exit code, None if the command must be run locally (no daemon,
+        or a daemon busy or not answering).
+    """
+    if not is_served(argv) or os.environ.get(no_daemon_variable, "") not in ["", "0"]:
+        return None
+    answer = request({"argv": argv, "cwd": os.getcwd()})
+    if not isinstance(answer, dict) or "code" not in answer:
+        return None
+    sys.stdout.write(answer.get("stdout", ""))
+    sys.stderr.write(answer.get("stderr", ""))
+    return answer["code"]
@@ -1,73 +1,179 @@
 """
-Simple system to lock the data while processing.
+Reader/writer lock of the local data.
+
+The lock is a ``flock`` on the ``data.lock`` file: the commands only reading
+the data share it, the other ones hold it exclusively. The same lock on other
+files guards the installation of a package and the temporary folder of a
+process. A waiting process blocks in the system until the lock is free, and
+the lock of a process is released by the system when it exits, even on a
+crash: there is neither polling nor timeout. Systems without ``fcntl``
+(Windows) lock a byte of the file instead, always exclusively.
 """
 
-from datetime import datetime, timedelta
+import os
 from pathlib import Path
-from time import sleep
+from time import perf_counter
 
 from depmanager.api.internal.messaging import log
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
 
-class Locker:
+# Waits longer than this are reported at the info level.
+long_wait = 1.0
+
+
+def lock_file(fd: int, mode: str, blocking: bool):
     """
-    Simple class to manage the lock of the system.
+    Lock an open file.
+    :param fd: The file descriptor.
+    :param mode: "shared" or "exclusive".
+    :param blocking: Wait until the lock is free.
+    :return: True if locked, False if held by another process and not blocking.
     """
+    if fcntl is not None:
+        operation = fcntl.LOCK_SH if mode == "shared" else fcntl.LOCK_EX
+        if not blocking:
+            operation |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, operation)
+        except BlockingIOError:
+            return False
+        return True
+    import msvcrt
+
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            # LK_LOCK gives up after 10 seconds.
+            if not blocking:
+                return False
 
-    # Default timeout for the lock is 10 minutes.
-    lock_timeout = timedelta(minutes=10)
-    # Default deadlock is 30 minutes.
-    deadlock_timeout = timedelta(minutes=30)
 
-    def __init__(self, base_path: Path):
+class Locker:
+    """
+    Reader/writer lock of the local data, with the time spent waiting for it.
+    """
+
+    def __init__(self, base_path: Path, name: str = "data.lock"):
         self.base_path = base_path
-        self.lock_file = base_path / "data.lock"
+        self.lock_file = base_path / name
+        # "shared", "exclusive" or None if not held.
+        self.mode = None
+        # number of requests, of requests that waited, total and longest wait.
+        self.requests = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.__fd = None
 
     def is_locked(self):
-        if self.lock_file.exists():
-            # check age of the file.
-            age = datetime.now() - datetime.fromtimestamp(
-                self.lock_file.stat().st_mtime
-            )
-            if age > self.lock_timeout:
-                log.warn(
-                    f"Depmanager locking: Lock timeout reached try to force lock release."
-                )
-                self.release_lock()
-                return False
-            return True
-        return False
+        """
+        Check if a process, this one included, holds the lock.
+        :return: True if held, shared or exclusive.
+        """
+        if not self.lock_file.exists():
+            return False
+        try:
+            fd = os.open(self.lock_file, os.O_RDWR)
+        except OSError:
+            return False
+        try:
+            return not lock_file(fd, "exclusive", blocking=False)
+        finally:
+            os.close(fd)
+
+    def holds_lock(self):
+        """
+        Check if this instance holds the lock.
+        :return: True if held, shared or exclusive.
+        """
+        return self.mode is not None
+
+    def metrics(self):
+        """
+        Get the waiting statistics of the lock.
+        :return: Dictionary of the statistics, times in seconds.
+        """
+        return {
+            "mode": self.mode,
+            "requests": self.requests,
+            "waits": self.waits,
+            "wait_time": round(self.wait_time, 3),
+            "max_wait": round(self.max_wait, 3),
+        }
 
     def release_lock(self):
-        if not self.lock_file.exists():
+        """
+        Release the lock, if held.
+        """
+        if self.__fd is None:
             log.debug(f"Depmanager locking: Lock already released")
+            return
         try:
-            self.lock_file.unlink(missing_ok=True)
-            if self.lock_file.exists():
-                log.debug(f"Depmanager locking: failed Lock released")
-            else:
-                log.debug(f"Depmanager locking: Lock released")
-        except Exception as err:
-            log.fatal(f"Depmanager locking: Exception during release: {err}")
-
-    def request_lock(self):
-        log.debug(f"Depmanager locking: requesting Lock")
-        call_start = datetime.now()
-        # wait if there is a lock!
-        while self.is_locked():
-            sleep(5)
-            if datetime.now() - call_start > self.deadlock_timeout:
-                log.warn(f"Depmanager locking: Deadlock timeout reached.")
-                return False
-        # just create the lock file
-        if not self.lock_file.parent.exists():
-            self.lock_file.parent.mkdir(parents=True, exist_ok=True)
-            if not self.lock_file.parent.exists():
-                log.fatal(
-                    f"Depmanager locking FATAL: Cannot create folder {self.lock_file.parent}, check you permissions."
-                )
-                exit(1)
-        self.lock_file.touch()
-        log.debug(f"Depmanager locking: Lock State: {self.lock_file.exists()}")
-        # return existence.
-        return self.lock_file.exists()
+            if fcntl is not None:
+                fcntl.flock(self.__fd, fcntl.LOCK_UN)
+            os.close(self.__fd)
+        except OSError as err:
+            log.debug(f"Depmanager locking: Exception during release: {err}")
+        self.__fd = None
+        self.mode = None
+        log.debug(f"Depmanager locking: Lock released {self.metrics()}")
+
+    def request_lock(self, shared: bool = False, blocking: bool = True):
+        """
+        Take the lock, waiting for the other processes if needed. A held
+        shared lock is turned into an exclusive one: other processes may take
+        the lock in between, the data must be read again afterward.
+        :param shared: Share the lock with the other readers.
+        :param blocking: Wait for the other processes holding the lock.
+        :return: True if the lock is held.
+        """
+        mode = "shared" if shared and fcntl is not None else "exclusive"
+        if self.mode == mode or (shared and self.mode == "exclusive"):
+            return True
+        log.debug(f"Depmanager locking: requesting {mode} Lock")
+        try:
+            if self.__fd is None:
+                self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+                self.__fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o666)
+            self.requests += 1
+            start = perf_counter()
+            if not lock_file(self.__fd, mode, blocking=False):
+                if not blocking:
+                    self.requests -= 1
+                    if self.mode is None:
+                        self.release_lock()
+                    else:
+                        # the failed conversion dropped the held lock.
+                        lock_file(self.__fd, self.mode, blocking=True)
+                    return False
+                log.debug(f"Depmanager locking: waiting for another process")
+                lock_file(self.__fd, mode, blocking=True)
+                self.__record_wait(perf_counter() - start)
+        except OSError as err:
+            log.error(f"Depmanager locking: cannot lock {self.lock_file}: {err}")
+            self.release_lock()
+            return False
+        self.mode = mode
+        log.debug(f"Depmanager locking: {mode} Lock held")
+        return True
+
+    def __record_wait(self, seconds: float):
+        """
+        Record a wait for the lock.
+        :param seconds: The time spent waiting.
+        """
+        self.waits += 1
+        self.wait_time += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        if seconds >= long_wait:
+            log.info(
+                f"Depmanager locking: waited {seconds:.1f}s for another depmanager process."
+            )
+        else:
+            log.debug(f"Depmanager locking: waited {seconds:.3f}s for the Lock")
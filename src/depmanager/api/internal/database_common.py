@@ -4,8 +4,16 @@ Database Object.
 
 from pathlib import Path
 
+from depmanager.api.internal.compression import Compression, parse_formats
 from depmanager.api.internal.dependency import Dependency, Props, version_lt
 from depmanager.api.internal.messaging import log
+from depmanager.api.internal.resilience import (
+    CircuitBreaker,
+    default_attempts,
+    default_timeout,
+    parse_retries,
+    parse_timeout,
+)
 
 
 class __DataBase:
@@ -37,7 +45,16 @@ class __DataBase:
         """
         if not self.valid_shape:
             return []
-        return [dep.properties.get_as_str() for dep in self.dependencies]
+        return [self.dep_to_string(dep) for dep in self.dependencies]
+
+    @staticmethod
+    def dep_to_string(dep: Dependency):
+        """
+        Create the catalog string of a dependency.
+        :param dep: The dependency.
+        :return: The deps string.
+        """
+        return dep.catalog_str()
 
     def query(self, data: any([str, dict, Dependency, Props]) = None):
         """
@@ -99,6 +116,75 @@ class __RemoteDatabase(__DataBase):
         self.initiated = False
         self.remote_type = "unknown"
         self.version = "0.0"
+        # Number of archives transferred at the same time by the TransferManager.
+        self.max_transfers = 1
+        # If the remote can stream archives (see stream()).
+        self.streaming = False
+        # If the remote can upload archives while they are produced (see send_stream()).
+        self.streaming_push = False
+        # Timeouts and number of tries of the network operations.
+        self.timeout = default_timeout
+        self.attempts = default_attempts
+        # Skip the remote at once while it is known to be down.
+        self.breaker = CircuitBreaker(f"{destination}")
+        # Time taken by the last successful connection, in seconds.
+        self.latency = None
+        # Archive formats read by the clients of the remote, and the
+        # compression wanted for the pushes.
+        self.archive_formats = ["gzip"]
+        self.compression = Compression()
+        # If the remote stores plain files by name (get_file() / send_file()).
+        self.plain_files = False
+        # If pushes leave a file list and a delta from the previous build.
+        self.deltas = False
+
+    def apply_resilience(self, config: dict):
+        """
+        Read the ``timeout`` and ``retries`` entries of the remote configuration.
+        :param config: The remote entry of the configuration.
+        """
+        if "timeout" in config:
+            timeout = parse_timeout(config["timeout"])
+            if timeout is None:
+                log.warn(f"WARNING: invalid timeout {config['timeout']}, ignored.")
+            else:
+                self.timeout = timeout
+        if "retries" in config:
+            retries = parse_retries(config["retries"])
+            if retries is None:
+                log.warn(f"WARNING: invalid retries {config['retries']}, ignored.")
+            else:
+                self.attempts = retries + 1
+
+    def apply_compression(self, compression: Compression, config: dict):
+        """
+        Set the wanted compression and read the ``archive_formats`` entry of
+        the remote configuration.
+        :param compression: The compression of the configuration.
+        :param config: The remote entry of the configuration.
+        """
+        self.compression = compression
+        if "archive_formats" in config:
+            self.archive_formats = parse_formats(config["archive_formats"])
+
+    def apply_deltas(self, config: dict):
+        """
+        Read the ``deltas`` entry of the remote configuration.
+        :param config: The remote entry of the configuration.
+        """
+        if not config.get("deltas", False):
+            return
+        if not self.plain_files:
+            log.warn(f"WARNING: remote {self.destination} cannot store deltas.")
+            return
+        self.deltas = True
+
+    def push_compression(self):
+        """
+        Get the compression of the archives pushed to the remote.
+        :return: The wanted compression if the remote accepts it, else gzip.
+        """
+        return self.compression.negotiate(self.archive_formats)
 
     def get_server_type(self):
         """
@@ -158,9 +244,19 @@ class __RemoteDatabase(__DataBase):
                 fb.write(f"{line}\n")
 
     def __initialize(self):
+        if self.breaker.is_open():
+            log.debug(f"Remote {self.destination} is down, skipped.")
+            self.valid_shape = False
+            return
+        from time import monotonic
+
+        start = monotonic()
         self.connect()
+        if self.valid_shape:
+            self.latency = monotonic() - start
         self.get_dep_list()
-        self.initiated = True
+        # a remote that failed for a transient reason is tried again later.
+        self.initiated = self.valid_shape or self.breaker.failures == 0
 
     def push(self, dep: Dependency, file: Path, force: bool = False):
         """
@@ -169,37 +265,262 @@ class __RemoteDatabase(__DataBase):
         :param file: Dependency archive file.
         :param force: If true re-upload a file that already exists.
         """
-        if not self.valid_shape:
-            return
+        self.push_batch([(dep, file)], force)
+
+    def holds(self, dep: Dependency):
+        """
+        Check if the remote already stores the content of a package, whatever
+        its build date.
+        :param dep: The package, with its ``content`` hash.
+        :return: True if a package of the catalog has the same properties,
+            except the build date, the same dependencies and the same content.
+        """
+        if dep.content in ["", None]:
+            return False
+        query = Props(dep.properties.to_dict(), query=True)
+        query.build_date = "*"
+        # the content hash leaves out edp.info, where the dependencies are.
+        return any(
+            found.content == dep.content
+            and found.properties.dependencies == dep.properties.dependencies
+            for found in self.query(query)
+        )
+
+    def filter_push(self, items: list, force: bool = False):
+        """
+        Select the archives that can be pushed.
+        :param items: List of (dependency, archive file or package folder).
+        :param force: If true re-upload files that already exist.
+        :return: The items to push.
+        """
+        selected = []
+        for dep, file in items:
+            if not file.exists():
+                continue
+            if not force and self.holds(dep):
+                log.info(
+                    f"Dependency {dep.properties.name}: identical content already on server, not pushing."
+                )
+                continue
+            if len(self.query(dep)) != 0 and not force:
+                log.warn(
+                    f"WARNING: Cannot push dependency {dep.properties.name}: already on server."
+                )
+                continue
+            selected.append((dep, file))
+        return selected
+
+    @staticmethod
+    def file_list_name(dep: Dependency):
+        """
+        Get the location of the file list of the last pushed build of a
+        package on the remote.
+        :param dep: Dependency information.
+        :return: The distant name.
+        """
+        return f"{dep.properties.name}/{dep.properties.hash()}.files"
+
+    @staticmethod
+    def delta_name(dep: Dependency):
+        """
+        Get the location of the delta archive of a package on the remote.
+        :param dep: Dependency information.
+        :return: The distant name.
+        """
+        return f"{dep.properties.name}/{dep.properties.hash()}.delta.tgz"
+
+    def fetch_file_list(self, dep: Dependency, destination: Path):
+        """
+        Get the file list of the last build of a package pushed to the remote,
+        whatever its build date.
+        :param dep: Dependency information.
+        :param destination: Temporary directory.
+        :return: (content hash, manifest), None if unknown.
+        """
+        from depmanager.api.internal.delta import read_file_list
+
+        distant_name = self.file_list_name(dep)
+        file = destination / Path(distant_name).name
+        file.unlink(missing_ok=True)
+        self.get_file(distant_name, destination)
         if not file.exists():
-            return
-        result = self.query(dep)
-        if len(result) != 0 and not force:
-            log.warn(
-                f"WARNING: Cannot push dependency {dep.properties.name}: already on server."
-            )
-            return
-        destination = f"{dep.properties.name}/{dep.properties.hash()}.tgz"
-        self.send_file(file, destination)
+            return None
+        file_list = read_file_list(file)
+        file.unlink()
+        return file_list
+
+    def fetch_delta(self, dep: Dependency, destination: Path, callback=None):
+        """
+        Download the delta archive of a dependency of the catalog.
+        :param dep: Dependency from the catalog, with a ``delta_base``.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: The downloaded file or None.
+        """
+        distant_name = self.delta_name(dep)
+        file = destination / Path(distant_name).name
+        file.unlink(missing_ok=True)
+        self.get_file(distant_name, destination)
+        if not file.exists():
+            return None
+        if callback:
+            size = file.stat().st_size
+            callback(size, size)
+        return file
+
+    def send_delta(self, dep: Dependency, file_list: Path, delta: Path = None):
+        """
+        Upload the file list of a pushed package, and its delta archive.
+        :param dep: Dependency's description.
+        :param file_list: The file list.
+        :param delta: The delta archive, None if not worth it.
+        """
+        if delta is not None:
+            self.send_file(delta, self.delta_name(dep))
+        self.send_file(file_list, self.file_list_name(dep))
+
+    @staticmethod
+    def archive_name(dep: Dependency):
+        """
+        Get the location of a dependency's archive on the remote.
+        :param dep: Dependency information.
+        :return: The distant name.
+        """
+        return f"{dep.properties.name}/{dep.properties.hash()}.tgz"
+
+    def archive_size(self, dep: Dependency):
+        """
+        Get the size of a dependency's archive, used to schedule transfers.
+        :param dep: Dependency information.
+        :return: The size in bytes, 0 if unknown.
+        """
+        return dep.size
+
+    def package_folder(self, dep: Dependency):
+        """
+        Get the extracted tree of a dependency, when the remote stores it on a
+        local file system: it is installed without any archive.
+        :param dep: Dependency from the catalog.
+        :return: Path to the tree or None.
+        """
+        return None
+
+    def fetch(self, dep: Dependency, destination: Path, callback=None, checksum=None):
+        """
+        Download the archive of a dependency of the catalog.
+        :param dep: Dependency from the catalog.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: The downloaded file or None.
+        """
+        distant_name = self.archive_name(dep)
+        self.get_file(distant_name, destination)
+        file = destination / Path(distant_name).name
+        if not file.exists():
+            return None
+        if checksum is not None:
+            # get_file() gives no access to the data: read it back.
+            checksum.resume(file)
+        if callback:
+            size = file.stat().st_size
+            callback(size, size)
+        return file
+
+    def stream(self, dep: Dependency, sink, callback=None):
+        """
+        Send the archive of a dependency of the catalog into a writable sink,
+        without storing it. Only available when ``streaming`` is True.
+        :param dep: Dependency from the catalog.
+        :param sink: Object with a ``write`` method.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if the whole archive has been written.
+        """
+        return False
+
+    def send_package(self, dep: Dependency, file: Path, callback=None):
+        """
+        Upload the archive of a dependency, without updating the catalog.
+        :param dep: Dependency's description.
+        :param file: Dependency archive file.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        self.send_file(file, self.archive_name(dep))
+        if callback and self.valid_shape:
+            size = file.stat().st_size
+            callback(size, size)
+        return self.valid_shape
+
+    def send_stream(self, dep: Dependency, source, callback=None):
+        """
+        Upload the archive of a dependency while it is produced, without
+        updating the catalog. Only available when ``streaming_push`` is True.
+        On success, the checksum of the sent archive is recorded in the
+        dependency (``sha256`` and ``size``).
+        :param dep: Dependency's description.
+        :param source: Readable stream of the archive, with a ``checksum``
+            attribute complete once the end of the stream is read.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        return False
+
+    def push_batch(self, items: list, force: bool = False):
+        """
+        Push several dependencies then commit the catalog once.
+
+        A package folder given instead of an archive is compressed while it is
+        uploaded (the remote must support ``streaming_push``).
+        :param items: List of (dependency, archive file or package folder).
+        :param force: If true re-upload files that already exist.
+        :return: List of pushed dependencies.
+        """
+        from depmanager.api.internal.reproducible import package_mtime, tree_hash
+        from depmanager.api.internal.streaming import StreamPacker, file_checksum
+        from depmanager.api.internal.transfer import TransferManager
+
         if not self.valid_shape:
-            return
-        self.dependencies.append(dep)
-        self.send_dep_list()
+            return []
+        for dep, file in items:
+            if file.is_dir() and dep.content in ["", None]:
+                dep.content = tree_hash(file)
+        manager = TransferManager()
+        transfers = []
+        for dep, file in self.filter_push(items, force):
+            if file.is_dir():
+                packer = StreamPacker(file, self.push_compression(), package_mtime(dep))
+                transfers.append(manager.add_push_stream(self, dep, packer))
+                continue
+            checksum = file_checksum(file)
+            dep.sha256 = checksum.hexdigest()
+            dep.size = checksum.size
+            transfers.append(manager.add_push(self, dep, file))
+        manager.run()
+        manager.report()
+        pushed = [transfer.dep for transfer in transfers if transfer.success]
+        if len(pushed) > 0:
+            self.register_dependencies(pushed)
+        return pushed
 
     def pull(self, dep: Dependency, destination: Path):
         """
         Pull a dependency from remote.
         :param dep: Dependency information.
         :param destination: Destination directory
+        :return: The downloaded file name or None.
         """
         if destination.exists() and not destination.is_dir():
-            return
+            return None
+        from depmanager.api.internal.transfer import fetch_verified
+
         deps = self.query(dep)
         if len(deps) != 1:
-            return
-        dep = deps[0]
-        file = f"{dep.properties.name}/{dep.properties.hash()}.tgz"
-        self.get_file(file, destination)
+            return None
+        file = fetch_verified(self, deps[0], destination)
+        if file is None:
+            return None
+        return file.name
 
     def delete(self, dep: Dependency):
         """
@@ -221,7 +542,37 @@ class __RemoteDatabase(__DataBase):
             )
             return
         self.suppress(dep)
-        self.dependencies.remove(dep)
+        self.unregister_dependencies(result)
+
+    def apply_additions(self, deps: list):
+        """
+        Add dependencies to the in-memory catalog, replacing identical entries.
+        :param deps: Dependencies to add.
+        """
+        self.dependencies = [dep for dep in self.dependencies if dep not in deps]
+        self.dependencies += deps
+
+    def apply_removals(self, deps: list):
+        """
+        Remove dependencies from the in-memory catalog.
+        :param deps: Dependencies to remove.
+        """
+        self.dependencies = [dep for dep in self.dependencies if dep not in deps]
+
+    def register_dependencies(self, deps: list):
+        """
+        Add dependencies to the catalog and commit it to the remote.
+        :param deps: Dependencies to add.
+        """
+        self.apply_additions(deps)
+        self.send_dep_list()
+
+    def unregister_dependencies(self, deps: list):
+        """
+        Remove dependencies from the catalog and commit it to the remote.
+        :param deps: Dependencies to remove.
+        """
+        self.apply_removals(deps)
         self.send_dep_list()
 
     def query(self, data: any([str, dict, Dependency, Props]) = None):
@@ -7,7 +7,7 @@ from pathlib import Path
 from depmanager.api.internal.database_common import __DataBase, Dependency
 from depmanager.api.internal.messaging import log
 
-packing_formats = ["tgz", "zip"]
+packing_formats = ["tgz", "zip", "tzst"]
 
 
 class LocalDatabase(__DataBase):
@@ -35,6 +35,9 @@ class LocalDatabase(__DataBase):
             log.debug("Reload local data base.")
             self.dependencies.clear()
             for depend in self.base_path.iterdir():
+                if depend.name.startswith("."):
+                    # a package being copied.
+                    continue
                 dep = Dependency(depend)
                 if not dep.valid:
                     continue
@@ -50,6 +53,7 @@ class LocalDatabase(__DataBase):
         for dep in self.query(deps):
             path = self.base_path / dep.get_path()
             rmtree(path)
+            self.dependencies.remove(dep)
 
     def pack(
         self,
@@ -57,6 +61,7 @@ class LocalDatabase(__DataBase):
         destination: Path,
         archive_format: str = packing_formats[0],
         progress_callback=None,
+        compression=None,
     ):
         """
         Compress the Dependencies.
@@ -65,28 +70,35 @@ class LocalDatabase(__DataBase):
         :param destination: Folder where to put the files.
         :param archive_format: Archive's type.
         :param progress_callback: Optional callback function(bytes_processed: int).
+        :param compression: Level and threads of tgz and tzst archives.
         """
         from zipfile import ZipFile, ZIP_DEFLATED
         import tarfile
+        from depmanager.api.internal.compression import Compression, suffixes
+        from depmanager.api.internal.reproducible import (
+            add_tree,
+            package_mtime,
+            write_zip_tree,
+        )
 
         if archive_format not in packing_formats:
             archive_format = packing_formats[0]
         for dep in self.query(deps):
             dep_path = self.base_path / dep.get_path()
             archive_name = destination / (dep_path.name + f".{archive_format}")
+            if archive_format == "tzst":
+                archive_name = destination / (dep_path.name + suffixes["zstd"])
             archive_name.parent.mkdir(parents=True, exist_ok=True)
             if archive_format == "zip":
                 with ZipFile(archive_name, "w", ZIP_DEFLATED) as zip_file:
-                    for content in dep_path.rglob("*"):
-                        if content.is_file():
-                            zip_file.write(content, content.relative_to(dep_path))
-                            if progress_callback:
-                                progress_callback(content.stat().st_size)
-            elif archive_format == "tgz":
-                with tarfile.open(str(archive_name), "w:gz") as tar_file:
-                    for content in dep_path.rglob("*"):
-                        if content.is_file():
-                            arcname = content.relative_to(dep_path)
-                            tar_file.add(content, arcname=arcname)
-                            if progress_callback:
-                                progress_callback(content.stat().st_size)
+                    write_zip_tree(
+                        zip_file, dep_path, package_mtime(dep), progress_callback
+                    )
+            else:
+                tar_compression = (compression or Compression()).with_format(
+                    "zstd" if archive_format == "tzst" else "gzip"
+                )
+                with open(archive_name, "wb") as fp, tar_compression.writer(
+                    fp
+                ) as writer, tarfile.open(fileobj=writer, mode="w|") as tar_file:
+                    add_tree(tar_file, dep_path, package_mtime(dep), progress_callback)
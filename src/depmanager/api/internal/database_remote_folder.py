@@ -1,12 +1,83 @@
 """
 Remote Folder database.
+
+Packages are stored as archives (``<name>/<hash>.tgz``) or, for remotes
+configured ``uncompressed``, as extracted trees (``<name>/<hash>/``) that
+installs hard-link into the local data folder. Both layouts can be read
+whatever the configuration.
+
+The catalog of a folder remote is made of a snapshot (``deplist.txt``) and of
+append-only journals (``deplist.journal.<generation>``) holding one record per
+line: ``+ <dependency>`` for an addition and ``- <dependency>`` for a removal.
+Writers only append to the journal of the current generation, readers replay
+the snapshot then every journal. When a journal grows too long, it is
+compacted into a new snapshot; a reader seeing the generation change or a
+journal vanish while reading starts again.
 """
 
+import os
+from datetime import datetime, timedelta
 from pathlib import Path
-from shutil import copyfile
+from shutil import rmtree
+from uuid import uuid4
 
 from depmanager.api.internal.database_common import __RemoteDatabase
 from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import (
+    StreamExtractor,
+    copy_file,
+    copy_stream,
+)
+
+# Number of records in the current journal before a compaction is attempted.
+journal_compaction_threshold = 64
+# Age after which a compaction lock is considered stale.
+compaction_lock_timeout = timedelta(minutes=10)
+# Number of reads of a catalog compacted meanwhile before giving up.
+replay_attempts = 5
+
+
+def atomic_write(file: Path, content: str):
+    """
+    Write a file atomically: write a temporary file then rename it.
+    :param file: The file to write.
+    :param content: The content of the file.
+    """
+    temp = file.parent / f".{file.name}.{os.getpid()}.{uuid4().hex}.tmp"
+    try:
+        with open(temp, "w") as fp:
+            fp.write(content)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp, file)
+    finally:
+        temp.unlink(missing_ok=True)
+
+
+def append_record(file: Path, payload: bytes):
+    """
+    Append data to a file with O_APPEND and flush it to the disk.
+    :param file: The file to append to.
+    :param payload: The data to append.
+    """
+    fd = os.open(file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        view = memoryview(payload)
+        while len(view) > 0:
+            written = os.write(fd, view)
+            view = view[written:]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def record_key(line: str):
+    """
+    Get the identifying part of a catalog line.
+    :param line: The catalog line.
+    :return: The key.
+    """
+    return line.split("|", 1)[0].strip()
 
 
 class RemoteDatabaseFolder(__RemoteDatabase):
@@ -18,6 +89,7 @@ class RemoteDatabaseFolder(__RemoteDatabase):
         self,
         destination: str,
         default: bool = False,
+        uncompressed: bool = False,
     ):
         super().__init__(
             destination=Path(destination).resolve(),
@@ -26,6 +98,11 @@ class RemoteDatabaseFolder(__RemoteDatabase):
         )
         self.remote_type = "Folder"
         self.version = "1.0"
+        self.streaming = True
+        self.streaming_push = True
+        self.plain_files = True
+        # store the pushed packages as extracted trees.
+        self.uncompressed = uncompressed
 
     def connect(self):
         """
@@ -33,19 +110,347 @@ class RemoteDatabaseFolder(__RemoteDatabase):
         TO IMPLEMENT IN DERIVED CLASS.
         """
         self.destination.mkdir(parents=True, exist_ok=True)
-        if not (self.destination / "deplist.txt").exists():
+        if not self.snapshot_file().exists():
             self.send_dep_list()
         self.valid_shape = True
 
+    def snapshot_file(self):
+        """
+        Get the catalog snapshot file.
+        :return: Path to the snapshot.
+        """
+        return self.destination / "deplist.txt"
+
+    def generation_file(self):
+        """
+        Get the file holding the current journal generation.
+        :return: Path to the generation file.
+        """
+        return self.destination / "deplist.gen"
+
+    def journal_file(self, generation: int):
+        """
+        Get the journal file of a generation.
+        :param generation: The generation number.
+        :return: Path to the journal.
+        """
+        return self.destination / f"deplist.journal.{generation}"
+
+    def get_generation(self):
+        """
+        Read the current journal generation.
+        :return: The generation number.
+        """
+        try:
+            return int(self.generation_file().read_text().strip())
+        except Exception:
+            return 0
+
+    def get_journals(self):
+        """
+        List the existing journals sorted by generation.
+        :return: List of (generation, path).
+        """
+        journals = []
+        for file in self.destination.glob("deplist.journal.*"):
+            try:
+                journals.append((int(file.suffix[1:]), file))
+            except ValueError:
+                continue
+        return sorted(journals)
+
+    def replay(self):
+        """
+        Rebuild the catalog from the snapshot and the journals. A compaction
+        running meanwhile may replace the snapshot and delete journals already
+        listed: the catalog is then read again.
+        :return: Catalog lines and number of records in the current journal.
+        """
+        for _ in range(replay_attempts):
+            current = self.get_generation()
+            result = self.read_catalog(current)
+            if result is not None and self.get_generation() == current:
+                return result
+            log.debug(f"Catalog of {self.destination} compacted while read, again.")
+        log.warn(f"WARNING: catalog of {self.destination} kept changing while read.")
+        return self.read_catalog(self.get_generation(), complete=False)
+
+    def read_catalog(self, current: int, complete: bool = True):
+        """
+        Read the snapshot then the journals.
+        :param current: The current generation.
+        :param complete: Give up if a journal vanished, else skip it.
+        :return: Catalog lines and number of records in the current journal,
+            None if incomplete.
+        """
+        # listed first: a journal removed afterward is seen missing.
+        journals = self.get_journals()
+        state = {}
+        with open(self.snapshot_file()) as fp:
+            for line in fp.read().splitlines():
+                if line.strip() != "":
+                    state[record_key(line)] = line
+        current_records = 0
+        for generation, journal in journals:
+            try:
+                content = journal.read_text()
+            except FileNotFoundError:
+                # removed by a compaction: the snapshot read may be older.
+                if complete:
+                    return None
+                continue
+            # an unterminated last line is a torn write: ignore it.
+            for record in content.split("\n")[:-1]:
+                if generation == current:
+                    current_records += 1
+                if record.startswith("+ "):
+                    state[record_key(record[2:])] = record[2:]
+                elif record.startswith("- "):
+                    state.pop(record_key(record[2:]), None)
+        return list(state.values()), current_records
+
+    def get_dep_list(self):
+        """
+        Get a list of string describing dependency from the server.
+        """
+        if not self.valid_shape:
+            return
+        self.dependencies = []
+        if not self.snapshot_file().exists():
+            self.valid_shape = False
+            return
+        lines, _ = self.replay()
+        self.deps_from_strings(lines)
+
+    def send_dep_list(self):
+        """
+        Write the full list of dependencies as a new snapshot.
+        """
+        if not self.valid_shape:
+            return
+        lines = self.deps_to_strings()
+        atomic_write(self.snapshot_file(), "".join(f"{line}\n" for line in lines))
+
+    def append_journal(self, records: list):
+        """
+        Append records to the journal of the current generation.
+        :param records: The records to append.
+        """
+        payload = "".join(f"{record}\n" for record in records).encode("utf8")
+        generation = self.get_generation()
+        append_record(self.journal_file(generation), payload)
+        new_generation = self.get_generation()
+        if new_generation != generation:
+            # a compaction started meanwhile: replaying records is idempotent.
+            append_record(self.journal_file(new_generation), payload)
+        journal = self.journal_file(new_generation)
+        try:
+            count = journal.read_bytes().count(b"\n")
+        except FileNotFoundError:
+            count = 0
+        if count >= journal_compaction_threshold:
+            self.compact()
+
+    def compact(self):
+        """
+        Fold the journals into a new snapshot.
+        :return: True if compaction done.
+        """
+        lock = self.destination / "deplist.compact.lock"
+        try:
+            fd = os.open(lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            try:
+                age = datetime.now() - datetime.fromtimestamp(lock.stat().st_mtime)
+                if age > compaction_lock_timeout:
+                    log.warn(f"Removing stale catalog compaction lock {lock}.")
+                    lock.unlink(missing_ok=True)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            generation = self.get_generation()
+            atomic_write(self.generation_file(), f"{generation + 1}\n")
+            lines, _ = self.replay()
+            atomic_write(self.snapshot_file(), "".join(f"{line}\n" for line in lines))
+            for old_generation, journal in self.get_journals():
+                if old_generation <= generation:
+                    journal.unlink(missing_ok=True)
+            log.debug(
+                f"Catalog of {self.destination} compacted ({len(lines)} entries)."
+            )
+            return True
+        except Exception as err:
+            log.error(f"Catalog compaction of {self.destination} failed: {err}")
+            return False
+        finally:
+            os.close(fd)
+            lock.unlink(missing_ok=True)
+
+    def register_dependencies(self, deps: list):
+        """
+        Add dependencies to the catalog and commit it to the remote.
+        :param deps: Dependencies to add.
+        """
+        self.apply_additions(deps)
+        self.append_journal([f"+ {self.dep_to_string(dep)}" for dep in deps])
+
+    def unregister_dependencies(self, deps: list):
+        """
+        Remove dependencies from the catalog and commit it to the remote.
+        :param deps: Dependencies to remove.
+        """
+        self.apply_removals(deps)
+        self.append_journal([f"- {self.dep_to_string(dep)}" for dep in deps])
+
+    @staticmethod
+    def tree_name(dep):
+        """
+        Get the location of a dependency's extracted tree on the remote.
+        :param dep: Dependency information.
+        :return: The distant name.
+        """
+        return f"{dep.properties.name}/{dep.properties.hash()}"
+
+    def package_folder(self, dep):
+        """
+        Get the extracted tree of a dependency, if stored uncompressed.
+        :param dep: Dependency information.
+        :return: Path to the tree or None.
+        """
+        folder = self.destination / self.tree_name(dep)
+        if not folder.is_dir():
+            return None
+        return folder
+
+    def send_package(self, dep, file: Path, callback=None):
+        """
+        Upload the archive of a dependency, without updating the catalog.
+        An uncompressed remote stores the extracted archive: the archive
+        checksum does not apply and is removed from the dependency.
+        :param dep: Dependency's description.
+        :param file: Dependency archive file.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        archive = self.destination / self.archive_name(dep)
+        tree = self.destination / self.tree_name(dep)
+        if not self.uncompressed:
+            self.send_file(file, self.archive_name(dep))
+            rmtree(tree, ignore_errors=True)
+        else:
+            if not self.store_tree(file, tree):
+                return False
+            archive.unlink(missing_ok=True)
+            dep.sha256 = ""
+            dep.size = 0
+        if callback:
+            size = file.stat().st_size
+            callback(size, size)
+        return True
+
+    def send_stream(self, dep, source, callback=None):
+        """
+        Write the archive of a dependency while it is produced, without
+        updating the catalog. An uncompressed remote extracts it on the fly.
+        :param dep: Dependency's description.
+        :param source: Readable stream of the archive, with a ``checksum``.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        archive = self.destination / self.archive_name(dep)
+        tree = self.destination / self.tree_name(dep)
+        target = [archive, tree][self.uncompressed]
+        temp = target.parent / f".{target.name}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if self.uncompressed:
+                extractor = StreamExtractor(temp)
+                extractor.start()
+                success = False
+                try:
+                    copy_stream(source, extractor, callback)
+                    success = True
+                finally:
+                    if not extractor.finish(success):
+                        raise OSError(f"extraction failed: {extractor.error}")
+                rmtree(tree, ignore_errors=True)
+                os.replace(temp, tree)
+                archive.unlink(missing_ok=True)
+                dep.sha256 = ""
+                dep.size = 0
+            else:
+                with open(temp, "wb") as fp:
+                    copy_stream(source, fp, callback)
+                os.replace(temp, archive)
+                rmtree(tree, ignore_errors=True)
+                dep.sha256 = source.checksum.hexdigest()
+                dep.size = source.checksum.size
+        except OSError as err:
+            log.warn(f"WARNING: cannot store {target}: {err}")
+            return False
+        finally:
+            if temp.is_dir():
+                rmtree(temp, ignore_errors=True)
+            else:
+                temp.unlink(missing_ok=True)
+        return True
+
+    @staticmethod
+    def store_tree(file: Path, tree: Path):
+        """
+        Extract an archive as a tree of the remote, replacing the existing one.
+        :param file: The archive.
+        :param tree: The tree to create.
+        :return: True if success.
+        """
+        import tarfile
+
+        from depmanager.api.internal.compression import open_tar_stream
+        from depmanager.api.internal.extraction import extract_tar
+
+        temp = tree.parent / f".{tree.name}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            temp.mkdir(parents=True)
+            with open(file, "rb") as fp, open_tar_stream(fp) as archive:
+                extract_tar(archive, temp, file.name)
+            rmtree(tree, ignore_errors=True)
+            os.replace(temp, tree)
+        except (OSError, tarfile.TarError) as err:
+            log.warn(f"WARNING: cannot store {file} in {tree}: {err}")
+            return False
+        finally:
+            rmtree(temp, ignore_errors=True)
+        return True
+
+    @staticmethod
+    def pack_tree(tree: Path, file: Path):
+        """
+        Create the archive of a stored tree.
+        :param tree: The tree.
+        :param file: The archive to create.
+        """
+        import tarfile
+
+        from depmanager.api.internal.compression import Compression
+        from depmanager.api.internal.reproducible import add_tree
+
+        with open(file, "wb") as fp, Compression().writer(
+            fp
+        ) as compressor, tarfile.open(fileobj=compressor, mode="w|") as archive:
+            add_tree(archive, tree)
+
     def suppress(self, dep) -> bool:
         """
         Suppress the dependency from the server
         :param dep: Dependency information.
         :return: True if success.
         """
-        destination = Path(
-            self.destination / f"{dep.properties.name}" / f"{dep.properties.hash()}.tgz"
-        )
+        tree = self.package_folder(dep)
+        if tree is not None:
+            rmtree(tree, ignore_errors=True)
+            return True
+        destination = Path(self.destination / self.archive_name(dep))
         try:
             destination.unlink()
         except Exception as err:
@@ -55,6 +460,65 @@ class RemoteDatabaseFolder(__RemoteDatabase):
             return False
         return True
 
+    def archive_size(self, dep) -> int:
+        """
+        Get the size of a dependency's archive, used to schedule transfers.
+        :param dep: Dependency information.
+        :return: The size in bytes, 0 if unknown.
+        """
+        try:
+            return (self.destination / self.archive_name(dep)).stat().st_size
+        except OSError:
+            return 0
+
+    def fetch(self, dep, destination: Path, callback=None, checksum=None):
+        """
+        Download the archive of a dependency of the catalog.
+        :param dep: Dependency from the catalog.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: The downloaded file or None.
+        """
+        source = self.destination / self.archive_name(dep)
+        file = destination / source.name
+        tree = self.package_folder(dep)
+        try:
+            destination.mkdir(parents=True, exist_ok=True)
+            file.unlink(missing_ok=True)
+            if tree is not None:
+                self.pack_tree(tree, file)
+            else:
+                # the archive is only read then deleted: a link is enough.
+                copy_file(source, file, link=True)
+        except OSError as err:
+            log.warn(f"WARNING: error reading {source}: {err}")
+            file.unlink(missing_ok=True)
+            return None
+        if checksum is not None:
+            checksum.resume(file)
+        if callback:
+            size = file.stat().st_size
+            callback(size, size)
+        return file
+
+    def stream(self, dep, sink, callback=None):
+        """
+        Send the archive of a dependency of the catalog into a writable sink.
+        :param dep: Dependency from the catalog.
+        :param sink: Object with a ``write`` method.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if the whole archive has been written.
+        """
+        source = self.destination / self.archive_name(dep)
+        try:
+            with open(source, "rb") as fp:
+                copy_stream(fp, sink, callback, source.stat().st_size)
+        except OSError as err:
+            log.warn(f"WARNING: error reading {source}: {err}")
+            return False
+        return True
+
     def get_file(self, distant_name: str, destination: Path):
         """
         Download a file.
@@ -66,7 +530,7 @@ class RemoteDatabaseFolder(__RemoteDatabase):
         if not source.is_file():
             return
         destination.mkdir(parents=True, exist_ok=True)
-        copyfile(source, destination / source.name)
+        copy_file(source, destination / source.name)
 
     def send_file(self, source: Path, distant_name: str):
         """
@@ -79,7 +543,7 @@ class RemoteDatabaseFolder(__RemoteDatabase):
             return
         distant = self.destination / distant_name
         distant.parent.mkdir(parents=True, exist_ok=True)
-        copyfile(source, distant)
+        copy_file(source, distant)
 
     def get_server_version(self):
         """
@@ -3,17 +3,38 @@ Remote FTP database
 """
 
 import ftplib
+import os
+import threading
 from pathlib import Path
+from time import monotonic, sleep
 
 from depmanager.api.internal.database_common import __RemoteDatabase
 from depmanager.api.internal.messaging import log
+from depmanager.api.internal.resilience import RemoteUnavailable, backoff_delay
+from depmanager.api.internal.streaming import TransferCancelled, stream_buffer_size
+
+# Errors meaning that the control connection is no longer usable.
+connection_errors = (EOFError, OSError, ftplib.error_temp, ftplib.error_reply)
+# Default number of simultaneous ftp sessions.
+default_connections = 4
+# Number of tries of a download, the first one included.
+download_attempts = 4
 
 
 class RemoteDatabaseFtp(__RemoteDatabase):
     """
     Remote database using ftp protocol.
+
+    Transfers go through a pool of logged-in sessions: up to ``connections``
+    files are downloaded or uploaded at the same time, each worker reusing an
+    idle session of the pool.
     """
 
+    # Factory of the ftp sessions.
+    ftp_factory = ftplib.FTP
+    # Idle time (in seconds) after which the session is checked with a NOOP.
+    keepalive_interval = 30.0
+
     def __init__(
         self,
         destination: str,
@@ -21,9 +42,16 @@ class RemoteDatabaseFtp(__RemoteDatabase):
         default: bool = False,
         user: str = "",
         cred: str = "",
+        connections: int = default_connections,
     ):
         self.port = port
-        self.ftp = ftplib.FTP()
+        self.connections = max(1, connections)
+        self.idle = []
+        self.opened = 0
+        self.pool_lock = threading.Condition()
+        self.cache_lock = threading.RLock()
+        self.dir_cache = {}
+        self.use_mlsd = True
         super().__init__(
             destination=destination,
             default=default,
@@ -33,41 +61,419 @@ class RemoteDatabaseFtp(__RemoteDatabase):
         )
         self.remote_type = "FTP"
         self.version = "1.0"
+        self.max_transfers = self.connections
+        self.streaming = True
+        self.streaming_push = True
+        self.plain_files = True
 
-    def connect(self):
+    def open_session(self):
         """
-        Initialize the connection to remote host.
-        TO IMPLEMENT IN DERIVED CLASS.
+        Open and log in a new ftp session.
+        :return: The ftp session.
         """
         url = self.destination
         path = ""
         if "/" in url:
             url, path = url.split("/", 1)
+        if not self.breaker.allow():
+            raise RemoteUnavailable(f"{self.destination} is unavailable")
+        ftp = self.ftp_factory()
         try:
-            self.ftp.connect(url, self.port)
-            self.ftp.login(self.user, self.cred)
-            if path != "":
-                self.ftp.cwd(f"/{path}")
-            self.valid_shape = True
+            ftp.connect(url, self.port, timeout=self.timeout[0])
+        except connection_errors:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        # transfers may stall longer than a connection.
+        ftp.timeout = self.timeout[1]
+        if getattr(ftp, "sock", None) is not None:
+            ftp.sock.settimeout(self.timeout[1])
+        ftp.login(self.user, self.cred)
+        if path != "":
+            ftp.cwd(f"/{path}")
+        return ftp
+
+    @staticmethod
+    def close_session(ftp):
+        """
+        Close an ftp session, ignoring errors.
+        :param ftp: The session to close.
+        """
+        if ftp is None:
+            return
+        try:
+            ftp.quit()
+        except Exception:
+            try:
+                ftp.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        """
+        Close the idle sessions of the pool.
+        """
+        with self.pool_lock:
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+            self.pool_lock.notify_all()
+        for ftp, _ in idle:
+            self.close_session(ftp)
+
+    def connect(self):
+        """
+        Initialize the connection to remote host.
+        TO IMPLEMENT IN DERIVED CLASS.
+        """
+        self.close_all()
+        try:
+            self.run(lambda ftp: None)
         except Exception as err:
             self.valid_shape = False
             log.error(f"while connecting to ftp server {self.destination}: {err}.")
+            return
+        self.valid_shape = True
+
+    def acquire(self):
+        """
+        Take a live session from the pool, opening one if the pool is not full.
+        An idle session is checked with a NOOP and a dropped one is reopened.
+        :return: The ftp session.
+        """
+        with self.pool_lock:
+            while len(self.idle) == 0 and self.opened >= self.connections:
+                self.pool_lock.wait()
+            if len(self.idle) > 0:
+                ftp, last_activity = self.idle.pop()
+            else:
+                ftp, last_activity = None, 0.0
+                self.opened += 1
+        try:
+            if (
+                ftp is not None
+                and monotonic() - last_activity > self.keepalive_interval
+            ):
+                try:
+                    ftp.voidcmd("NOOP")
+                except ftplib.all_errors as err:
+                    log.debug(
+                        f"FTP session to {self.destination} lost ({err}), reconnect."
+                    )
+                    self.close_session(ftp)
+                    ftp = None
+            if ftp is None:
+                ftp = self.open_session()
+        except Exception:
+            self.discard(None)
+            raise
+        return ftp
 
-    def get_file(self, distant_name: str, destination: Path):
+    def release(self, ftp):
+        """
+        Give a session back to the pool.
+        :param ftp: The session.
+        """
+        with self.pool_lock:
+            self.idle.append((ftp, monotonic()))
+            self.pool_lock.notify()
+
+    def discard(self, ftp):
+        """
+        Close a broken session and free its slot in the pool.
+        :param ftp: The session.
+        """
+        self.close_session(ftp)
+        with self.pool_lock:
+            self.opened -= 1
+            self.pool_lock.notify()
+
+    def run(self, action, retry: bool = True):
+        """
+        Run an action on a pooled session. If the session dropped or could not
+        be opened, the action is tried again after a jittered exponential delay.
+        :param action: Function taking the ftp session.
+        :param retry: If False, a dropped session is not retried.
+        :return: The action's result.
+        """
+        attempts = self.attempts if retry else 1
+        for attempt in range(1, attempts + 1):
+            ftp = None
+            try:
+                ftp = self.acquire()
+                result = action(ftp)
+            except connection_errors as err:
+                if ftp is not None:
+                    self.discard(ftp)
+                if attempt == attempts or isinstance(err, RemoteUnavailable):
+                    raise
+                log.debug(f"FTP session to {self.destination} lost ({err}), retrying.")
+                sleep(backoff_delay(attempt))
+                continue
+            except TransferCancelled:
+                # the transfer was left in the middle: the session is unusable.
+                self.discard(ftp)
+                raise
+            except Exception:
+                if ftp is not None:
+                    self.release(ftp)
+                raise
+            self.release(ftp)
+            return result
+
+    def list_dir(self, ftp, path: str):
+        """
+        Get the entries of a remote directory, listed once and cached.
+        Must be called with the cache lock held.
+        :param ftp: The ftp session.
+        :param path: The directory, empty for the root.
+        :return: Set of entry names.
+        """
+        if path in self.dir_cache:
+            return self.dir_cache[path]
+        names = None
+        if self.use_mlsd:
+            try:
+                names = {name for name, _ in ftp.mlsd(path, facts=["type"])}
+            except ftplib.error_perm:
+                log.debug(f"FTP server {self.destination} has no MLSD, using NLST.")
+                self.use_mlsd = False
+        if names is None:
+            try:
+                entries = ftp.nlst(path) if path != "" else ftp.nlst()
+            except ftplib.error_perm:
+                # some servers answer an error for an empty directory.
+                entries = []
+            names = {entry.rstrip("/").rsplit("/", 1)[-1] for entry in entries}
+        names -= {".", ".."}
+        self.dir_cache[path] = names
+        return names
+
+    def make_dirs(self, ftp, distant_name: str):
+        """
+        Create the missing parent directories of a remote file.
+        :param ftp: The ftp session.
+        :param distant_name: Name in the distant location.
+        """
+        cur_dir = ""
+        with self.cache_lock:
+            for sub in distant_name.split("/")[:-1]:
+                candidate = f"{sub}"
+                if cur_dir != "":
+                    candidate = f"{cur_dir}/{candidate}"
+                if sub not in self.list_dir(ftp, cur_dir):
+                    try:
+                        ftp.mkd(candidate)
+                    except ftplib.error_perm as err:
+                        # probably created meanwhile by someone else.
+                        log.debug(f"FTP mkd {candidate}: {err}")
+                    self.dir_cache[cur_dir].add(sub)
+                    self.dir_cache[candidate] = set()
+                cur_dir = candidate
+
+    def update_dir_cache(self, distant_name: str, present: bool):
+        """
+        Record the creation or deletion of a remote file in the listing cache.
+        :param distant_name: Name in the distant location.
+        :param present: True if the file now exists.
+        """
+        parent, _, name = distant_name.rpartition("/")
+        with self.cache_lock:
+            if parent not in self.dir_cache:
+                return
+            if present:
+                self.dir_cache[parent].add(name)
+            else:
+                self.dir_cache[parent].discard(name)
+
+    def get_file(
+        self, distant_name: str, destination: Path, callback=None, checksum=None
+    ):
         """
         Download a file.
         TO IMPLEMENT IN DERIVED CLASS.
+
+        The data is written to a ``.part`` file, renamed once its size matches
+        the remote one. An interrupted download is resumed with ``REST``.
         :param distant_name: Name in the distant location.
         :param destination: Destination path.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
         """
-        file_name = Path(distant_name).name
+        file_name = destination / Path(distant_name).name
+        part = file_name.with_name(f"{file_name.name}.part")
+
+        def download(ftp):
+            try:
+                size = ftp.size(distant_name)
+            except ftplib.all_errors:
+                size = None
+            offset = part.stat().st_size if part.exists() else 0
+            if checksum is not None and checksum.size != offset:
+                # partial file of a previous run.
+                checksum.resume(part)
+            with open(part, "ab") as handler:
+                target = handler
+                if checksum is not None:
+                    target = checksum.tee(handler)
+                write = target.write
+                if callback:
+                    if offset > 0:
+                        callback(offset, size or 0)
+
+                    def write(block):
+                        target.write(block)
+                        callback(len(block), size or 0)
+
+                try:
+                    ftp.retrbinary(
+                        f"RETR {distant_name}",
+                        write,
+                        blocksize=stream_buffer_size,
+                        rest=offset or None,
+                    )
+                except ftplib.error_perm:
+                    if offset == 0:
+                        raise
+                    # the server refused to restart: download from scratch.
+                    handler.truncate(0)
+                    if checksum is not None:
+                        checksum.reset()
+                    ftp.retrbinary(
+                        f"RETR {distant_name}",
+                        write,
+                        blocksize=stream_buffer_size,
+                    )
+            return size
+
+        for attempt in range(1, download_attempts + 1):
+            try:
+                size = self.run(download)
+            except TransferCancelled:
+                part.unlink(missing_ok=True)
+                raise
+            except connection_errors as err:
+                if attempt < download_attempts:
+                    log.warn(
+                        f"WARNING: download of {distant_name} interrupted, resuming."
+                    )
+                    continue
+                log.warn(
+                    f"WARNING: error getting {distant_name} from FTP {self.destination}: {err}"
+                )
+                return
+            except Exception as err:
+                log.warn(
+                    f"WARNING: error getting {distant_name} from FTP {self.destination}: {err}"
+                )
+                part.unlink(missing_ok=True)
+                return
+            received = part.stat().st_size
+            if size is None or received == size:
+                os.replace(part, file_name)
+                return
+            log.debug(f"download of {distant_name}: got {received} of {size} bytes.")
+            if received > size:
+                part.unlink()
+        log.warn(
+            f"WARNING: error getting {distant_name} from FTP {self.destination}: size mismatch."
+        )
+
+    def fetch(self, dep, destination: Path, callback=None, checksum=None):
+        """
+        Download the archive of a dependency of the catalog.
+        :param dep: Dependency from the catalog.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: The downloaded file or None.
+        """
+        distant_name = self.archive_name(dep)
+        self.get_file(distant_name, destination, callback, checksum)
+        file = destination / Path(distant_name).name
+        if not file.exists():
+            return None
+        return file
+
+    def stream(self, dep, sink, callback=None):
+        """
+        Send the archive of a dependency of the catalog into a writable sink.
+        The data cannot be rewound: an interrupted transfer is not resumed.
+        :param dep: Dependency from the catalog.
+        :param sink: Object with a ``write`` method.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if the whole archive has been written.
+        """
+        distant_name = self.archive_name(dep)
+
+        def transfer(ftp):
+            try:
+                size = ftp.size(distant_name)
+            except ftplib.all_errors:
+                size = None
+
+            def write(block):
+                sink.write(block)
+                if callback:
+                    callback(len(block), size or 0)
+
+            ftp.retrbinary(f"RETR {distant_name}", write, blocksize=stream_buffer_size)
+
         try:
-            with open(destination / file_name, "wb") as handler:
-                self.ftp.retrbinary(f"RETR {distant_name}", handler.write)
+            self.run(transfer, retry=False)
         except Exception as err:
             log.warn(
-                f"WARNING: error getting {distant_name} from FTP {self.destination}: {err}"
+                f"WARNING: error streaming {distant_name} from FTP {self.destination}: {err}"
             )
+            return False
+        return True
+
+    def send_package(self, dep, file: Path, callback=None):
+        """
+        Upload the archive of a dependency, without updating the catalog.
+        :param dep: Dependency's description.
+        :param file: Dependency archive file.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        return self.send_file(file, self.archive_name(dep), callback)
+
+    def send_stream(self, dep, source, callback=None):
+        """
+        Upload the archive of a dependency while it is produced, without
+        updating the catalog. The data cannot be rewound: an interrupted
+        transfer is not retried.
+        :param dep: Dependency's description.
+        :param source: Readable stream of the archive, with a ``checksum``.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        distant_name = self.archive_name(dep)
+        block_callback = None
+        if callback:
+
+            def block_callback(block):
+                callback(len(block), 0)
+
+        def upload(ftp):
+            self.make_dirs(ftp, distant_name)
+            ftp.storbinary(
+                f"STOR {distant_name}",
+                source,
+                blocksize=stream_buffer_size,
+                callback=block_callback,
+            )
+
+        try:
+            self.run(upload, retry=False)
+        except Exception as err:
+            log.warn(
+                f"WARNING: error sending {distant_name} to FTP {self.destination}: {err}"
+            )
+            return False
+        self.update_dir_cache(distant_name, True)
+        dep.sha256 = source.checksum.hexdigest()
+        dep.size = source.checksum.size
+        return True
 
     def suppress(self, dep) -> bool:
         """
@@ -75,41 +481,52 @@ class RemoteDatabaseFtp(__RemoteDatabase):
         :param dep: Dependency information.
         :return: True if success.
         """
-        destination = f"{dep.properties.name}/{dep.properties.hash()}.tgz"
+        destination = self.archive_name(dep)
         try:
-            self.ftp.delete(destination)
+            self.run(lambda ftp: ftp.delete(destination))
         except Exception as err:
             log.warn(
                 f"WARNING: unable to suppress file {destination} on FTP server: {err}"
             )
             return False
+        self.update_dir_cache(destination, False)
         return True
 
-    def send_file(self, source: Path, distant_name: str):
+    def send_file(self, source: Path, distant_name: str, callback=None):
         """
         Upload a file.
         TO IMPLEMENT IN DERIVED CLASS.
         :param source: File to upload.
         :param distant_name: Name in the distant location.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
         """
-        if "/" in distant_name:
-            items = distant_name.split("/")
-            items = items[:-1]
-            cur_dir = ""
-            for sub in items:
-                candidate = f"{sub}"
-                if cur_dir != "":
-                    candidate = f"{cur_dir}/{candidate}"
-                if sub not in self.ftp.nlst(cur_dir):
-                    self.ftp.mkd(candidate)
-                cur_dir = candidate
-        try:
+        block_callback = None
+        if callback:
+            size = source.stat().st_size
+
+            def block_callback(block):
+                callback(len(block), size)
+
+        def upload(ftp):
+            self.make_dirs(ftp, distant_name)
             with open(source, "rb") as handler:
-                self.ftp.storbinary(f"STOR {distant_name}", handler)
+                ftp.storbinary(
+                    f"STOR {distant_name}",
+                    handler,
+                    blocksize=stream_buffer_size,
+                    callback=block_callback,
+                )
+
+        try:
+            self.run(upload)
         except Exception as err:
             log.warn(
                 f"WARNING: error sending {distant_name} to FTP {self.destination}: {err}"
             )
+            return False
+        self.update_dir_cache(distant_name, True)
+        return True
 
     def get_server_version(self):
         """
@@ -2,17 +2,42 @@
 Remote FTP database
 """
 
+import os
 from datetime import datetime
 from pathlib import Path
-
-from requests import get as http_get, post as http_post
+from uuid import uuid4
+
+from requests import (
+    ConnectionError as HttpConnectionError,
+    RequestException,
+    Timeout,
+    get as http_get,
+    post as http_post,
+)
 from requests.auth import HTTPBasicAuth
 from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+from urllib3.exceptions import HTTPError
 
 from depmanager.api.internal.common import client_api
+from depmanager.api.internal.compression import parse_formats
 from depmanager.api.internal.database_common import __RemoteDatabase
 from depmanager.api.internal.dependency import Dependency, version_lt
 from depmanager.api.internal.messaging import log
+from depmanager.api.internal.resilience import (
+    RemoteUnavailable,
+    backoff_delay,
+    transient_statuses,
+)
+from depmanager.api.internal.streaming import (
+    TransferCancelled,
+    copy_stream,
+    stream_buffer_size,
+)
+
+# Number of tries of a download, the first one included.
+download_attempts = 4
+# Number of simultaneous transfers with a server.
+default_transfers = 4
 
 
 class RemoteDatabaseServer(__RemoteDatabase):
@@ -28,6 +53,7 @@ class RemoteDatabaseServer(__RemoteDatabase):
         default: bool = False,
         user: str = "",
         cred: str = "",
+        chunked_upload: bool = False,
     ):
         self.port = port
         if self.port == -1:
@@ -57,6 +83,49 @@ class RemoteDatabaseServer(__RemoteDatabase):
         self.upload_url = "/upload"
         self.version = "1.0"
         self.connected = False
+        self.max_transfers = default_transfers
+        self.streaming = True
+        # send pushes as chunked requests, compressed while they are uploaded.
+        self.streaming_push = chunked_upload
+
+    def request(self, method, url: str, idempotent: bool = True, **kwargs):
+        """
+        Send a request to the server with the remote's timeouts.
+
+        Transient failures (connection error, timeout, 5xx or 429 answer) of
+        idempotent requests are tried again after a jittered exponential
+        delay. Every result feeds the circuit breaker, and no request is sent
+        while it is open.
+        :param method: The requests function (``http_get`` or ``http_post``).
+        :param url: The full url.
+        :param idempotent: If the request may be sent again.
+        :param kwargs: Arguments of the requests function.
+        :return: The server response, the last one if all tries failed.
+        """
+        from time import sleep
+
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.attempts if idempotent else 1
+        for attempt in range(1, attempts + 1):
+            if not self.breaker.allow():
+                raise RemoteUnavailable(f"{self.destination} is unavailable")
+            try:
+                resp = method(url, **kwargs)
+            except (HttpConnectionError, Timeout) as err:
+                self.breaker.record_failure()
+                if attempt == attempts:
+                    raise
+                log.debug(f"request to {url} failed ({err}), retrying.")
+            else:
+                if resp.status_code not in transient_statuses:
+                    self.breaker.record_success()
+                    return resp
+                self.breaker.record_failure()
+                if attempt == attempts:
+                    return resp
+                log.debug(f"request to {url}: {resp.status_code}, retrying.")
+                resp.close()
+            sleep(backoff_delay(attempt))
 
     def connect(self):
         """
@@ -67,7 +136,8 @@ class RemoteDatabaseServer(__RemoteDatabase):
             return
         basic = HTTPBasicAuth(self.user, self.cred)
         try:
-            resp = http_post(
+            resp = self.request(
+                http_post,
                 f"{self.destination}{self.api_url}",
                 auth=basic,
                 data={"action": "version"},
@@ -90,6 +160,11 @@ class RemoteDatabaseServer(__RemoteDatabase):
                     self.server_api_version = (
                         line.strip().split("api_version:")[-1].strip()
                     )
+                elif line.startswith("formats:"):
+                    formats = line.split("formats:")[-1].split(",")
+                    self.archive_formats = parse_formats(
+                        [item.strip() for item in formats if item.strip()]
+                    )
 
             log.debug(
                 f"Connected to server {self.destination} version {self.version} API: {self.server_api_version}"
@@ -113,11 +188,16 @@ class RemoteDatabaseServer(__RemoteDatabase):
             headers = {
                 "X-API-Version": client_api,
             }
-            resp = http_get(
-                f"{self.destination}{self.api_url}", auth=basic, headers=headers
+            resp = self.request(
+                http_get,
+                f"{self.destination}{self.api_url}",
+                auth=basic,
+                headers=headers,
             )
             if resp.status_code != 200:
                 self.valid_shape = False
+                # connect again on next use, unless the answer is final.
+                self.connected = resp.status_code not in transient_statuses
                 log.error(
                     f"connecting to server: {self.destination}: {resp.status_code}: {resp.reason}"
                 )
@@ -126,6 +206,8 @@ class RemoteDatabaseServer(__RemoteDatabase):
             data = resp.text.splitlines(keepends=False)
             self.deps_from_strings(data)
         except Exception as err:
+            self.valid_shape = False
+            self.connected = False
             log.error(f"Exception during server connexion: {self.destination}: {err}")
             return
 
@@ -174,13 +256,252 @@ class RemoteDatabaseServer(__RemoteDatabase):
             data["dependencies"] = f"{dep.properties.dependencies}"
             if dep.description not in ["", None]:
                 data["description"] = f"{dep.description}"
+            if dep.sha256 not in ["", None]:
+                data["sha256"] = dep.sha256
+                data["size"] = f"{dep.size}"
+            if dep.content not in ["", None]:
+                data["content"] = dep.content
         return data
 
+    def get_download_url(self, dep: Dependency):
+        """
+        Ask the server for the download url of a dependency.
+        :param dep: Dependency information.
+        :return: The url path on the server or None.
+        """
+        try:
+            basic = HTTPBasicAuth(self.user, self.cred)
+            post_data = {"action": "pull"} | self.dep_to_code(dep)
+            resp = self.request(
+                http_post,
+                f"{self.destination}{self.api_url}",
+                auth=basic,
+                data=post_data,
+            )
+            if resp.status_code != 200:
+                self.valid_shape = False
+                log.error(
+                    f"connecting to server: {self.destination}: {resp.status_code}: {resp.reason}"
+                )
+                log.error(f"      Server Data: {resp.text}")
+                return None
+            return resp.text.strip()
+        except Exception as err:
+            log.error(f"Exception during server pull: {self.destination}: {err}")
+            return None
+
+    def get_download_name(self, dep: Dependency, url: str):
+        """
+        Compute the local file name of a downloaded archive.
+        :param dep: Dependency information.
+        :param url: The url path given by the server.
+        :return: The file name.
+        """
+        filename = url.rsplit("/", 1)[-1]
+        if filename.startswith(dep.properties.name):
+            filename = filename.replace(dep.properties.name, "")
+        return filename
+
+    def download(self, url: str, file_name: Path, callback=None, checksum=None):
+        """
+        Download a file from the server.
+
+        The data is written to a ``.part`` file, renamed once its size matches
+        the one announced by the server. After a dropped connection, the
+        download is resumed with a ``Range`` request, also from a ``.part``
+        file left by a previous attempt.
+        :param url: The url path on the server.
+        :param file_name: Local file to write.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: True if success.
+        """
+        part = file_name.with_name(f"{file_name.name}.part")
+        for attempt in range(1, download_attempts + 1):
+            status = self.download_part(url, part, callback, checksum)
+            if status is None:
+                return False
+            if status:
+                os.replace(part, file_name)
+                return True
+            if attempt < download_attempts:
+                log.warn(f"WARNING: download of {url} interrupted, resuming.")
+        log.error(
+            f"retrieving file {url} from server {self.destination}: too many failures."
+        )
+        return False
+
+    def download_part(self, url: str, part: Path, callback=None, checksum=None):
+        """
+        Download or resume a ``.part`` file once.
+        :param url: The url path on the server.
+        :param part: The partial local file.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: True if complete, False if worth resuming, None on fatal error.
+        """
+        offset = part.stat().st_size if part.exists() else 0
+        try:
+            resp = self.request_download(url, offset)
+        except RequestException as err:
+            log.warn(f"Exception during server pull: {self.destination}: {err}")
+            return False
+        except Exception as err:
+            log.error(f"Exception during server pull: {self.destination}: {err}")
+            return None
+        with resp:
+            if resp.status_code == 416 and offset > 0:
+                # the partial file does not fit the remote one: restart.
+                part.unlink()
+                return False
+            if resp.status_code not in [200, 206]:
+                self.download_error(url, resp)
+                return None
+            if resp.status_code == 200:
+                # no range support, or a fresh download.
+                offset = 0
+            total_size = self.expected_size(resp, offset)
+            if callback and offset > 0:
+                callback(offset, total_size)
+            if checksum is not None:
+                if offset == 0:
+                    checksum.reset()
+                elif checksum.size != offset:
+                    # partial file of a previous run.
+                    checksum.resume(part)
+            try:
+                with open(part, "r+b" if offset > 0 else "wb") as fp:
+                    fp.seek(offset)
+                    fp.truncate()
+                    writer = checksum.tee(fp) if checksum is not None else fp
+                    copy_stream(resp.raw, writer, callback, total_size)
+            except TransferCancelled:
+                raise
+            except (RequestException, HTTPError, OSError) as err:
+                log.debug(f"download of {url} interrupted: {err}")
+                return False
+            except Exception as err:
+                log.error(f"Exception during server pull: {self.destination}: {err}")
+                return None
+        size = part.stat().st_size
+        if total_size > 0 and size != total_size:
+            log.debug(f"download of {url}: got {size} bytes out of {total_size}.")
+            if size > total_size:
+                part.unlink()
+            return False
+        return True
+
+    def request_download(self, url: str, offset: int = 0):
+        """
+        Send the request of a file download, the body being streamed.
+        :param url: The url path on the server.
+        :param offset: First byte to get.
+        :return: The server response.
+        """
+        basic = HTTPBasicAuth(self.user, self.cred)
+        headers = {
+            "X-API-Version": client_api,
+        }
+        if offset > 0:
+            headers["Range"] = f"bytes={offset}-"
+        # archives are already compressed, get the bytes as stored.
+        headers["Accept-Encoding"] = "identity"
+        return self.request(
+            http_get,
+            f"{self.destination}{url}",
+            auth=basic,
+            headers=headers,
+            stream=True,
+        )
+
+    def download_error(self, url: str, resp):
+        """
+        Report a refused download, the server's answer going to error.log.
+        :param url: The url path on the server.
+        :param resp: The server response.
+        """
+        self.valid_shape = False
+        server_error = f"{self.destination}: {resp.status_code}: {resp.reason}"
+        log.error(f"retrieving file {url} from server {server_error}, see error.log")
+        with open("error.log", "ab") as fp:
+            fp.write(f"---- ERROR: {datetime.now()} ---- \n".encode("utf8"))
+            fp.write(resp.content)
+
+    def stream(self, dep: Dependency, sink, callback=None):
+        """
+        Send the archive of a dependency of the catalog into a writable sink.
+        The data cannot be rewound: an interrupted transfer is not resumed.
+        :param dep: Dependency from the catalog.
+        :param sink: Object with a ``write`` method.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if the whole archive has been written.
+        """
+        self.connect()
+        if not self.valid_shape:
+            return False
+        url = self.get_download_url(dep)
+        if url is None:
+            return False
+        try:
+            with self.request_download(url) as resp:
+                if resp.status_code != 200:
+                    self.download_error(url, resp)
+                    return False
+                total_size = self.expected_size(resp, 0)
+                received = copy_stream(resp.raw, sink, callback, total_size)
+        except (RequestException, HTTPError, OSError) as err:
+            log.warn(f"streaming {url} from server {self.destination}: {err}")
+            return False
+        if total_size > 0 and received != total_size:
+            log.warn(f"streaming {url}: got {received} bytes out of {total_size}.")
+            return False
+        return True
+
+    @staticmethod
+    def expected_size(resp, offset: int):
+        """
+        Get the full size of a downloaded file from the response headers.
+        :param resp: The server response.
+        :param offset: Start of the received data.
+        :return: The size in bytes, 0 if unknown.
+        """
+        content_range = resp.headers.get("content-range", "")
+        if "/" in content_range:
+            total = content_range.rsplit("/", 1)[-1].strip()
+            if total.isdigit():
+                return int(total)
+        length = resp.headers.get("content-length", "")
+        if length.isdigit():
+            return offset + int(length)
+        return 0
+
+    def fetch(self, dep: Dependency, destination: Path, callback=None, checksum=None):
+        """
+        Download the archive of a dependency of the catalog.
+        :param dep: Dependency from the catalog.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :param checksum: Optional Checksum to feed with the downloaded data.
+        :return: The downloaded file or None.
+        """
+        self.connect()
+        if not self.valid_shape:
+            return None
+        url = self.get_download_url(dep)
+        if url is None:
+            return None
+        destination.mkdir(parents=True, exist_ok=True)
+        file_name = destination / self.get_download_name(dep, url)
+        if not self.download(url, file_name, callback, checksum):
+            return None
+        return file_name
+
     def pull(self, dep: Dependency, destination: Path):
         """
         Pull a dependency from remote.
         :param dep: Dependency information.
         :param destination: Destination directory
+        :return: The downloaded file name or None.
         """
         from rich.progress import (
             Progress,
@@ -193,68 +514,35 @@ class RemoteDatabaseServer(__RemoteDatabase):
 
         self.connect()
         if not self.valid_shape:
-            return
+            return None
         if destination.exists() and not destination.is_dir():
-            return
+            return None
         deps = self.query(dep)
         if len(deps) != 1:
-            return
-        # get the download url:
-        try:
-            basic = HTTPBasicAuth(self.user, self.cred)
-            post_data = {"action": "pull"} | self.dep_to_code(dep)
-            resp = http_post(
-                f"{self.destination}{self.api_url}", auth=basic, data=post_data
+            return None
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+        ) as progress:
+            task = progress.add_task(
+                f"Downloading {deps[0].properties.name}", total=None
             )
-            if resp.status_code != 200:
-                self.valid_shape = False
-                log.error(
-                    f"connecting to server: {self.destination}: {resp.status_code}: {resp.reason}"
-                )
-                log.error(f"      Server Data: {resp.text}")
-                return
-            data = resp.text.strip()
-            filename = data.rsplit("/", 1)[-1]
-            if filename.startswith(dep.properties.name):
-                filename = filename.replace(dep.properties.name, "")
-            file_name = destination / filename
 
-            headers = {
-                "X-API-Version": client_api,
-            }
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                DownloadColumn(),
-                TransferSpeedColumn(),
-            ) as progress:
-                resp = http_get(
-                    f"{self.destination}{data}", auth=basic, headers=headers
-                )
-                if resp.status_code != 200:
-                    self.valid_shape = False
-                    server_error = (
-                        f"{self.destination}: {resp.status_code}: {resp.reason}"
-                    )
-                    log.error(
-                        f"retrieving file {data} from server {server_error}, see error.log"
-                    )
-                    with open("error.log", "ab") as fp:
-                        fp.write(f"---- ERROR: {datetime.now()} ---- \n".encode("utf8"))
-                        fp.write(resp.content)
-                    return
-                total_size = int(resp.headers.get("content-length", 0))
-                task = progress.add_task(f"Downloading {filename}", total=total_size)
-
-                with open(file_name, "wb") as fp:
-                    for chunk in resp.iter_content(chunk_size=1024):
-                        fp.write(chunk)
-                        progress.update(task, advance=len(chunk))
-            return
-        except Exception as err:
-            log.error(f"Exception during server pull: {self.destination}: {err}")
-            return
+            def callback(advance: int, total: int):
+                """
+                Forward the download advance to the progress bar.
+                :param advance: Number of bytes just received.
+                :param total: Total size of the file.
+                """
+                progress.update(task, advance=advance, total=total)
+
+            file = self.fetch(deps[0], destination, callback)
+        if file is None:
+            return None
+        return file.name
 
     def create_callback(self, progress, task):
         """
@@ -273,34 +561,14 @@ class RemoteDatabaseServer(__RemoteDatabase):
 
         return callback
 
-    def push(self, dep: Dependency, file: Path, force: bool = False):
+    def upload(self, dep: Dependency, file: Path, callback=None):
         """
-        Push a dependency to the remote.
+        Upload a package archive to the server.
         :param dep: Dependency's description.
         :param file: Dependency archive file.
-        :param force: If true, re-upload a file that already exists.
+        :param callback: Optional function(completed: int, total: int) for progress.
+        :return: True if success.
         """
-        from rich.progress import (
-            Progress,
-            SpinnerColumn,
-            TextColumn,
-            BarColumn,
-            DownloadColumn,
-            TransferSpeedColumn,
-        )
-
-        self.connect()
-        if not self.valid_shape:
-            return
-        if not file.exists():
-            return
-        result = self.query(dep)
-        if len(result) != 0 and not force:
-            log.warn(
-                f"WARNING: Cannot push dependency {dep.properties.name}: already on server."
-            )
-            return
-        #
         try:
             basic = HTTPBasicAuth(self.user, self.cred)
             post_data = {"action": "push"} | self.dep_to_code(dep)
@@ -315,89 +583,179 @@ class RemoteDatabaseServer(__RemoteDatabase):
 
             file_size = file.stat().st_size
 
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                BarColumn(),
-                DownloadColumn(),
-                TransferSpeedColumn(),
-            ) as progress:
-                task = progress.add_task(f"Uploading {file.name}", total=encoder.len)
-
-                if file_size < 1:
-                    monitor = MultipartEncoderMonitor(encoder)
-                    headers = {"Content-Type": monitor.content_type}
-                    resp = http_post(
-                        dest_url,
-                        auth=basic,
-                        data=monitor,
-                        headers=headers,
-                    )
-                else:
-                    monitor = MultipartEncoderMonitor(
-                        encoder, callback=self.create_callback(progress, task)
-                    )
-                    headers = {
-                        "Content-Type": monitor.content_type,
-                        "X-API-Version": client_api,
-                    }
-                    dest_url = f"{self.destination}{self.upload_url}"
-                    resp = http_post(
-                        dest_url,
-                        auth=basic,
-                        data=monitor,
-                        headers=headers,
-                    )
+            if file_size < 1:
+                monitor = MultipartEncoderMonitor(encoder)
+                headers = {"Content-Type": monitor.content_type}
+            else:
 
-            if resp.status_code == 201:
-                log.warn(
-                    f"WARNING coming from server: {dest_url}: {resp.status_code}: {resp.reason}"
-                )
-                log.warn(f"response: {resp.content.decode('utf8')}")
-                return
-            if resp.status_code != 200:
-                self.valid_shape = False
-                log.error(
-                    f"connecting to server: {dest_url}: {resp.status_code}: {resp.reason}, see error.log"
-                )
-                with open("error.log", "ab") as fp:
-                    fp.write(f"---- ERROR: {datetime.now()} ---- \n".encode("utf8"))
-                    fp.write(resp.content)
-                    fp.write("\n".encode("utf8"))
-                    fp.write(str(post_data).encode("utf8"))
-                    fp.write("\n".encode("utf8"))
-                return
+                def monitor_callback(item):
+                    """
+                    Forward the encoder advance to the callback.
+                    :param item: The monitor.
+                    """
+                    if callback:
+                        callback(item.bytes_read, encoder.len)
+
+                monitor = MultipartEncoderMonitor(encoder, callback=monitor_callback)
+                headers = {
+                    "Content-Type": monitor.content_type,
+                    "X-API-Version": client_api,
+                }
+                dest_url = f"{self.destination}{self.upload_url}"
+            resp = self.request(
+                http_post,
+                dest_url,
+                idempotent=False,
+                auth=basic,
+                data=monitor,
+                headers=headers,
+            )
+            return self.upload_response(dest_url, resp, post_data)
         except Exception as err:
             log.error(f"Exception during server push: {self.destination}: {err}")
-            return
-        # Actualization the list
-        self.get_dep_list()
+            return False
 
-    def delete(self, dep: Dependency):
+    def upload_response(self, dest_url: str, resp, post_data: dict):
         """
-        Suppress the dependency from the server
-        :param dep: Dependency information.
-        :return: True if success.
+        Check the answer of the server to an upload.
+        :param dest_url: The upload url.
+        :param resp: The response.
+        :param post_data: The sent fields, logged on error.
+        :return: True if the package has been registered.
         """
-        self.connect()
-        if not self.valid_shape:
-            return False
-        result = self.query(dep)
-        if len(result) == 0:
+        if resp.status_code == 201:
             log.warn(
-                f"WARNING: Cannot suppress dependency {dep.properties.name}: not on server."
+                f"WARNING coming from server: {dest_url}: {resp.status_code}: {resp.reason}"
             )
+            log.warn(f"response: {resp.content.decode('utf8')}")
             return False
-        if len(result) > 1:
-            log.warn(
-                f"WARNING: Cannot suppress dependency {dep.properties.name}: multiple dependencies match on server."
+        if resp.status_code != 200:
+            self.valid_shape = False
+            log.error(
+                f"connecting to server: {dest_url}: {resp.status_code}: {resp.reason}, see error.log"
             )
+            with open("error.log", "ab") as fp:
+                fp.write(f"---- ERROR: {datetime.now()} ---- \n".encode("utf8"))
+                fp.write(resp.content)
+                fp.write("\n".encode("utf8"))
+                fp.write(str(post_data).encode("utf8"))
+                fp.write("\n".encode("utf8"))
             return False
+        return True
+
+    def send_stream(self, dep: Dependency, source, callback=None):
+        """
+        Upload the archive of a dependency while it is produced, in a chunked
+        multipart request. The checksum fields follow the archive part, as
+        they are only known once it has been sent.
+        :param dep: Dependency's description.
+        :param source: Readable stream of the archive, with a ``checksum``.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        boundary = uuid4().hex
+        post_data = {"action": "push"} | self.dep_to_code(dep)
+        post_data.pop("sha256", None)
+        post_data.pop("size", None)
+        with_integrity = version_lt("2.0.0", self.server_api_version)
+
+        def field(name: str, value: str):
+            return (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f"\r\n\r\n{value}\r\n"
+            ).encode("utf8")
+
+        def body():
+            for name, value in post_data.items():
+                yield field(name, value)
+            yield (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="package";'
+                f' filename="{dep.properties.hash()}.tgz"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n"
+            ).encode("utf8")
+            while True:
+                chunk = source.read(stream_buffer_size)
+                if not chunk:
+                    break
+                if callback:
+                    callback(len(chunk), 0)
+                yield chunk
+            yield b"\r\n"
+            if with_integrity:
+                yield field("sha256", source.checksum.hexdigest())
+                yield field("size", f"{source.checksum.size}")
+            yield f"--{boundary}--\r\n".encode("utf8")
+
+        dest_url = f"{self.destination}{self.upload_url}"
+        try:
+            resp = self.request(
+                http_post,
+                dest_url,
+                idempotent=False,
+                auth=HTTPBasicAuth(self.user, self.cred),
+                data=body(),
+                headers={
+                    "Content-Type": f"multipart/form-data; boundary={boundary}",
+                    "X-API-Version": client_api,
+                },
+            )
+            if not self.upload_response(dest_url, resp, post_data):
+                return False
+        except Exception as err:
+            log.error(f"Exception during server push: {self.destination}: {err}")
+            return False
+        dep.sha256 = source.checksum.hexdigest()
+        dep.size = source.checksum.size
+        return True
+
+    def send_package(self, dep: Dependency, file: Path, callback=None):
+        """
+        Upload the archive of a dependency, the server registers it.
+        :param dep: Dependency's description.
+        :param file: Dependency archive file.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: True if success.
+        """
+        upload_callback = None
+        if callback:
+            sent = [0]
+
+            def upload_callback(completed: int, total: int):
+                """
+                Convert the upload position into an advance.
+                :param completed: Number of bytes already sent.
+                :param total: Total size of the request.
+                """
+                callback(completed - sent[0], total)
+                sent[0] = completed
+
+        return self.upload(dep, file, upload_callback)
+
+    def register_dependencies(self, deps: list):
+        """
+        Add pushed dependencies to the in-memory catalog.
+
+        The server registers each package on upload: the catalog is not
+        downloaded again nor sent back.
+        :param deps: Dependencies to add.
+        """
+        self.apply_additions(deps)
+
+    def remove(self, dep: Dependency):
+        """
+        Ask the server to delete a dependency.
+        :param dep: Dependency information.
+        :return: True if success.
+        """
         try:
             basic = HTTPBasicAuth(self.user, self.cred)
             post_data = {"action": "delete"} | self.dep_to_code(dep)
-            resp = http_post(
-                f"{self.destination}{self.api_url}", auth=basic, data=post_data
+            resp = self.request(
+                http_post,
+                f"{self.destination}{self.api_url}",
+                idempotent=False,
+                auth=basic,
+                data=post_data,
             )
 
             if resp.status_code != 200:
@@ -412,6 +770,28 @@ class RemoteDatabaseServer(__RemoteDatabase):
             log.error(f"Exception during server pull: {self.destination}: {err}")
             return False
 
+    def delete(self, dep: Dependency):
+        """
+        Suppress the dependency from the server
+        :param dep: Dependency information.
+        :return: True if success.
+        """
+        self.connect()
+        if not self.valid_shape:
+            return False
+        result = self.query(dep)
+        if len(result) == 0:
+            log.warn(
+                f"WARNING: Cannot suppress dependency {dep.properties.name}: not on server."
+            )
+            return False
+        if len(result) > 1:
+            log.warn(
+                f"WARNING: Cannot suppress dependency {dep.properties.name}: multiple dependencies match on server."
+            )
+            return False
+        return self.remove(dep)
+
     def get_file(self, distant_name: str, destination: Path):
         """
         Download a file.
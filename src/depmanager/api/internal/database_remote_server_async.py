@@ -0,0 +1,190 @@
+"""
+Asynchronous client for the server protocol.
+"""
+
+import asyncio
+from pathlib import Path
+
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import file_checksum
+from depmanager.api.internal.transfer import fetch_verified
+
+default_max_concurrency = 4
+
+
+class AsyncRemoteDatabaseServer:
+    """
+    Asyncio flavour of the server remote.
+
+    Exposes the remote contract (connect, get_dep_list, query, pull, push,
+    delete) as coroutines. The blocking HTTP requests are run in worker threads,
+    at most ``max_concurrency`` of them at the same time, so many transfers can
+    be in flight on a single event loop.
+    """
+
+    def __init__(
+        self,
+        remote: RemoteDatabaseServer,
+        max_concurrency: int = default_max_concurrency,
+    ):
+        self.remote = remote
+        self.max_concurrency = max(1, max_concurrency)
+        self.__semaphore = None
+        self.__catalog_lock = None
+
+    @classmethod
+    def create(
+        cls,
+        destination: str,
+        port: int = -1,
+        secure: bool = False,
+        default: bool = False,
+        user: str = "",
+        cred: str = "",
+        max_concurrency: int = default_max_concurrency,
+    ):
+        """
+        Create an asynchronous client from server parameters.
+        :param destination: Server's url.
+        :param port: Server's port.
+        :param secure: Use https.
+        :param default: If this remote is the default one.
+        :param user: Login.
+        :param cred: Password.
+        :param max_concurrency: Maximal number of simultaneous requests.
+        :return: The asynchronous client.
+        """
+        return cls(
+            RemoteDatabaseServer(destination, port, secure, default, user, cred),
+            max_concurrency,
+        )
+
+    @property
+    def valid_shape(self):
+        """
+        Validity of the underlying remote.
+        :return: True if the remote is usable.
+        """
+        return self.remote.valid_shape
+
+    def _semaphore(self):
+        # Created per event loop: each asyncio.run() binds its own.
+        loop = asyncio.get_running_loop()
+        if self.__semaphore is None or self.__semaphore[0] is not loop:
+            self.__semaphore = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self.__semaphore[1]
+
+    def _catalog_lock(self):
+        loop = asyncio.get_running_loop()
+        if self.__catalog_lock is None or self.__catalog_lock[0] is not loop:
+            self.__catalog_lock = (loop, asyncio.Lock())
+        return self.__catalog_lock[1]
+
+    async def _run(self, func, *args):
+        async with self._semaphore():
+            return await asyncio.to_thread(func, *args)
+
+    async def connect(self):
+        """
+        Initialize the connection to remote host.
+        """
+        await self._run(self.remote.connect)
+
+    async def get_dep_list(self):
+        """
+        Get the list of dependencies from the server.
+        """
+        async with self._catalog_lock():
+            await self._run(self.remote.get_dep_list)
+
+    async def query(self, data=None):
+        """
+        Get a list of dependencies matching data.
+        :param data: The query data.
+        :return: List of Dependencies.
+        """
+        if not self.remote.initiated:
+            async with self._catalog_lock():
+                if not self.remote.initiated:
+                    await self._run(self.remote.query)
+        return self.remote.query(data)
+
+    async def pull(self, dep: Dependency, destination: Path, callback=None):
+        """
+        Pull a dependency from remote.
+        :param dep: Dependency information.
+        :param destination: Destination directory.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        :return: The downloaded file or None.
+        """
+        await self.connect()
+        if not self.valid_shape:
+            return None
+        if destination.exists() and not destination.is_dir():
+            return None
+        deps = await self.query(dep)
+        if len(deps) != 1:
+            return None
+        return await self._run(
+            fetch_verified, self.remote, deps[0], destination, callback
+        )
+
+    async def push(
+        self, dep: Dependency, file: Path, force: bool = False, callback=None
+    ):
+        """
+        Push a dependency to the remote.
+        :param dep: Dependency's description.
+        :param file: Dependency archive file.
+        :param force: If true, re-upload a file that already exists.
+        :param callback: Optional function(completed: int, total: int) for progress.
+        :return: True if success.
+        """
+        await self.connect()
+        if not self.valid_shape:
+            return False
+        if not file.exists():
+            return False
+        result = await self.query(dep)
+        if len(result) != 0 and not force:
+            log.warn(
+                f"WARNING: Cannot push dependency {dep.properties.name}: already on server."
+            )
+            return False
+        checksum = await self._run(file_checksum, file)
+        dep.sha256 = checksum.hexdigest()
+        dep.size = checksum.size
+        if not await self._run(self.remote.upload, dep, file, callback):
+            return False
+        self.remote.apply_additions([dep])
+        return True
+
+    async def delete(self, dep: Dependency):
+        """
+        Suppress the dependency from the server.
+        :param dep: Dependency information.
+        :return: True if success.
+        """
+        await self.connect()
+        if not self.valid_shape:
+            return False
+        result = await self.query(dep)
+        if len(result) != 1:
+            log.warn(
+                f"WARNING: Cannot suppress dependency {dep.properties.name}: "
+                f"{len(result)} dependencies match on server."
+            )
+            return False
+        if not await self._run(self.remote.remove, dep):
+            return False
+        self.remote.apply_removals(result)
+        return True
+
+    async def get_server_version(self):
+        """
+        Get the version running on the server.
+        :return: Server's version number.
+        """
+        return await self._run(self.remote.get_server_version)
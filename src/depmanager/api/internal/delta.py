@@ -0,0 +1,164 @@
+"""
+File-level delta packages between two builds of a package.
+
+A delta is a tar archive of the files of the new build that are new or
+changed since a base build, with a ``.edm-delta`` header giving the content
+hashes of both builds and the files to delete. A remote keeps the file list
+of the last pushed build (``<name>/<hash>.files``): the next push computes
+the delta from it, without the former tree. A client holding the base build
+applies the delta to a copy of it, and checks the content hash of the result.
+"""
+
+import os
+import tarfile
+from io import BytesIO
+from pathlib import Path
+from shutil import copystat, copytree, rmtree
+
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.reproducible import (
+    add_tree,
+    content_hash,
+    metadata_files,
+    tree_manifest,
+)
+
+# Name of the delta header, first member of the delta archive.
+delta_header = ".edm-delta"
+# A delta carrying more than this part of the package is not worth it.
+max_delta_ratio = 0.5
+
+
+def write_file_list(manifest: dict, file: Path):
+    """
+    Save the manifest of a package.
+    :param manifest: The manifest, as given by tree_manifest.
+    :param file: The file to write.
+    """
+    with open(file, "w", encoding="utf8") as fp:
+        fp.write(f"content {content_hash(manifest)}\n")
+        for name in sorted(manifest):
+            mode, digest = manifest[name]
+            fp.write(f"{digest} {mode:o} {name}\n")
+
+
+def read_file_list(file: Path):
+    """
+    Read the manifest of a package.
+    :param file: The file.
+    :return: (content hash, manifest), None if not readable.
+    """
+    try:
+        with open(file, encoding="utf8") as fp:
+            lines = fp.read().splitlines()
+        key, _, content = lines[0].partition(" ")
+        if key != "content":
+            return None
+        manifest = {}
+        for line in lines[1:]:
+            digest, mode, name = line.split(" ", 2)
+            manifest[name] = (int(mode, 8), digest)
+    except (OSError, IndexError, ValueError):
+        return None
+    return content, manifest
+
+
+def make_delta(
+    folder: Path,
+    manifest: dict,
+    base: tuple,
+    file: Path,
+    mtime=None,
+    compression=None,
+):
+    """
+    Write the delta archive turning a base build into a package folder.
+    :param folder: The package folder.
+    :param manifest: Its manifest.
+    :param base: (content hash, manifest) of the base build.
+    :param file: The delta archive to write.
+    :param mtime: Modification time of the entries.
+    :param compression: The compression of the archive, gzip by default.
+    :return: True if written, False if the delta is not worth it.
+    """
+    from depmanager.api.internal.compression import Compression
+
+    base_content, base_manifest = base
+    changed = {
+        name
+        for name, entry in manifest.items()
+        if name in metadata_files or base_manifest.get(name) != entry
+    }
+    deleted = sorted(name for name in base_manifest if name not in manifest)
+    sizes = {name: os.lstat(folder / name).st_size for name in manifest}
+    total = sum(sizes.values())
+    if sum(sizes[name] for name in changed) > max_delta_ratio * total:
+        return False
+    header = [f"base {base_content}", f"target {content_hash(manifest)}"]
+    header += [f"delete {name}" for name in deleted]
+    data = ("\n".join(header) + "\n").encode("utf8")
+    info = tarfile.TarInfo(delta_header)
+    info.size = len(data)
+    info.mode = 0o644
+    info.mtime = mtime or 0
+    with open(file, "wb") as fp, (compression or Compression()).writer(
+        fp
+    ) as writer, tarfile.open(fileobj=writer, mode="w|") as archive:
+        archive.addfile(info, BytesIO(data))
+        add_tree(archive, folder, mtime, names=changed)
+    log.debug(
+        f"Delta {file.name}: {len(changed)} files changed, {len(deleted)} deleted."
+    )
+    return True
+
+
+def copy_tree_file(source, destination):
+    """
+    Copy a file of a tree, sharing its data when the file system allows it.
+    :param source: The file.
+    :param destination: The copy.
+    """
+    from depmanager.api.internal.streaming import copy_file
+
+    copy_file(Path(source), Path(destination))
+    copystat(source, destination)
+
+
+def apply_delta(base: Path, base_content: str, delta: Path, destination: Path):
+    """
+    Build a package from a base build and a delta.
+    :param base: The folder of the base build.
+    :param base_content: Its content hash.
+    :param delta: The delta archive.
+    :param destination: The folder to create.
+    :return: The content hash of the result, None on failure.
+    """
+    from depmanager.api.internal.extraction import extract_tar_file
+
+    rmtree(destination, ignore_errors=True)
+    try:
+        # a copy: the extraction rewrites the changed files in place.
+        copytree(base, destination, symlinks=True, copy_function=copy_tree_file)
+        extract_tar_file(delta, destination)
+        header = (destination / delta_header).read_text(encoding="utf8")
+        (destination / delta_header).unlink()
+        fields = [line.partition(" ") for line in header.splitlines()]
+        if ("base", " ", base_content) not in fields:
+            log.warn(f"WARNING: delta {delta.name} does not apply to the local build.")
+            return None
+        root = os.path.realpath(destination)
+        for key, _, name in fields:
+            if key == "delete":
+                target = os.path.normpath(os.path.join(root, name))
+                if not target.startswith(root + os.sep):
+                    raise tarfile.TarError(f"{name} is outside the destination")
+                Path(target).unlink(missing_ok=True)
+        target_content = [name for key, _, name in fields if key == "target"]
+    except (OSError, tarfile.TarError, UnicodeError) as err:
+        log.warn(f"WARNING: cannot apply delta {delta.name}: {err}")
+        return None
+    result = content_hash(tree_manifest(destination))
+    if target_content != [result]:
+        log.warn(f"WARNING: delta {delta.name} gives an unexpected content.")
+        return None
+    return result
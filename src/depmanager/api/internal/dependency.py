@@ -9,7 +9,6 @@ from pathlib import Path
 from re import compile as re_compile
 
 from depmanager.api.internal.messaging import log
-from .machine import Machine
 
 
 @lru_cache(maxsize=256)
@@ -18,10 +17,31 @@ def _compiled_fnmatch(pattern: str):
     return re_compile(fnmatch_translate(pattern))
 
 
+@lru_cache(maxsize=None)
+def local_machine():
+    """
+    Get the machine running the program, introspected on first use.
+    :return: The machine.
+    """
+    from depmanager.api.internal.machine import Machine
+
+    return Machine(True)
+
+
+def __getattr__(name: str):
+    """
+    Get the attributes computed on first use: ``mac``, the local machine.
+    :param name: The attribute.
+    :return: Its value.
+    """
+    if name == "mac":
+        return local_machine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 kinds = ["shared", "static", "header", "any"]
 
 default_kind = kinds[0]
-mac = Machine(True)
 base_date = datetime.datetime.fromisoformat("2000-01-01T00:00:00+00:00")
 
 
@@ -126,6 +146,7 @@ class Props:
             self.glibc = "*"
             self.build_date = "*"
         else:
+            mac = local_machine()
             self.os = mac.os
             self.arch = mac.arch
             self.kind = default_kind
@@ -198,6 +219,7 @@ class Props:
             self.glibc = "*"
             self.build_date = "*"
         else:
+            mac = local_machine()
             self.os = mac.os
             self.arch = mac.arch
             self.kind = default_kind
@@ -488,6 +510,13 @@ class Dependency:
         self.cmake_config_path = None
         self.source = source
         self.description = ""
+        # integrity of the package archive, as recorded in remote catalogs.
+        self.sha256 = ""
+        self.size = 0
+        # hash of the package files, whatever the archive and the build date.
+        self.content = ""
+        # content hash of the build the remote delta of the package applies to.
+        self.delta_base = ""
         if isinstance(data, Path):
             self.base_path = Path(data)
             if not self.base_path.exists() or (
@@ -516,7 +545,9 @@ class Dependency:
                 set([folder.parent for folder in self.base_path.rglob("*onfig.cmake")])
             )
             self.cmake_config_path = ";".join([str(s) for s in search])
-        elif type(data) in [str, dict]:
+        elif type(data) is str:
+            self.properties = Props(self.read_integrity(data))
+        elif type(data) is dict:
             self.properties = Props(data)
         self.valid = True
 
@@ -570,6 +601,78 @@ class Dependency:
             with open(desc_file) as fp:
                 self.description = fp.read()
 
+    def read_integrity(self, data: str):
+        """
+        Extract the archive integrity fields of a catalog line. They follow the
+        dependencies as a comment (``| deps: [...] # sha256: <hex> | size:
+        <bytes> | content: <hex> | delta: <hex>``) that the parsers of former
+        versions, evaluating the dependencies, ignore.
+        :param data: The catalog line.
+        :return: The line without the integrity fields.
+        """
+        if "|" not in data:
+            return data
+        head, tail = data.split("|", 1)
+        tail, _, comment = tail.partition("#")
+        kept = [head]
+        # fields written after the dependencies without the comment are read
+        # as well.
+        for field in tail.split("|") + comment.split("|"):
+            key, _, value = field.partition(":")
+            key = key.strip()
+            if key == "sha256":
+                self.sha256 = value.strip()
+            elif key == "size":
+                self.size = safe_to_int(value)
+            elif key == "content":
+                self.content = value.strip()
+            elif key == "delta":
+                self.delta_base = value.strip()
+            elif field.strip() != "":
+                kept.append(field)
+        return "|".join(kept)
+
+    def integrity_str(self):
+        """
+        Get the archive integrity fields for a catalog line, as a comment of
+        the dependencies.
+        :return: The fields, empty if unknown.
+        """
+        fields = []
+        if self.sha256 not in ["", None]:
+            fields += [f"sha256: {self.sha256}", f"size: {self.size}"]
+        if self.content not in ["", None]:
+            fields.append(f"content: {self.content}")
+        if self.delta_base not in ["", None]:
+            fields.append(f"delta: {self.delta_base}")
+        if len(fields) == 0:
+            return ""
+        return " # " + " | ".join(fields)
+
+    def catalog_str(self):
+        """
+        Get the catalog line of the dependency: its properties, its
+        dependencies and the archive integrity fields.
+        :return: The catalog line.
+        """
+        line = self.properties.get_as_str()
+        integrity = self.integrity_str()
+        if len(self.properties.dependencies) > 0 or integrity != "":
+            line += f" | deps: {self.properties.dependencies}"
+        return line + integrity
+
+    def check_integrity(self, checksum):
+        """
+        Compare a downloaded archive to the integrity data of the catalog.
+        :param checksum: The Checksum of the archive, None if not computed.
+        :return: True if matching or if the catalog has no integrity data.
+        """
+        if checksum is None or self.sha256 in ["", None]:
+            return True
+        if self.size > 0 and checksum.size != self.size:
+            return False
+        return checksum.hexdigest() == self.sha256
+
     def get_path(self):
         """
         Compute the relative path of the dependency.
@@ -0,0 +1,275 @@
+"""
+Extraction of package archives.
+
+Zip members are compressed independently: they are extracted by a pool of
+threads, each one reading the archive through its own handle. Tar archives
+are compressed as a whole and read in a single pass, file bodies being
+written with large buffers. Every member goes through the ``data`` filter of
+``tarfile`` (or an equivalent check on older Python versions), so an archive
+cannot write outside its destination.
+"""
+
+import os
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from pathlib import Path
+from time import monotonic
+from zipfile import ZipFile
+
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import copy_stream, stream_buffer_size
+
+# Number of zip extraction threads, 0 for one per core.
+default_threads = 0
+# Flags opening an extracted file without following a symbolic link.
+write_flags = (
+    os.O_WRONLY
+    | os.O_CREAT
+    | os.O_TRUNC
+    | getattr(os, "O_BINARY", 0)
+    | getattr(os, "O_NOFOLLOW", 0)
+)
+
+
+def inside(root: str, path: str):
+    """
+    Check that a path stays in a folder.
+    :param root: The real path of the folder.
+    :param path: The path.
+    :return: True if path is the folder or in it.
+    """
+    real = os.path.realpath(path)
+    return real == root or real.startswith(root + os.sep)
+
+
+def filter_member(member: tarfile.TarInfo, root: str):
+    """
+    Apply the ``data`` filter to a tar member: strip leading slashes, refuse
+    paths leaving the destination, links pointing outside it and special
+    files; clear the setuid/setgid bits and the write permission of group and
+    others.
+    :param member: The member.
+    :param root: The real path of the destination.
+    :return: The member to extract.
+    """
+    if hasattr(tarfile, "data_filter"):
+        return tarfile.data_filter(member, root)
+    # Python versions without extraction filters.
+    name = member.name.lstrip("/" + os.sep)
+    if os.path.isabs(name) or not inside(root, os.path.join(root, name)):
+        raise tarfile.TarError(f"{member.name} is outside the destination")
+    if member.issym():
+        link = os.path.join(root, os.path.dirname(name), member.linkname)
+        if os.path.isabs(member.linkname) or not inside(root, link):
+            raise tarfile.TarError(f"{member.name} links outside the destination")
+    elif member.islnk():
+        if not inside(root, os.path.join(root, member.linkname)):
+            raise tarfile.TarError(f"{member.name} links outside the destination")
+    elif not member.isreg() and not member.isdir():
+        raise tarfile.TarError(f"{member.name} is a special file")
+    member = copy(member)
+    member.name = name
+    if member.isdir():
+        member.mode = None
+    elif member.mode is not None:
+        member.mode = (member.mode & 0o755) | 0o600
+    return member
+
+
+class ExtractionReport:
+    """
+    Count the extracted files and bytes, logging the throughput at the end.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.files = 0
+        self.size = 0
+        self.start = monotonic()
+        self.__lock = threading.Lock()
+
+    def add(self, size: int):
+        """
+        Count an extracted file.
+        :param size: Its size.
+        """
+        with self.__lock:
+            self.files += 1
+            self.size += size
+
+    def log(self):
+        """
+        Log the extraction throughput.
+        """
+        elapsed = max(monotonic() - self.start, 1e-6)
+        mib = self.size / 1024**2
+        log.debug(
+            f"Extracted {self.label}: {self.files} files, {mib:.1f} MiB in"
+            f" {elapsed:.2f} s ({mib / elapsed:.1f} MiB/s)."
+        )
+
+
+def write_file(source, target: str, size: int, mode=None, mtime=None):
+    """
+    Write an extracted file.
+    :param source: Readable stream of the content.
+    :param target: The file to create.
+    :param size: Expected size of the content.
+    :param mode: Permissions to set, None to keep the default.
+    :param mtime: Modification time to set, None to keep the current time.
+    :return: The number of bytes written.
+    """
+    with os.fdopen(os.open(target, write_flags, 0o644), "wb") as fp:
+        if size <= stream_buffer_size:
+            # most files of a package: a single read, no copy buffer.
+            data = source.read()
+            fp.write(data)
+            size = len(data)
+        else:
+            size = copy_stream(source, fp)
+    if mode is not None:
+        os.chmod(target, mode)
+    if mtime is not None:
+        os.utime(target, (mtime, mtime))
+    return size
+
+
+def extract_tar(
+    archive: tarfile.TarFile, destination: Path, label: str = "archive", step=None
+):
+    """
+    Extract a tar archive in a single pass; it may be opened in stream mode.
+    :param archive: The tar archive.
+    :param destination: The destination folder.
+    :param label: Name of the archive in the logs.
+    :param step: Optional function called after each member.
+    :return: The extraction report.
+    """
+    destination.mkdir(parents=True, exist_ok=True)
+    root = os.path.realpath(destination)
+    report = ExtractionReport(label)
+    created = {root}
+
+    def make_dirs(folder: str):
+        if folder not in created:
+            os.makedirs(folder, exist_ok=True)
+            created.add(folder)
+
+    for member in archive:
+        member = filter_member(member, root)
+        target = os.path.normpath(os.path.join(root, member.name))
+        if member.isdir():
+            make_dirs(target)
+        else:
+            make_dirs(os.path.dirname(target))
+            if member.isreg():
+                source = archive.extractfile(member)
+                report.add(
+                    write_file(source, target, member.size, member.mode, member.mtime)
+                )
+            else:
+                if os.path.lexists(target):
+                    os.unlink(target)
+                if member.issym():
+                    os.symlink(member.linkname, target)
+                elif member.islnk():
+                    os.link(os.path.join(root, member.linkname), target)
+        if step:
+            step()
+    report.log()
+    return report
+
+
+def extract_tar_file(source: Path, destination: Path, callback=None):
+    """
+    Extract a gzip or zstd tar archive file in a single pass.
+    :param source: The archive.
+    :param destination: The destination folder.
+    :param callback: Optional function(advance: int, total: int) reporting the
+        compressed bytes read.
+    :return: The extraction report.
+    """
+    from depmanager.api.internal.compression import open_tar_stream
+
+    total = source.stat().st_size
+    position = 0
+
+    with open(source, "rb") as fp, open_tar_stream(fp) as archive:
+
+        def step():
+            nonlocal position
+            current = fp.tell()
+            callback(current - position, total)
+            position = current
+
+        report = extract_tar(archive, destination, source.name, callback and step)
+    if callback:
+        callback(total - position, total)
+    return report
+
+
+def extract_zip(
+    source: Path, destination: Path, callback=None, threads: int = default_threads
+):
+    """
+    Extract a zip archive, the members being decompressed by several threads.
+    :param source: The archive.
+    :param destination: The destination folder.
+    :param callback: Optional function(advance: int, total: int) reporting the
+        uncompressed bytes written.
+    :param threads: Number of threads, 0 for one per core.
+    :return: The extraction report.
+    """
+    destination.mkdir(parents=True, exist_ok=True)
+    root = os.path.realpath(destination)
+    report = ExtractionReport(source.name)
+    with ZipFile(source) as archive:
+        members = archive.infolist()
+    total = sum(member.file_size for member in members)
+    files = []
+    folders = set()
+    for member in members:
+        # only files and folders are created: no link to resolve.
+        target = os.path.normpath(os.path.join(root, member.filename))
+        if os.path.isabs(member.filename) or not target.startswith(root + os.sep):
+            raise ValueError(f"{member.filename} is outside the destination")
+        if member.is_dir():
+            folders.add(target)
+            continue
+        folders.add(os.path.dirname(target))
+        files.append((member, target))
+    # created beforehand: the threads never race on a folder creation.
+    for folder in sorted(folders):
+        os.makedirs(folder, exist_ok=True)
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def extract(item):
+        member, target = item
+        if not hasattr(local, "archive"):
+            local.archive = ZipFile(source)
+            with handles_lock:
+                handles.append(local.archive)
+        with local.archive.open(member) as data:
+            size = write_file(data, target, member.file_size)
+        report.add(size)
+        if callback:
+            callback(size, total)
+
+    workers = min(threads or os.cpu_count() or 1, len(files))
+    try:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # list() re-raises the first failure.
+                list(pool.map(extract, files))
+        else:
+            for item in files:
+                extract(item)
+    finally:
+        for handle in handles:
+            handle.close()
+    report.log()
+    return report
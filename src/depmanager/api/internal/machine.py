@@ -3,6 +3,7 @@ Machine identification.
 """
 
 import platform
+from functools import lru_cache
 
 from depmanager.api.internal.messaging import log
 from depmanager.api.internal.toolset import Toolset
@@ -36,6 +37,24 @@ def format_arch(arch_str: str):
     return arch_str
 
 
+@lru_cache(maxsize=None)
+def glibc_version():
+    """
+    Get the version of the glibc, read once per process.
+    :return: The version.
+    """
+    return platform.libc_ver()[1]
+
+
+@lru_cache(maxsize=None)
+def linux_release():
+    """
+    Get the name of the Linux distribution, read once per process.
+    :return: The name.
+    """
+    return f"{platform.freedesktop_os_release()['PRETTY_NAME']}"
+
+
 class Machine:
     """
     Class holding machine information
@@ -68,10 +87,9 @@ class Machine:
         if self.toolset not in [None, ""]:
             self.default_abi = self.toolset.abi
         if self.os == "Linux":
-            self.glibc = platform.libc_ver()[1]
+            self.glibc = glibc_version()
             try:
-                details = platform.freedesktop_os_release()
-                self.os_version = f"{details['PRETTY_NAME']}"
+                self.os_version = linux_release()
             except Exception as err:
                 log.warn(
                     f"WARNING: Exception during Linux system introspection: {err}."
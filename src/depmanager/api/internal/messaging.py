@@ -4,16 +4,34 @@ Messaging system
 
 import logging
 import re
+from functools import lru_cache
+
+
+class DeferredRichHandler(logging.Handler):
+    """
+    Logging handler creating its rich handler on the first record: rich is
+    only imported when something is logged.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.handler = None
+
+    def emit(self, record: logging.LogRecord):
+        if self.handler is None:
+            from rich.logging import RichHandler
+
+            self.handler = RichHandler()
+            self.handler.setFormatter(self.formatter)
+        self.handler.emit(record)
 
-from rich.logging import RichHandler
 
 log = logging.getLogger(__name__)
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(message)s",
-    datefmt="[%X]",
-    handlers=[RichHandler()],
-)
+# only the loggers of the package are configured, not the root one.
+package_handler = DeferredRichHandler()
+package_handler.setFormatter(logging.Formatter("%(message)s", datefmt="[%X]"))
+logging.getLogger("depmanager").addHandler(package_handler)
+logging.getLogger("depmanager").setLevel(logging.INFO)
 log.setLevel(logging.INFO)
 raw_output = False
 
@@ -87,17 +105,25 @@ keywords = {
     "srv": "purple",
 }
 
-# Pre-compiled regex patterns
-_re_bracket_open = re.compile(r"\[(?!\s)")
-_re_bracket_close = re.compile(r"(?<!\s)\]")
-_re_keyword_patterns = {
-    keyword: (re.compile(re.escape(keyword), re.IGNORECASE), color)
-    for keyword, color in keywords.items()
-}
-_re_default = re.compile(r"\*(\w+)")
-_re_date = re.compile(
-    r"\b(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})([+-]\d{2}:\d{2}|Z)?\b"
-)
+
+@lru_cache(maxsize=None)
+def _patterns():
+    """
+    Compile the formatting regex patterns, once, on the first formatted message.
+    :return: (bracket open, bracket close, keyword patterns, default, date).
+    """
+    return (
+        re.compile(r"\[(?!\s)"),
+        re.compile(r"(?<!\s)\]"),
+        [
+            (re.compile(re.escape(keyword), re.IGNORECASE), color)
+            for keyword, color in keywords.items()
+        ],
+        re.compile(r"\*(\w+)"),
+        re.compile(
+            r"\b(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})([+-]\d{2}:\d{2}|Z)?\b"
+        ),
+    )
 
 
 def formatting(
@@ -111,19 +137,20 @@ def formatting(
     Returns:
         str: formatted message.
     """
+    bracket_open, bracket_close, keyword_patterns, default, date = _patterns()
     # avoid rich misinterpretation of brackets
-    msg = _re_bracket_open.sub("[ ", msg)
-    msg = _re_bracket_close.sub(" ]", msg)
+    msg = bracket_open.sub("[ ", msg)
+    msg = bracket_close.sub(" ]", msg)
 
     # color keywords ignoring case
-    for pattern, color in _re_keyword_patterns.values():
+    for pattern, color in keyword_patterns:
         msg = pattern.sub(lambda m, c=color: f"[{c}]{m.group()}[/]", msg)
 
     # format 'default' meaning words starting with * and followed by alphanumeric characters
-    msg = _re_default.sub(lambda m: f"[bold blue]*{m.group(1)}[/]", msg)
+    msg = default.sub(lambda m: f"[bold blue]*{m.group(1)}[/]", msg)
 
     # formatting date from iso format to human-readable format
-    msg = _re_date.sub(
+    msg = date.sub(
         lambda m: f"[bold yellow]{m.group(1)}-{m.group(2)}-{m.group(3)}[/] "
         f"[bold green]{m.group(4)}:{m.group(5)}:{m.group(6)}[/]",
         msg,
@@ -0,0 +1,662 @@
+"""
+Read-through caching proxy speaking the protocol of the dependency server.
+
+Clients use the proxy as a ``srv`` remote. The catalog of the upstream remote
+is kept in memory for a few seconds and saved in the cache folder, so that
+the proxy still answers queries when the upstream is down. Archives are
+downloaded from the upstream on first pull and served from an
+:class:`ArchiveCache` afterward, the least recently used ones being evicted
+beyond the size limit. Concurrent pulls of the same archive share a single
+upstream download. The proxy is read-only unless created writable: pushes and
+deletions, authenticated with the configured login and password (HTTP basic
+authentication), are then forwarded to the upstream.
+"""
+
+import ast
+import base64
+import hmac
+import os
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from shutil import rmtree
+from time import monotonic
+from urllib.parse import parse_qs, unquote, urlsplit
+from uuid import uuid4
+
+from depmanager.api.internal.archive_cache import ArchiveCache
+from depmanager.api.internal.common import client_api, default_catalog_ttl
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import stream_buffer_size
+
+# Size limit of the non-file fields of a request.
+max_field_size = 1024**2
+
+os_codes = {"w": "Windows", "l": "Linux", "a": "any"}
+arch_codes = {"x": "x86_64", "a": "aarch64", "y": "any"}
+kind_codes = {"r": "shared", "t": "static", "h": "header", "a": "any"}
+abi_codes = {"g": "gnu", "l": "llvm", "m": "msvc", "a": "any"}
+
+
+def code_to_dep(fields: dict):
+    """
+    Do the inverse of ``RemoteDatabaseServer.dep_to_code``.
+    :param fields: The request fields.
+    :return: The dependency, None if a field is invalid.
+    """
+    data = {}
+    for key in ["name", "version", "build_date"]:
+        if fields.get(key) not in ["", None]:
+            data[key] = fields[key]
+    data["glibc"] = fields.get("glibc", "")
+    for key, codes in [
+        ("os", os_codes),
+        ("arch", arch_codes),
+        ("kind", kind_codes),
+        ("abi", abi_codes),
+    ]:
+        if key not in fields:
+            continue
+        if fields[key] not in codes:
+            return None
+        data[key] = codes[fields[key]]
+    if fields.get("dependencies") not in ["", None]:
+        try:
+            data["dependencies"] = ast.literal_eval(fields["dependencies"])
+        except (ValueError, SyntaxError):
+            return None
+    if "name" not in data or "version" not in data:
+        return None
+    dep = Dependency(data)
+    dep.description = fields.get("description", "")
+    dep.sha256 = fields.get("sha256", "")
+    dep.content = fields.get("content", "")
+    try:
+        dep.size = int(fields.get("size", 0) or 0)
+    except ValueError:
+        return None
+    return dep
+
+
+class BodyReader:
+    """
+    Read the body of a request, sized by its Content-Length or chunked.
+    """
+
+    def __init__(self, rfile, headers):
+        self.rfile = rfile
+        self.chunked = "chunked" in headers.get("Transfer-Encoding", "").lower()
+        self.remaining = 0 if self.chunked else int(headers.get("Content-Length", 0))
+        self.done = False
+
+    def read(self, size: int):
+        """
+        Read at most size bytes of the body.
+        :param size: Maximal number of bytes.
+        :return: The data, empty at the end of the body.
+        """
+        if self.chunked and self.remaining == 0 and not self.done:
+            self.remaining = int(self.rfile.readline().split(b";")[0].strip(), 16)
+            if self.remaining == 0:
+                # trailers, up to an empty line.
+                while self.rfile.readline().strip():
+                    pass
+                self.done = True
+        if self.remaining == 0:
+            return b""
+        data = self.rfile.read(min(size, self.remaining))
+        if len(data) == 0:
+            raise OSError("request body truncated")
+        self.remaining -= len(data)
+        if self.chunked and self.remaining == 0:
+            self.rfile.readline()
+        return data
+
+    def drain(self):
+        """
+        Skip the rest of the body.
+        """
+        while self.read(stream_buffer_size):
+            pass
+
+
+def read_multipart(body: BodyReader, boundary: str, folder: Path):
+    """
+    Read a multipart/form-data body, the files being written on disk as
+    they are received.
+    :param body: The request body.
+    :param boundary: The boundary given in the Content-Type header.
+    :param folder: Where to write the files.
+    :return: The fields and the {field name: file path} of the files.
+    """
+    reader = MultipartReader(body, boundary)
+    fields = {}
+    files = {}
+    try:
+        reader.read_part(lambda data: None)
+        while True:
+            headers = reader.read_headers()
+            if headers is None:
+                return fields, files
+            name, filename = headers
+            if filename is None:
+                data = bytearray()
+
+                def keep_field(chunk):
+                    data.extend(chunk)
+                    if len(data) > max_field_size:
+                        raise ValueError(f"field {name} too long")
+
+                reader.read_part(keep_field)
+                fields[name] = data.decode("utf8")
+                continue
+            files[name] = folder / uuid4().hex
+            with open(files[name], "wb") as fp:
+                reader.read_part(fp.write)
+    except (ValueError, OSError):
+        for file in files.values():
+            file.unlink(missing_ok=True)
+        raise
+
+
+class MultipartReader:
+    """
+    Split a multipart body into parts, without holding a whole part in memory.
+    """
+
+    def __init__(self, body: BodyReader, boundary: str):
+        self.body = body
+        self.marker = f"\r\n--{boundary}".encode("utf8")
+        # the first boundary is not preceded by a line break.
+        self.buffer = b"\r\n"
+
+    def fill(self):
+        """
+        Append the next received data to the buffer.
+        """
+        chunk = self.body.read(stream_buffer_size)
+        if len(chunk) == 0:
+            raise ValueError("unterminated multipart body")
+        self.buffer += chunk
+
+    def read_part(self, sink):
+        """
+        Send the data up to the next boundary into a sink.
+        :param sink: Function receiving the data.
+        """
+        keep = len(self.marker) - 1
+        while True:
+            found = self.buffer.find(self.marker)
+            if found >= 0:
+                sink(self.buffer[:found])
+                self.buffer = self.buffer[found + len(self.marker) :]
+                return
+            if len(self.buffer) > keep:
+                sink(self.buffer[:-keep])
+                self.buffer = self.buffer[-keep:]
+            self.fill()
+
+    def read_headers(self):
+        """
+        Read the headers of the part following a boundary.
+        :return: The field name and file name (None for a field), None after
+            the last part.
+        """
+        while len(self.buffer) < 2:
+            self.fill()
+        if self.buffer.startswith(b"--"):
+            self.body.drain()
+            return None
+        while b"\r\n\r\n" not in self.buffer:
+            if len(self.buffer) > max_field_size:
+                raise ValueError("multipart headers too long")
+            self.fill()
+        headers, self.buffer = self.buffer[2:].split(b"\r\n\r\n", 1)
+        name, filename = None, None
+        for line in headers.decode("utf8").split("\r\n"):
+            key, _, value = line.partition(":")
+            if key.strip().lower() != "content-disposition":
+                continue
+            for param in value.split(";")[1:]:
+                param_key, _, param_value = param.strip().partition("=")
+                if param_key == "name":
+                    name = param_value.strip('"')
+                elif param_key == "filename":
+                    filename = param_value.strip('"')
+        return name, filename
+
+
+class Coalescer:
+    """
+    Run a function once for concurrent calls with the same key: the callers
+    arriving while it runs wait for its result.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__running = {}
+
+    def run(self, key, function):
+        """
+        Call a function or join the running call of the same key.
+        :param key: The request identity.
+        :param function: Function without argument.
+        :return: The function's result.
+        """
+        with self.__lock:
+            future = self.__running.get(key)
+            leader = future is None
+            if leader:
+                future = self.__running[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function())
+        except BaseException as err:
+            future.set_exception(err)
+        finally:
+            with self.__lock:
+                del self.__running[key]
+        return future.result()
+
+
+class CachingProxy:
+    """
+    The proxy's content: catalog and archives of an upstream remote.
+    """
+
+    def __init__(
+        self,
+        upstream,
+        folder: Path,
+        max_size: int,
+        catalog_ttl: float = default_catalog_ttl,
+        read_only: bool = True,
+        credentials: tuple = None,
+    ):
+        self.upstream = upstream
+        self.folder = Path(folder)
+        self.cache = ArchiveCache(self.folder / "archives", max_size)
+        self.temp_path = self.folder / "tmp"
+        self.catalog_file = self.folder / "catalog.txt"
+        self.catalog_ttl = catalog_ttl
+        self.read_only = read_only
+        # (login, password) required by pushes and deletions.
+        self.credentials = credentials
+        self.coalescer = Coalescer()
+        self.version = "0.0"
+        # upstream calls modifying its in-memory catalog are serialized.
+        self.__upstream_lock = threading.Lock()
+        self.__catalog = []
+        self.__fetched_at = None
+        self.folder.mkdir(parents=True, exist_ok=True)
+        rmtree(self.temp_path, ignore_errors=True)
+        self.temp_path.mkdir(parents=True, exist_ok=True)
+        self.load_catalog()
+
+    def load_catalog(self):
+        """
+        Read the catalog saved by a previous run.
+        """
+        try:
+            lines = self.catalog_file.read_text().splitlines()
+        except OSError:
+            return
+        self.__catalog = [Dependency(line) for line in lines if line.strip()]
+
+    def save_catalog(self):
+        """
+        Save the catalog: write a temporary file then rename it.
+        """
+        temp = self.temp_path / f"catalog.{uuid4().hex}.tmp"
+        try:
+            lines = [dep.catalog_str() for dep in self.__catalog]
+            temp.write_text("".join(f"{line}\n" for line in lines))
+            os.replace(temp, self.catalog_file)
+        except OSError as err:
+            log.warn(f"WARNING: cannot save the catalog: {err}")
+            temp.unlink(missing_ok=True)
+
+    def catalog_lines(self):
+        """
+        Get the catalog as sent to the clients.
+        :return: List of catalog strings.
+        """
+        return [dep.catalog_str() for dep in self.catalog()]
+
+    def catalog(self):
+        """
+        Get the upstream catalog, downloaded again once expired. When the
+        upstream cannot be reached, the last known catalog is used.
+        :return: List of dependencies.
+        """
+        if self.__fresh():
+            return self.__catalog
+        with self.__upstream_lock:
+            # concurrent callers wait for a single refresh.
+            if not self.__fresh():
+                self.__refresh()
+        return self.__catalog
+
+    def __fresh(self):
+        return (
+            self.__fetched_at is not None
+            and monotonic() - self.__fetched_at < self.catalog_ttl
+        )
+
+    def __refresh(self):
+        self.upstream.valid_shape = True
+        self.upstream.initiated = False
+        deps = self.upstream.query()
+        self.__fetched_at = monotonic()
+        if not self.upstream.valid_shape:
+            log.warn(
+                f"WARNING: upstream {self.upstream.destination} unavailable,"
+                f" serving the last known catalog."
+            )
+            return
+        self.version = self.upstream.version
+        self.__catalog = list(deps)
+        self.save_catalog()
+
+    def authorized(self, authorization: str):
+        """
+        Check the credentials of a write request.
+        :param authorization: The Authorization header of the request.
+        :return: True if they are the configured ones.
+        """
+        if self.credentials is None:
+            return False
+        kind, _, encoded = authorization.partition(" ")
+        if kind.lower() != "basic":
+            return False
+        try:
+            given = base64.b64decode(encoded.strip(), validate=True)
+        except ValueError:
+            return False
+        login, password = self.credentials
+        return hmac.compare_digest(given, f"{login}:{password}".encode("utf8"))
+
+    def find(self, dep: Dependency):
+        """
+        Find the catalog entry of a requested dependency.
+        :param dep: The dependency decoded from a request.
+        :return: The catalog entry or None.
+        """
+        for entry in self.catalog():
+            if entry.properties == dep.properties:
+                return entry
+        return None
+
+    def archive(self, dep: Dependency):
+        """
+        Get the cached archive of a dependency, downloading it on a miss.
+        :param dep: Dependency from the catalog.
+        :return: Path to the cache entry or None.
+        """
+        entry = self.cache.entry(dep)
+        if entry.exists():
+            os.utime(entry)
+            return entry
+        return self.coalescer.run(str(entry), lambda: self.__download(dep))
+
+    def __download(self, dep: Dependency):
+        from depmanager.api.internal.transfer import fetch_verified
+
+        entry = self.cache.entry(dep)
+        if entry.exists():
+            return entry
+        temp = self.temp_path / uuid4().hex
+        try:
+            file = fetch_verified(self.upstream, dep, temp)
+            if file is None:
+                return None
+            log.info(f"{dep.properties.get_as_str()} downloaded from upstream.")
+            self.cache.put(dep, file)
+        finally:
+            rmtree(temp, ignore_errors=True)
+        if not entry.exists():
+            log.warn(f"WARNING: {entry.name} does not fit in the cache.")
+            return None
+        return entry
+
+    def push(self, dep: Dependency, file: Path):
+        """
+        Forward a pushed archive to the upstream and keep it in the cache.
+        :param dep: The dependency decoded from the request.
+        :param file: The received archive.
+        :return: True if the upstream registered it.
+        """
+        from depmanager.api.internal.streaming import file_checksum
+        from depmanager.api.internal.transfer import TransferManager
+
+        checksum = file_checksum(file)
+        dep.sha256 = checksum.hexdigest()
+        dep.size = checksum.size
+        # the upload does not hold the lock: the catalog is still refreshed.
+        self.upstream.valid_shape = True
+        manager = TransferManager()
+        transfer = manager.add_push(self.upstream, dep, file)
+        manager.run()
+        if not transfer.success:
+            return False
+        with self.__upstream_lock:
+            self.upstream.register_dependencies([dep])
+            self.__catalog = list(self.upstream.dependencies)
+            self.save_catalog()
+        self.cache.put(dep, file)
+        return True
+
+    def delete(self, dep: Dependency):
+        """
+        Forward a deletion to the upstream and drop the cached archive.
+        :param dep: Dependency from the catalog.
+        :return: True if the upstream deleted it.
+        """
+        with self.__upstream_lock:
+            self.upstream.valid_shape = True
+            if self.upstream.delete(dep) is False or not self.upstream.valid_shape:
+                return False
+            self.upstream.apply_removals([dep])
+            self.__catalog = [item for item in self.__catalog if item != dep]
+            self.save_catalog()
+        self.cache.entry(dep).unlink(missing_ok=True)
+        return True
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """
+    Answer the requests of the server protocol.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "DepManagerProxy"
+
+    @property
+    def proxy(self) -> CachingProxy:
+        return self.server.proxy
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()}: {format % args}")
+
+    def answer(self, status: int, text: str = "", headers: dict = None):
+        """
+        Send a text response.
+        :param status: The HTTP status.
+        :param text: The body.
+        :param headers: Additional headers.
+        """
+        data = text.encode("utf8")
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", f"{len(data)}")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/api":
+            self.answer(200, "\n".join(self.proxy.catalog_lines()))
+        elif path.startswith("/archives/"):
+            self.send_archive(unquote(path.removeprefix("/archives/")))
+        else:
+            self.answer(404, "not found")
+
+    def do_POST(self):
+        body = BodyReader(self.rfile, self.headers)
+        try:
+            fields, files = self.read_form(body)
+        except (ValueError, OSError) as err:
+            self.close_connection = True
+            self.answer(400, f"invalid request: {err}")
+            return
+        try:
+            self.dispatch(fields, files)
+        finally:
+            for file in files.values():
+                file.unlink(missing_ok=True)
+
+    def read_form(self, body: BodyReader):
+        """
+        Read the fields of a url-encoded or multipart request.
+        :param body: The request body.
+        :return: The fields and the received files.
+        """
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/form-data"):
+            boundary = content_type.partition("boundary=")[2].split(";")[0]
+            return read_multipart(body, boundary.strip('"'), self.proxy.temp_path)
+        data = bytearray()
+        while True:
+            chunk = body.read(stream_buffer_size)
+            if not chunk:
+                break
+            data.extend(chunk)
+            if len(data) > max_field_size:
+                raise ValueError("request too long")
+        fields = {
+            key: values[0]
+            for key, values in parse_qs(
+                data.decode("utf8"), keep_blank_values=True
+            ).items()
+        }
+        return fields, {}
+
+    def dispatch(self, fields: dict, files: dict):
+        """
+        Run the requested action.
+        :param fields: The request fields.
+        :param files: The received files.
+        """
+        action = fields.get("action")
+        if action == "version":
+            formats = ", ".join(self.proxy.upstream.archive_formats)
+            self.answer(
+                200,
+                f"version: {self.proxy.version}\napi_version: {client_api}\n"
+                f"formats: {formats}\n",
+            )
+            return
+        if action not in ["pull", "push", "delete"]:
+            self.answer(400, f"unknown action {action}")
+            return
+        dep = code_to_dep(fields)
+        if dep is None:
+            self.answer(400, "invalid dependency description")
+            return
+        if action in ["push", "delete"] and not self.allow_write():
+            return
+        if action == "push":
+            if "package" not in files:
+                self.answer(400, "missing package")
+            elif self.proxy.push(dep, files["package"]):
+                self.answer(200, "ok")
+            else:
+                self.answer(502, "upstream refused the package")
+            return
+        found = self.proxy.find(dep)
+        if found is None:
+            self.answer(404, f"{dep.properties.get_as_str()} not found")
+        elif action == "delete":
+            if self.proxy.delete(found):
+                self.answer(200, "ok")
+            else:
+                self.answer(502, "upstream refused the deletion")
+        else:
+            entry = self.proxy.archive(found)
+            if entry is None:
+                self.answer(502, "cannot get the archive from upstream")
+                return
+            relative = entry.relative_to(self.proxy.cache.path).as_posix()
+            self.answer(200, f"/archives/{relative}")
+
+    def allow_write(self):
+        """
+        Check that the proxy accepts a write request, answer if not.
+        :return: True if the request can be forwarded.
+        """
+        if self.proxy.read_only:
+            self.answer(403, "read-only proxy")
+            return False
+        if not self.proxy.authorized(self.headers.get("Authorization", "")):
+            self.answer(
+                401,
+                "authentication required",
+                {"WWW-Authenticate": 'Basic realm="depmanager"'},
+            )
+            return False
+        return True
+
+    def send_archive(self, relative: str):
+        """
+        Send a cached archive, honoring a Range header.
+        :param relative: Path of the entry in the cache.
+        """
+        root = self.proxy.cache.path.resolve()
+        entry = (root / relative).resolve()
+        if not entry.is_relative_to(root) or not entry.is_file():
+            self.answer(404, "not found")
+            return
+        try:
+            fp = open(entry, "rb")
+        except OSError:
+            self.answer(404, "not found")
+            return
+        with fp:
+            size = os.fstat(fp.fileno()).st_size
+            offset = 0
+            range_header = self.headers.get("Range", "")
+            if range_header.startswith("bytes=") and range_header.endswith("-"):
+                start = range_header[6:-1]
+                if start.isdigit() and int(start) < size:
+                    offset = int(start)
+            if offset > 0:
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {offset}-{size - 1}/{size}")
+                fp.seek(offset)
+            else:
+                self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", f"{size - offset}")
+            self.end_headers()
+            while True:
+                chunk = fp.read(stream_buffer_size)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+
+class ProxyServer(ThreadingHTTPServer):
+    """
+    HTTP server of a caching proxy, one thread per connection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, proxy: CachingProxy, host: str = "127.0.0.1", port: int = 8080):
+        self.proxy = proxy
+        super().__init__((host, port), ProxyHandler)
@@ -6,9 +6,10 @@ from datetime import datetime
 from os import access, R_OK, W_OK
 from pathlib import Path
 
+from depmanager.api.internal.dependency import Props
 from depmanager.api.internal.machine import Machine
 from depmanager.api.internal.messaging import log
-from depmanager.api.internal.system import LocalSystem, Props
+from depmanager.api.internal.system import LocalSystem
 from depmanager.api.internal.toolset import Toolset
 from depmanager.api.local import LocalManager
 from depmanager.api.recipe import Recipe
@@ -0,0 +1,132 @@
+"""
+Observed latency and throughput of the remotes.
+
+Each measure updates an exponential moving average, persisted in
+``remote_stats.json`` of the DEPMANAGER_HOME so that the ordering of the
+remotes improves from one run to the next.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from uuid import uuid4
+
+from depmanager.api.internal.messaging import log
+
+# Weight of a new measure in the moving averages.
+smoothing = 0.3
+# Archive size used to compare the remotes: latency + size / throughput.
+reference_size = 16 * 1024**2
+# Throughput assumed for a remote without any download yet.
+default_throughput = 10 * 1024**2
+# Transfers smaller than this do not tell the throughput.
+min_measured_size = 256 * 1024
+
+
+def average(previous, value: float):
+    """
+    Update an exponential moving average.
+    :param previous: The average so far, None if no measure yet.
+    :param value: The new measure.
+    :return: The new average.
+    """
+    if previous is None:
+        return value
+    return previous + smoothing * (value - previous)
+
+
+class RemoteStats:
+    """
+    Latency and throughput of the remotes, by remote name.
+    """
+
+    def __init__(self, file: Path):
+        self.file = file
+        self.remotes = {}
+        self.modified = False
+        self.__lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Read the persisted measures, ignoring a missing or damaged file.
+        """
+        try:
+            with open(self.file) as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if type(data) is dict:
+            self.remotes = {
+                name: entry for name, entry in data.items() if type(entry) is dict
+            }
+
+    def save(self):
+        """
+        Write the measures if they changed: write a temporary file then rename it.
+        """
+        if not self.modified:
+            return
+        temp = self.file.parent / f".{self.file.name}.{os.getpid()}.{uuid4().hex}.tmp"
+        try:
+            with self.__lock:
+                content = json.dumps(self.remotes, indent=2, sort_keys=True)
+            temp.write_text(content)
+            os.replace(temp, self.file)
+            self.modified = False
+        except OSError as err:
+            log.debug(f"cannot write remote statistics {self.file}: {err}")
+        finally:
+            temp.unlink(missing_ok=True)
+
+    def record_latency(self, name: str, seconds: float):
+        """
+        Add a measure of the time needed to connect to a remote.
+        :param name: The remote name.
+        :param seconds: The connection time.
+        """
+        with self.__lock:
+            entry = self.remotes.setdefault(name, {})
+            entry["latency"] = average(entry.get("latency"), seconds)
+            self.modified = True
+
+    def record_transfer(self, name: str, size: int, seconds: float):
+        """
+        Add a measure of download speed, if the transfer is large enough.
+        :param name: The remote name.
+        :param size: Number of bytes transferred.
+        :param seconds: Duration of the transfer.
+        """
+        if size < min_measured_size or seconds <= 0:
+            return
+        with self.__lock:
+            entry = self.remotes.setdefault(name, {})
+            entry["throughput"] = average(entry.get("throughput"), size / seconds)
+            self.modified = True
+
+    def expected_time(self, name: str):
+        """
+        Estimate the time to get an archive of reference size from a remote.
+        :param name: The remote name.
+        :return: Time in seconds, None if the remote was never measured.
+        """
+        entry = self.remotes.get(name)
+        if entry is None or "latency" not in entry:
+            return None
+        throughput = entry.get("throughput") or default_throughput
+        return entry["latency"] + reference_size / throughput
+
+    def order(self, names: list):
+        """
+        Sort remotes from the fastest, the unmeasured ones keeping their order
+        after the measured ones.
+        :param names: The remote names, in configuration order.
+        :return: The sorted list.
+        """
+
+        def key(name):
+            expected = self.expected_time(name)
+            return (expected is None, expected or 0.0)
+
+        return sorted(names, key=key)
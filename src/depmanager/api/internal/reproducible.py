@@ -0,0 +1,162 @@
+"""
+Reproducible package archives and package content hash.
+
+Packing the same tree twice gives the same bytes: the files are added in
+sorted order, with the owner, the group and the permissions normalized and
+the modification time of the package build (the compression writes a fixed
+gzip header). The content hash identifies the files of a package, whatever
+its build date: a push is skipped when the remote already holds it.
+"""
+
+import os
+import stat
+from hashlib import sha256
+from pathlib import Path
+
+# Package metadata, compared through the catalog entry and not by content:
+# it holds the build date.
+metadata_files = ["info.yaml", "edp.info"]
+# Earliest date of a zip entry.
+zip_epoch = 315532800
+
+
+def tree_files(folder: Path):
+    """
+    List the files of a package in archive order.
+    :param folder: The package folder.
+    :return: List of (path, name in the archive), sorted by name.
+    """
+    files = []
+    for content in folder.rglob("*"):
+        if content.is_file():
+            files.append((content, content.relative_to(folder).as_posix()))
+    return sorted(files, key=lambda item: item[1])
+
+
+def package_mtime(dep):
+    """
+    Get the modification time given to the files of a package archive.
+    :param dep: The package.
+    :return: The build date as a timestamp, None if unknown.
+    """
+    try:
+        return int(dep.properties.build_date.timestamp())
+    except (AttributeError, OverflowError, ValueError):
+        return None
+
+
+def normal_mode(mode: int):
+    """
+    Get the normalized permissions of a file.
+    :param mode: The file mode.
+    :return: 0o755 for an executable file, 0o644 otherwise.
+    """
+    return 0o755 if mode & 0o111 else 0o644
+
+
+def add_tree(archive, folder: Path, mtime=None, callback=None, names=None):
+    """
+    Add the files of a folder to a tar archive, reproducibly.
+    :param archive: The tarfile, in write mode.
+    :param folder: The folder.
+    :param mtime: Modification time of the entries, None to keep the files' one.
+    :param callback: Optional function(bytes_processed: int).
+    :param names: Optional set of the names of the files to add, all if None.
+    """
+    for content, name in tree_files(folder):
+        if names is not None and name not in names:
+            continue
+        info = archive.gettarinfo(content, arcname=name)
+        info.uid = info.gid = 0
+        info.uname = info.gname = ""
+        info.mode = normal_mode(info.mode)
+        info.mtime = int(info.mtime) if mtime is None else mtime
+        if info.isreg():
+            with open(content, "rb") as fp:
+                archive.addfile(info, fp)
+        else:
+            archive.addfile(info)
+        if callback:
+            callback(info.size)
+
+
+def write_zip_tree(archive, folder: Path, mtime=None, callback=None):
+    """
+    Add the files of a folder to a zip archive, reproducibly.
+    :param archive: The ZipFile, in write mode.
+    :param folder: The folder.
+    :param mtime: Modification time of the entries, None to keep the files' one.
+    :param callback: Optional function(bytes_processed: int).
+    """
+    from time import gmtime
+    from zipfile import ZIP_DEFLATED, ZipInfo
+
+    from depmanager.api.internal.streaming import copy_stream
+
+    for content, name in tree_files(folder):
+        status = content.stat()
+        date = max(int(status.st_mtime if mtime is None else mtime), zip_epoch)
+        info = ZipInfo(name, gmtime(date)[:6])
+        info.compress_type = ZIP_DEFLATED
+        info.create_system = 3
+        info.external_attr = (stat.S_IFREG | normal_mode(status.st_mode)) << 16
+        info.file_size = status.st_size
+        with open(content, "rb") as source, archive.open(info, "w") as target:
+            copy_stream(source, target)
+        if callback:
+            callback(status.st_size)
+
+
+def tree_manifest(folder: Path):
+    """
+    List the files of a package with their permissions and content.
+    :param folder: The package folder.
+    :return: Dictionary name -> (normalized mode, SHA-256 of the content or of
+        the link target).
+    """
+    from depmanager.api.internal.streaming import stream_buffer_size
+
+    manifest = {}
+    buffer = bytearray(stream_buffer_size)
+    view = memoryview(buffer)
+    for content, name in tree_files(folder):
+        status = os.lstat(content)
+        digest = sha256()
+        if stat.S_ISLNK(status.st_mode):
+            digest.update(f"->{os.readlink(content)}".encode("utf8"))
+        else:
+            with open(content, "rb") as fp:
+                while True:
+                    size = fp.readinto(view)
+                    if not size:
+                        break
+                    digest.update(view[:size])
+        manifest[name] = (normal_mode(status.st_mode), digest.hexdigest())
+    view.release()
+    return manifest
+
+
+def content_hash(manifest: dict):
+    """
+    Compute the content hash of a package from its manifest: names,
+    permissions and content of its files, except the metadata files. The
+    dependencies, in edp.info, are not part of it and must be compared apart.
+    :param manifest: The manifest, as given by tree_manifest.
+    :return: The SHA-256 as hexadecimal string.
+    """
+    digest = sha256()
+    for name in sorted(manifest):
+        if name in metadata_files:
+            continue
+        mode, content = manifest[name]
+        digest.update(f"{name}\0{mode:o}\0{content}\n".encode("utf8"))
+    return digest.hexdigest()
+
+
+def tree_hash(folder: Path):
+    """
+    Compute the content hash of a package folder.
+    :param folder: The package folder.
+    :return: The SHA-256 as hexadecimal string.
+    """
+    return content_hash(tree_manifest(folder))
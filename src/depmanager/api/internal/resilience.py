@@ -0,0 +1,150 @@
+"""
+Timeouts, retries and circuit breaking of remote operations.
+
+Idempotent requests failing for a transient reason (connection error,
+timeout, 5xx or 429 answer) are tried again after a jittered exponential
+delay. Each remote has a circuit breaker: after a few consecutive failures
+the remote is considered down and skipped at once, until a cooldown expires
+and a single probe request is let through.
+"""
+
+import random
+import threading
+from time import monotonic
+
+from depmanager.api.internal.messaging import log
+
+# Timeouts (connection, read) of a network operation, in seconds.
+default_timeout = (10.0, 60.0)
+# Number of tries of an idempotent operation, the first one included.
+default_attempts = 3
+# Delay before the first retry and maximal delay, in seconds.
+backoff_base = 0.5
+backoff_max = 8.0
+# HTTP statuses worth a retry.
+transient_statuses = [408, 429, 500, 502, 503, 504]
+# Consecutive failures opening the circuit, and time before a probe.
+breaker_threshold = 3
+breaker_cooldown = 30.0
+
+
+class RemoteUnavailable(ConnectionError):
+    """
+    Raised instead of contacting a remote whose circuit is open.
+    """
+
+
+def backoff_delay(attempt: int):
+    """
+    Get the delay before a retry: exponential, with full jitter so that
+    concurrent clients do not retry all at the same time.
+    :param attempt: Number of the failed try, starting at 1.
+    :return: Delay in seconds.
+    """
+    return random.uniform(0, min(backoff_max, backoff_base * 2 ** (attempt - 1)))
+
+
+def parse_timeout(value):
+    """
+    Read a timeout given as seconds or as a [connection, read] pair.
+    :param value: The configured value.
+    :return: The (connection, read) pair, None if invalid or not positive.
+    """
+    try:
+        if type(value) in [list, tuple]:
+            connect, read = value
+            timeout = float(connect), float(read)
+        else:
+            timeout = float(value), float(value)
+    except (TypeError, ValueError):
+        return None
+    # nan fails the comparison too.
+    if not all(part > 0 for part in timeout):
+        return None
+    return timeout
+
+
+def parse_retries(value):
+    """
+    Read a number of retries.
+    :param value: The configured value.
+    :return: The non-negative number, None if invalid.
+    """
+    if type(value) is str and value.strip().isdigit():
+        value = int(value)
+    if type(value) is not int or value < 0:
+        return None
+    return value
+
+
+class CircuitBreaker:
+    """
+    Track the consecutive failures of a remote.
+
+    Closed, every call is allowed. After ``threshold`` failures it opens and
+    calls are refused for ``cooldown`` seconds; then one probe is allowed,
+    closing the circuit on success or opening it again on failure.
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        threshold: int = breaker_threshold,
+        cooldown: float = breaker_cooldown,
+    ):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.__lock = threading.Lock()
+
+    def is_open(self):
+        """
+        Check if the remote is known to be down, without taking the probe.
+        :return: True if calls are refused.
+        """
+        with self.__lock:
+            return (
+                self.opened_at is not None
+                and monotonic() - self.opened_at < self.cooldown
+            )
+
+    def allow(self):
+        """
+        Check if a call may be done; once the cooldown expired, the first
+        caller gets the probe and the others are refused until its result.
+        :return: True if the call may be done.
+        """
+        with self.__lock:
+            if self.opened_at is None:
+                return True
+            if monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.opened_at = monotonic()
+            return True
+
+    def record_success(self):
+        """
+        Close the circuit.
+        """
+        with self.__lock:
+            if self.opened_at is not None:
+                log.info(f"Remote {self.name} is available again.")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """
+        Count a failure, opening the circuit beyond the threshold.
+        """
+        with self.__lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            if self.opened_at is None:
+                log.warn(
+                    f"WARNING: remote {self.name} is unavailable, skipped for"
+                    f" {self.cooldown:.0f} s."
+                )
+            self.opened_at = monotonic()
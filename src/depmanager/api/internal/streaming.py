@@ -0,0 +1,392 @@
+"""
+Buffered copy, checksum, compression and extraction of data streams.
+"""
+
+import os
+import sys
+import threading
+from hashlib import sha256
+from pathlib import Path
+from time import monotonic
+
+# Size of the buffer used to move data between a stream and a file.
+stream_buffer_size = 1024 * 1024
+# Minimal time (in seconds) between two progress reports.
+progress_interval = 0.1
+# ioctl cloning a file on copy-on-write file systems (Linux FICLONE).
+ficlone = 0x40049409
+
+
+class TransferCancelled(Exception):
+    """
+    Raised by a progress callback to stop a transfer that is no longer needed.
+    """
+
+
+class ThrottledCallback:
+    """
+    Progress callback accumulating the advance between reports.
+
+    Wraps a function(advance: int, total: int) so that it is called at most
+    once every ``progress_interval`` seconds, plus a final call on flush.
+    """
+
+    def __init__(self, callback, total: int = 0, interval: float = progress_interval):
+        self.callback = callback
+        self.total = total
+        self.interval = interval
+        self.pending = 0
+        self.last_report = monotonic()
+
+    def __call__(self, advance: int):
+        self.pending += advance
+        now = monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.flush()
+
+    def flush(self):
+        """
+        Report the advance not yet reported.
+        """
+        if self.pending == 0:
+            return
+        pending, self.pending = self.pending, 0
+        self.callback(pending, self.total)
+
+
+def copy_stream(source, destination, callback=None, total: int = 0):
+    """
+    Copy a readable stream into a writable one through a reusable buffer.
+    :param source: Object with a ``readinto`` method, or a ``read`` one.
+    :param destination: Object with a ``write`` method.
+    :param callback: Optional function(advance: int, total: int) for progress.
+    :param total: Expected total size for the callback, 0 if unknown.
+    :return: The number of bytes copied.
+    """
+    progress = None
+    if callback:
+        progress = ThrottledCallback(callback, total)
+    buffer = bytearray(stream_buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+    try:
+        if hasattr(source, "readinto"):
+            while True:
+                size = source.readinto(view)
+                if not size:
+                    break
+                destination.write(view[:size])
+                copied += size
+                if progress:
+                    progress(size)
+        else:
+            while True:
+                chunk = source.read(stream_buffer_size)
+                if not chunk:
+                    break
+                destination.write(chunk)
+                copied += len(chunk)
+                if progress:
+                    progress(len(chunk))
+    finally:
+        if progress:
+            progress.flush()
+        view.release()
+    return copied
+
+
+def clone_file(source, destination):
+    """
+    Make a copy-on-write clone of an open file (reflink).
+    :param source: Source file object.
+    :param destination: Destination file object, empty.
+    :return: True if cloned.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+
+        fcntl.ioctl(destination.fileno(), ficlone, source.fileno())
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def copy_file(source: Path, destination: Path, link: bool = False):
+    """
+    Copy a file, keeping the data in the kernel when possible.
+
+    Tries in turn a hard link (only if allowed: both names then share the
+    same data), a copy-on-write clone, ``os.copy_file_range``, then a plain
+    copy.
+    :param source: Existing file.
+    :param destination: New file.
+    :param link: If a hard link is acceptable.
+    :return: The method used: "link", "reflink", "copy_file_range" or "copy".
+    """
+    from shutil import copyfile
+
+    if link:
+        try:
+            os.link(source, destination)
+            return "link"
+        except OSError:
+            pass
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        if clone_file(src, dst):
+            return "reflink"
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return "copy_file_range"
+            except OSError:
+                pass
+    copyfile(source, destination)
+    return "copy"
+
+
+class Checksum:
+    """
+    SHA-256 and size of data, computed incrementally while it is written.
+    """
+
+    def __init__(self):
+        self.digest = sha256()
+        self.size = 0
+
+    def reset(self):
+        """
+        Forget the data seen so far.
+        """
+        self.digest = sha256()
+        self.size = 0
+
+    def write(self, data):
+        """
+        Add data to the checksum.
+        :param data: The bytes.
+        """
+        self.digest.update(data)
+        self.size += len(data)
+
+    def resume(self, file: Path):
+        """
+        Restart from the content of a file, to continue a partial download
+        left by a previous run.
+        :param file: The partial file.
+        """
+        self.reset()
+        if file.exists():
+            with open(file, "rb") as fp:
+                copy_stream(fp, self)
+
+    def hexdigest(self):
+        """
+        Get the SHA-256 of the data.
+        :return: The hash as hexadecimal string.
+        """
+        return self.digest.hexdigest()
+
+    def tee(self, target):
+        """
+        Get a writable stream sending data to a target and to the checksum.
+        :param target: Object with a ``write`` method.
+        :return: The writable stream.
+        """
+        return ChecksumWriter(target, self)
+
+
+class ChecksumWriter:
+    """
+    Writable stream forwarding the data to a target, then to a checksum.
+    """
+
+    def __init__(self, target, checksum: Checksum):
+        self.target = target
+        self.checksum = checksum
+
+    def write(self, data):
+        """
+        Write data to the target and add it to the checksum.
+        :param data: The bytes.
+        """
+        written = self.target.write(data)
+        self.checksum.write(data)
+        return written
+
+
+def file_checksum(file: Path):
+    """
+    Compute the checksum of a file.
+    :param file: The file.
+    :return: The Checksum.
+    """
+    checksum = Checksum()
+    checksum.resume(file)
+    return checksum
+
+
+class StreamExtractor:
+    """
+    Extract a gzip (or zstd) tar archive while its bytes are written.
+
+    The written data goes through a pipe to a thread reading it with
+    ``tarfile`` in stream mode (``r|gz``), so download and decompression
+    overlap and the archive is never stored on disk.
+    """
+
+    def __init__(self, destination: Path):
+        self.destination = destination
+        self.error = None
+        self.__reader = None
+        self.__writer = None
+        self.__thread = None
+
+    def start(self):
+        """
+        Start the extraction thread.
+        """
+        self.destination.mkdir(parents=True, exist_ok=True)
+        read_fd, write_fd = os.pipe()
+        self.__reader = os.fdopen(read_fd, "rb", buffering=stream_buffer_size)
+        self.__writer = os.fdopen(write_fd, "wb")
+        self.__thread = threading.Thread(target=self.__extract, daemon=True)
+        self.__thread.start()
+
+    def write(self, data):
+        """
+        Feed archive data to the extraction.
+        Raise BrokenPipeError if the extraction stopped on an error.
+        :param data: The bytes.
+        """
+        self.__writer.write(data)
+
+    def finish(self, success: bool = True):
+        """
+        Close the stream and wait for the end of the extraction.
+        :param success: False if the data transfer failed.
+        :return: True if the whole archive has been extracted.
+        """
+        try:
+            self.__writer.close()
+        except OSError:
+            pass
+        self.__thread.join()
+        return success and self.error is None
+
+    def __extract(self):
+        from depmanager.api.internal.compression import open_tar_stream
+        from depmanager.api.internal.extraction import extract_tar
+
+        try:
+            with open_tar_stream(self.__reader) as archive:
+                extract_tar(archive, self.destination, "stream")
+            # drain the trailing padding so the writer never blocks.
+            while self.__reader.read(stream_buffer_size):
+                pass
+        except Exception as err:
+            self.error = err
+        finally:
+            self.__reader.close()
+
+
+class StreamPacker:
+    """
+    Produce the compressed tar archive of a folder while it is read.
+
+    A thread writes the archive with ``tarfile`` in stream mode (``w|``)
+    through the compression into a pipe that the uploader reads, so
+    compression and upload overlap and the archive is never stored on disk.
+    The checksum of the produced data is complete once the end of the stream
+    has been read.
+    """
+
+    def __init__(self, folder: Path, compression=None, mtime=None):
+        from depmanager.api.internal.compression import Compression
+
+        self.folder = folder
+        self.compression = compression or Compression()
+        # modification time of the archive entries, None for the files' one.
+        self.mtime = mtime
+        self.checksum = Checksum()
+        self.error = None
+        self.__reader = None
+        self.__writer = None
+        self.__thread = None
+
+    def start(self):
+        """
+        Start the compression thread.
+        """
+        read_fd, write_fd = os.pipe()
+        self.__reader = os.fdopen(read_fd, "rb", buffering=stream_buffer_size)
+        self.__writer = os.fdopen(write_fd, "wb")
+        self.__thread = threading.Thread(target=self.__pack, daemon=True)
+        self.__thread.start()
+
+    def read(self, size: int = -1):
+        """
+        Read archive data, blocking until it is compressed.
+        :param size: Maximal number of bytes, -1 for all.
+        :return: The bytes, empty at the end of the archive.
+        """
+        data = self.__reader.read(size)
+        if not data:
+            self.__check()
+        return data
+
+    def readinto(self, buffer):
+        """
+        Read archive data into a buffer.
+        :param buffer: Writable buffer.
+        :return: The number of bytes read, 0 at the end of the archive.
+        """
+        size = self.__reader.readinto(buffer)
+        if not size:
+            self.__check()
+        return size
+
+    def finish(self, success: bool = True):
+        """
+        Close the stream and wait for the end of the compression.
+        :param success: False if the upload failed.
+        :return: True if the whole archive has been produced and sent.
+        """
+        # an aborted upload stops the compression with a broken pipe.
+        self.__reader.close()
+        self.__thread.join()
+        return success and self.error is None
+
+    def __check(self):
+        # the end of the pipe is only reached once the thread stops: a failed
+        # compression must not look like a complete archive.
+        self.__thread.join()
+        if self.error is not None:
+            raise OSError(f"cannot compress {self.folder}: {self.error}")
+
+    def __pack(self):
+        import tarfile
+
+        from depmanager.api.internal.reproducible import add_tree
+
+        try:
+            with self.compression.writer(
+                self.checksum.tee(self.__writer)
+            ) as compressor, tarfile.open(fileobj=compressor, mode="w|") as archive:
+                add_tree(archive, self.folder, self.mtime)
+            self.__writer.flush()
+        except Exception as err:
+            self.error = err
+        finally:
+            try:
+                self.__writer.close()
+            except OSError:
+                pass
@@ -3,17 +3,15 @@ Everything needed for database.
 """
 
 import os
+from copy import deepcopy
 from pathlib import Path
 from shutil import rmtree
+from uuid import uuid4
 
-from depmanager.api.internal.crypto import PasswordManager
+from depmanager.api.internal.compression import Compression
 from depmanager.api.internal.data_locking import Locker
-from depmanager.api.internal.database_local import LocalDatabase
-from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
-from depmanager.api.internal.database_remote_ftp import RemoteDatabaseFtp
-from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
-from depmanager.api.internal.dependency import Props
 from depmanager.api.internal.messaging import log
+from depmanager.api.internal.remote_stats import RemoteStats
 from depmanager.api.internal.toolset import Toolset
 
 
@@ -24,7 +22,12 @@ class LocalSystem:
 
     supported_remote = ["srv", "srvs", "ftp", "folder"]
 
-    def __init__(self):
+    def __init__(self, shared: bool = False):
+        """
+        Load the configuration and lock the local data.
+        :param shared: Share the lock with the other readers: the data is only
+            read, until lock_exclusive() is called.
+        """
         self.config = {}
         env = os.environ.get("DEPMANAGER_HOME")
         if env is not None:
@@ -33,15 +36,27 @@ class LocalSystem:
             env = Path.home()
         self.base_path = env / ".edm"
         self.base_path.mkdir(parents=True, exist_ok=True)
-        self.password_manager = PasswordManager(self.base_path)
+        self.__password_manager = None
         self.file = self.base_path / "config.yaml"
         self.data_path = self.base_path / "data"
         self.temp_path = self.base_path / "tmp"
+        # extract the pulled archives while they are downloaded.
+        self.stream_install = True
+        # compress the pushed packages while they are uploaded.
+        self.stream_push = True
+        # machine-wide archive cache, shared between DEPMANAGER_HOME instances.
+        self.archive_cache = None
+        # order the remotes by observed speed ("speed") or as configured ("config").
+        self.remote_order = "config"
+        # download each archive from two mirrors at once, keeping the first one.
+        self.race_mirrors = False
+        # format, level and threads of the archive compression.
+        self.compression = Compression()
         #
         # request data lock
         self.locker = Locker(base_path=self.base_path)
-        if not self.locker.request_lock():
-            log.fatal(f"Locking system reach deadlock - exit.")
+        if not self.locker.request_lock(shared):
+            log.fatal(f"Locking system failed - exit.")
             exit(1)
         self.released = False
         # in case of first initialization
@@ -51,11 +66,24 @@ class LocalSystem:
         # this instance has now exclusive (hope)
         #
         self.read_config_file()
+        loaded_config = deepcopy(self.config)
+        #
+        # a temporary folder per process, in the configured one: its lock
+        # tells the other processes that it is in use.
+        self.temp_root = self.temp_path
+        self.temp_path = self.temp_root / f"{os.getpid()}-{uuid4().hex[:8]}"
+        self.temp_locker = Locker(self.temp_root, f"{self.temp_path.name}.lock")
+        self.temp_locker.request_lock()
+        self.temp_path.mkdir(parents=True, exist_ok=True)
+        # locks of the packages being installed: hash -> [Locker, count].
+        self.locks_path = self.base_path / "locks"
+        self.package_locks = {}
         #
         # Manage databases
         #
-        self.local_database = LocalDatabase(self.data_path)
+        self.__local_database = None
         self.remote_database = {}
+        self.remote_stats = RemoteStats(self.base_path / "remote_stats.json")
         self.default_remote = ""
         if "remotes" not in self.config.keys():
             self.config["remotes"] = {}
@@ -93,13 +121,26 @@ class LocalSystem:
                 default = info["default"]
             if default:
                 self.default_remote = name
+            chunked_upload = False
+            if "chunked_upload" in info:
+                chunked_upload = bool(info["chunked_upload"])
+            if kind in ["srv", "srvs"]:
+                from depmanager.api.internal.database_remote_server import (
+                    RemoteDatabaseServer,
+                )
             if kind == "srv":
                 if "port" in info:
                     port = info["port"]
                 else:
                     port = -1
                 self.remote_database[name] = RemoteDatabaseServer(
-                    url, port, False, default, login, passwd
+                    url,
+                    port,
+                    False,
+                    default,
+                    login,
+                    passwd,
+                    chunked_upload,
                 )
             elif kind == "srvs":
                 if "port" in info:
@@ -107,18 +148,47 @@ class LocalSystem:
                 else:
                     port = -1
                 self.remote_database[name] = RemoteDatabaseServer(
-                    url, port, True, default, login, passwd
+                    url,
+                    port,
+                    True,
+                    default,
+                    login,
+                    passwd,
+                    chunked_upload,
                 )
             elif kind == "ftp":
+                from depmanager.api.internal.database_remote_ftp import (
+                    RemoteDatabaseFtp,
+                    default_connections,
+                )
+
                 if "port" in info:
                     port = info["port"]
                 else:
                     port = 21
+                if "connections" in info:
+                    connections = info["connections"]
+                else:
+                    connections = default_connections
                 self.remote_database[name] = RemoteDatabaseFtp(
-                    url, port, default, login, passwd
+                    url, port, default, login, passwd, connections
                 )
             elif kind == "folder":
-                self.remote_database[name] = RemoteDatabaseFolder(url, default)
+                from depmanager.api.internal.database_remote_folder import (
+                    RemoteDatabaseFolder,
+                )
+
+                if "uncompressed" in info:
+                    uncompressed = bool(info["uncompressed"])
+                else:
+                    uncompressed = False
+                self.remote_database[name] = RemoteDatabaseFolder(
+                    url, default, uncompressed
+                )
+            if name in self.remote_database:
+                self.remote_database[name].apply_resilience(info)
+                self.remote_database[name].apply_compression(self.compression, info)
+                self.remote_database[name].apply_deltas(info)
         #
         # Manage toolsets
         #
@@ -136,32 +206,152 @@ class LocalSystem:
                 self.default_toolset = name
                 self.toolsets[name].default = True
         #
-        self.write_config_file()
+        if self.config != loaded_config or not self.file.exists():
+            self.write_config_file()
 
     def __del__(self):
         if not self.released:
             self.release()
 
+    @property
+    def local_database(self):
+        """
+        The database of the local packages, read on first use.
+        :return: The local database.
+        """
+        if self.__local_database is None:
+            from depmanager.api.internal.database_local import LocalDatabase
+
+            self.__local_database = LocalDatabase(self.data_path)
+        return self.__local_database
+
+    @property
+    def password_manager(self):
+        """
+        The manager of the remote passwords, loaded on first use.
+        :return: The password manager.
+        """
+        if self.__password_manager is None:
+            from depmanager.api.internal.crypto import PasswordManager
+
+            self.__password_manager = PasswordManager(self.base_path)
+        return self.__password_manager
+
     def release(self):
         """
         Release the lock on the data
         """
+        if self.released:
+            return
+        self.save_remote_stats()
+        for locker, _ in self.package_locks.values():
+            locker.release_lock()
+        self.package_locks.clear()
+        rmtree(self.temp_path, ignore_errors=True)
+        self.temp_locker.release_lock()
+        self.temp_locker.lock_file.unlink(missing_ok=True)
         self.locker.release_lock()
         self.released = True
 
+    def lock_package(self, key: str, blocking: bool = True):
+        """
+        Lock a package while this process installs it. The lock is counted:
+        it is held until unlock_package() is called as many times.
+        :param key: The hash of the package.
+        :param blocking: Wait for another process installing it.
+        :return: True if locked, False if another process holds it (not blocking).
+        """
+        if key in self.package_locks:
+            self.package_locks[key][1] += 1
+            return True
+        locker = Locker(self.locks_path, f"{key}.lock")
+        if not locker.request_lock(blocking=blocking):
+            return False
+        self.package_locks[key] = [locker, 1]
+        return True
+
+    def unlock_package(self, key: str):
+        """
+        Release the lock of a package.
+        :param key: The hash of the package.
+        """
+        if key not in self.package_locks:
+            return
+        self.package_locks[key][1] -= 1
+        if self.package_locks[key][1] == 0:
+            self.package_locks.pop(key)[0].release_lock()
+
+    def lock_exclusive(self):
+        """
+        Hold the lock on the data exclusively before modifying it. If the lock
+        was shared, the local database is read again: another process may
+        have modified it meanwhile.
+        """
+        if self.released or self.locker.mode == "exclusive":
+            return
+        if not self.locker.request_lock():
+            log.fatal(f"Locking system failed - exit.")
+            exit(1)
+        if self.__local_database is not None:
+            self.__local_database.reload()
+
     def get_source_list(self):
         """
-        Get the list of source starting from local, then default remote then other remotes
+        Get the list of source starting from local, then default remote then other remotes.
+        With ``remote_order: speed``, the other remotes are sorted from the
+        fastest observed, and the ones known to be down come last.
         :return: List of sources
         """
-        slist = ["local"]
-        if self.default_remote not in ["", None]:
-            slist.append(self.default_remote)
+        slist = []
         for rem in self.remote_database.keys():
             if rem == self.default_remote:
                 continue
             slist.append(rem)
-        return slist
+        if self.remote_order == "speed":
+            slist = sorted(
+                self.remote_stats.order(slist),
+                key=lambda rem: self.remote_database[rem].breaker.is_open(),
+            )
+        if self.default_remote not in ["", None]:
+            slist.insert(0, self.default_remote)
+        return ["local"] + slist
+
+    def get_remote_name(self, remote):
+        """
+        Get the name of a remote database.
+        :param remote: The remote database.
+        :return: Its name or None.
+        """
+        for name, database in self.remote_database.items():
+            if database is remote:
+                return name
+        return None
+
+    def record_transfers(self, transfers: list):
+        """
+        Update the remote statistics with finished downloads.
+        :param transfers: The transfers.
+        """
+        for transfer in transfers:
+            if not transfer.success or transfer.kind not in ["pull", "stream", "race"]:
+                continue
+            name = self.get_remote_name(transfer.remote)
+            if name is not None:
+                self.remote_stats.record_transfer(
+                    name, transfer.bytes, transfer.duration
+                )
+
+    def save_remote_stats(self):
+        """
+        Record the connection times of the remotes used and save the statistics.
+        """
+        if not hasattr(self, "remote_stats"):
+            return
+        for name, remote in self.remote_database.items():
+            if remote.latency is not None:
+                self.remote_stats.record_latency(name, remote.latency)
+                remote.latency = None
+        self.remote_stats.save()
 
     def read_config_file(self):
         """
@@ -194,6 +384,27 @@ class LocalSystem:
             self.data_path = Path(self.config["data_path"]).resolve()
         if "temp_path" in self.config.keys():
             self.temp_path = Path(self.config["temp_path"]).resolve()
+        if "stream_install" in self.config.keys():
+            self.stream_install = bool(self.config["stream_install"])
+        if "stream_push" in self.config.keys():
+            self.stream_push = bool(self.config["stream_push"])
+        if "remote_order" in self.config.keys():
+            if self.config["remote_order"] in ["speed", "config"]:
+                self.remote_order = self.config["remote_order"]
+            else:
+                log.warn(
+                    f"WARNING: unknown remote_order {self.config['remote_order']}, using config."
+                )
+        if "race_mirrors" in self.config.keys():
+            self.race_mirrors = bool(self.config["race_mirrors"])
+        if "archive_cache" in self.config.keys():
+            from depmanager.api.internal.archive_cache import ArchiveCache
+
+            self.archive_cache = ArchiveCache.from_config(self.config["archive_cache"])
+        if "compression" in self.config.keys():
+            compression = Compression.from_config(self.config["compression"])
+            if compression is not None:
+                self.compression = compression
 
     def write_config_file(self):
         """
@@ -212,20 +423,34 @@ class LocalSystem:
                 file_old.unlink()
             except Exception as err:
                 log.warn(f"Exception during old config removal: {err}")
+        content = yaml.dump(self.config, indent=2)
         try:
-            with open(self.file, "w") as fp:
-                fp.write(yaml.dump(self.config, indent=2))
+            if self.file.exists() and self.file.read_text() == content:
+                return
+            # readers may share the lock: replace the file at once.
+            temp = self.file.with_name(f".{self.file.name}.{uuid4().hex}.tmp")
+            temp.write_text(content)
+            os.replace(temp, self.file)
         except Exception as err:
             log.fatal(f"Exception during config writing: {err}")
 
     def clear_tmp(self):
         """
-        Empty the Temp dir.
+        Empty the temporary folder of this process, and remove the ones of
+        the processes that ended without cleaning theirs.
         """
-        from shutil import rmtree
-
         rmtree(self.temp_path, ignore_errors=True)
         self.temp_path.mkdir(parents=True, exist_ok=True)
+        for folder in self.temp_root.iterdir():
+            if not folder.is_dir() or folder == self.temp_path:
+                continue
+            locker = Locker(self.temp_root, f"{folder.name}.lock")
+            if not locker.request_lock(blocking=False):
+                # used by another process.
+                continue
+            rmtree(folder, ignore_errors=True)
+            locker.release_lock()
+            locker.lock_file.unlink(missing_ok=True)
 
     def add_remote(self, data):
         """
@@ -271,6 +496,10 @@ class LocalSystem:
         if default:
             self.default_remote = name
         if kind in ["srv", "srvs"]:
+            from depmanager.api.internal.database_remote_server import (
+                RemoteDatabaseServer,
+            )
+
             if "port" in data:
                 port = data["port"]
             else:
@@ -314,6 +543,11 @@ class LocalSystem:
             self.write_config_file()
             return True
         if kind == "ftp":
+            from depmanager.api.internal.database_remote_ftp import (
+                RemoteDatabaseFtp,
+                default_connections,
+            )
+
             if "port" in data:
                 port = data["port"]
             else:
@@ -328,8 +562,12 @@ class LocalSystem:
             else:
                 passwd = ""
                 encrypted_passwd = ""
+            if "connections" in data:
+                connections = data["connections"]
+            else:
+                connections = default_connections
             self.remote_database[name] = RemoteDatabaseFtp(
-                url, port, default, login, passwd
+                url, port, default, login, passwd, connections
             )
             self.config["remotes"][name] = {
                 "url": url,
@@ -339,6 +577,8 @@ class LocalSystem:
             }
             if port != 21:
                 self.config["remotes"][name]["port"] = port
+            if connections != default_connections:
+                self.config["remotes"][name]["connections"] = connections
             if login != "":
                 self.config["remotes"][name]["login"] = login
             if encrypted_passwd != "":
@@ -346,12 +586,24 @@ class LocalSystem:
             self.write_config_file()
             return True
         if kind == "folder":
-            self.remote_database[name] = RemoteDatabaseFolder(url, default)
+            from depmanager.api.internal.database_remote_folder import (
+                RemoteDatabaseFolder,
+            )
+
+            if "uncompressed" in data:
+                uncompressed = bool(data["uncompressed"])
+            else:
+                uncompressed = False
+            self.remote_database[name] = RemoteDatabaseFolder(
+                url, default, uncompressed
+            )
             self.config["remotes"][name] = {
                 "url": url,
                 "default": default,
                 "kind": kind,
             }
+            if uncompressed:
+                self.config["remotes"][name]["uncompressed"] = True
             self.write_config_file()
             return True
         return False
@@ -375,19 +627,56 @@ class LocalSystem:
         self.write_config_file()
         return True
 
-    def import_folder(self, source: Path):
+    def import_folder(self, source: Path, link: bool = False):
         """
         Import package to database.
         :param source: Package initial folder.
+        :param link: Hard link the files instead of copying them, when possible.
         """
-        from shutil import copytree
+        from shutil import copy2, copytree
+
+        from depmanager.api.internal.dependency import Props
 
         p = Props()
         p.from_edp_file(source / "edp.info")
         destination_folder = self.local_database.base_path / f"{p.name}{p.hash()}"
-        rmtree(destination_folder, ignore_errors=True)
-        copytree(source, destination_folder)
-        self.clear_tmp()
+        # copied aside then renamed: other processes never see a partial copy.
+        staging = destination_folder.with_name(
+            f".{destination_folder.name}.{self.temp_path.name}"
+        )
+        copy_function = copy2
+        if link:
+
+            def copy_function(src, dst):
+                """
+                Hard link a file, copy it if not possible.
+                :param src: The source file.
+                :param dst: The new file.
+                """
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    copy2(src, dst)
+
+        # the old version is renamed aside, and removed once replaced.
+        previous = staging.with_name(f"{staging.name}.old")
+        self.lock_package(p.hash())
+        try:
+            rmtree(staging, ignore_errors=True)
+            rmtree(previous, ignore_errors=True)
+            copytree(source, staging, copy_function=copy_function)
+            if destination_folder.exists():
+                os.replace(destination_folder, previous)
+            try:
+                os.replace(staging, destination_folder)
+            except OSError:
+                if previous.exists():
+                    os.replace(previous, destination_folder)
+                raise
+        finally:
+            rmtree(staging, ignore_errors=True)
+            rmtree(previous, ignore_errors=True)
+            self.unlock_package(p.hash())
         self.local_database.reload()
 
     def remove_local(self, pack):
@@ -395,6 +684,7 @@ class LocalSystem:
         Remove from local database.
         :param pack: Package's query to remove.
         """
+        self.lock_exclusive()
         self.local_database.delete(pack)
 
     def add_toolset(self, name: str, info: dict, default: bool = False):
@@ -0,0 +1,438 @@
+"""
+Scheduler of archive transfers between the local machine and remotes.
+"""
+
+import threading
+from pathlib import Path
+from shutil import rmtree
+from time import monotonic
+
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.messaging import log
+from depmanager.api.internal.streaming import Checksum, TransferCancelled
+
+# Number of downloads of an archive failing its integrity check.
+integrity_attempts = 3
+
+
+def fetch_verified(remote, dep: Dependency, destination: Path, callback=None):
+    """
+    Download the archive of a dependency and check it against the catalog.
+
+    The checksum is computed while the data is written; a corrupted archive
+    is deleted and downloaded again at once.
+    :param remote: The remote database.
+    :param dep: Dependency from the remote catalog.
+    :param destination: Destination directory.
+    :param callback: Optional function(advance: int, total: int) for progress.
+    :return: The downloaded file or None.
+    """
+    name = dep.properties.get_as_str()
+    for attempt in range(1, integrity_attempts + 1):
+        checksum = Checksum() if dep.sha256 not in ["", None] else None
+        file = remote.fetch(dep, destination, callback, checksum)
+        if file is None or dep.check_integrity(checksum):
+            return file
+        file.unlink(missing_ok=True)
+        log.warn(
+            f"WARNING: archive of {name} is corrupted ({checksum.size} bytes,"
+            f" sha256 {checksum.hexdigest()}), attempt {attempt}/{integrity_attempts}."
+        )
+    log.error(f"Archive of {name} does not match the catalog.")
+    return None
+
+
+def race_fetch(contenders: list, destination: Path, callback=None):
+    """
+    Download the same package from several mirrors at the same time and keep
+    the first archive complete and verified; the other downloads are
+    cancelled.
+    :param contenders: List of (remote, dependency from its catalog).
+    :param destination: Destination directory.
+    :param callback: Optional function(advance: int, total: int) for progress,
+        following the most advanced download.
+    :return: (file, remote, dependency) of the winner, Nones if all failed.
+    """
+    winner = []
+    lock = threading.Lock()
+    received = [0] * len(contenders)
+    reported = [0]
+
+    def run(index: int, remote, dep: Dependency):
+        lane = destination / f"race-{dep.properties.hash()}-{index}"
+
+        def lane_callback(advance: int, total: int):
+            """
+            Stop a download already beaten, report the leading one.
+            :param advance: Number of bytes just transferred.
+            :param total: Total size of the transfer, 0 if unknown.
+            """
+            if len(winner) > 0:
+                raise TransferCancelled()
+            with lock:
+                received[index] += advance
+                advance = max(received) - reported[0]
+                reported[0] += advance
+            if callback and advance > 0:
+                callback(advance, total)
+
+        try:
+            file = fetch_verified(remote, dep, lane, lane_callback)
+        except TransferCancelled:
+            file = None
+        except Exception as err:
+            log.debug(f"mirror {remote.destination}: {err}")
+            file = None
+        with lock:
+            if file is not None and len(winner) == 0:
+                destination.mkdir(parents=True, exist_ok=True)
+                target = destination / file.name
+                file.replace(target)
+                winner.append((target, remote, dep))
+        rmtree(lane, ignore_errors=True)
+
+    threads = [
+        threading.Thread(target=run, args=(index, remote, dep), daemon=True)
+        for index, (remote, dep) in enumerate(contenders)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if len(winner) == 0:
+        return None, None, None
+    log.debug(
+        f"{winner[0][2].properties.get_as_str()} downloaded from {winner[0][1].destination}."
+    )
+    return winner[0]
+
+
+class Transfer:
+    """
+    One archive to download from or upload to a remote.
+
+    The kind is ``pull`` (archive file), ``race`` (archive file from the
+    fastest of several mirrors), ``stream`` (into a sink), ``delta`` (delta
+    archive from a local base build), ``push`` or ``push_stream`` (archive
+    produced by a source while it is uploaded);
+    ``cache`` marks an archive found in the archive cache and ``folder`` a
+    tree stored uncompressed on a folder remote, both never run.
+    """
+
+    def __init__(
+        self,
+        remote,
+        dep: Dependency,
+        kind: str,
+        file: Path = None,
+        destination: Path = None,
+        size: int = 0,
+        sink=None,
+        source=None,
+        mirrors: list = None,
+        base: Path = None,
+    ):
+        self.remote = remote
+        self.dep = dep
+        self.kind = kind
+        self.file = file
+        self.destination = destination
+        self.sink = sink
+        self.source = source
+        self.mirrors = mirrors or []
+        # local folder of the build a delta applies to.
+        self.base = base
+        self.size = size
+        self.success = False
+        self.result = None
+        self.bytes = 0
+        self.duration = 0.0
+
+    def label(self):
+        """
+        Get the description of the transfer.
+        :return: A string.
+        """
+        action = ["Downloading", "Uploading"][self.kind in ["push", "push_stream"]]
+        return f"{action} {self.dep.properties.name}/{self.dep.properties.version}"
+
+    def throughput(self):
+        """
+        Get the mean transfer speed.
+        :return: Bytes per second, 0 if unknown.
+        """
+        if self.duration <= 0:
+            return 0.0
+        return self.bytes / self.duration
+
+    def run(self, callback=None):
+        """
+        Do the transfer.
+        :param callback: Optional function(advance: int, total: int) for progress.
+        """
+        start = monotonic()
+        if self.kind == "pull":
+            self.result = fetch_verified(
+                self.remote, self.dep, self.destination, callback
+            )
+            self.success = self.result is not None
+        elif self.kind == "race":
+            contenders = [(self.remote, self.dep)] + self.mirrors
+            file, remote, dep = race_fetch(contenders, self.destination, callback)
+            if file is not None:
+                # the statistics go to the mirror that won.
+                self.remote, self.dep = remote, dep
+            self.result = file
+            self.success = file is not None
+        elif self.kind == "delta":
+            self.result = self.remote.fetch_delta(self.dep, self.destination, callback)
+            self.success = self.result is not None
+        elif self.kind == "stream":
+            checksum = None
+            writer = self.sink
+            if self.dep.sha256 not in ["", None]:
+                checksum = Checksum()
+                writer = checksum.tee(self.sink)
+            self.sink.start()
+            success = False
+            try:
+                success = bool(self.remote.stream(self.dep, writer, callback))
+                if success and not self.dep.check_integrity(checksum):
+                    log.warn(
+                        f"WARNING: streamed archive of"
+                        f" {self.dep.properties.get_as_str()} is corrupted."
+                    )
+                    success = False
+            finally:
+                self.success = self.sink.finish(success)
+            self.result = self.sink if self.success else None
+        elif self.kind == "push_stream":
+            self.source.start()
+            success = False
+            try:
+                success = bool(self.remote.send_stream(self.dep, self.source, callback))
+            finally:
+                self.success = self.source.finish(success)
+            if self.success:
+                self.bytes = self.source.checksum.size
+            self.result = self.source if self.success else None
+        else:
+            self.success = bool(self.remote.send_package(self.dep, self.file, callback))
+            self.result = self.file if self.success else None
+        self.duration = monotonic() - start
+        if self.success and self.bytes == 0 and isinstance(self.result, Path):
+            self.bytes = self.result.stat().st_size
+
+
+class TransferManager:
+    """
+    Run queued transfers with one aggregated progress display.
+
+    Transfers are started largest first. Each remote runs at most
+    ``max_transfers`` of them at the same time, different remotes run in
+    parallel. Bytes, duration and throughput are recorded per transfer.
+    """
+
+    def __init__(self, show_progress: bool = True):
+        self.show_progress = show_progress
+        self.queue = []
+        self.done = []
+        self.__lock = threading.Lock()
+        self.__total = 0
+
+    def add_pull(self, remote, dep: Dependency, destination: Path):
+        """
+        Queue the download of a package archive.
+        :param remote: The remote database.
+        :param dep: Dependency from the remote catalog.
+        :param destination: Destination directory.
+        :return: The transfer.
+        """
+        transfer = Transfer(
+            remote, dep, "pull", destination=destination, size=remote.archive_size(dep)
+        )
+        self.queue.append(transfer)
+        return transfer
+
+    def add_race(self, remote, dep: Dependency, destination: Path, mirrors: list):
+        """
+        Queue the download of a package archive from several mirrors at once.
+        :param remote: The remote database.
+        :param dep: Dependency from the remote catalog.
+        :param destination: Destination directory.
+        :param mirrors: List of (remote, dependency from its catalog) holding
+            the same package.
+        :return: The transfer.
+        """
+        transfer = Transfer(
+            remote,
+            dep,
+            "race",
+            destination=destination,
+            size=remote.archive_size(dep),
+            mirrors=mirrors,
+        )
+        self.queue.append(transfer)
+        return transfer
+
+    def add_stream(self, remote, dep: Dependency, sink):
+        """
+        Queue the download of a package archive into a sink, without storing it.
+        :param remote: The remote database, with streaming support.
+        :param dep: Dependency from the remote catalog.
+        :param sink: Object with ``start``, ``write`` and ``finish`` methods.
+        :return: The transfer.
+        """
+        transfer = Transfer(
+            remote, dep, "stream", size=remote.archive_size(dep), sink=sink
+        )
+        self.queue.append(transfer)
+        return transfer
+
+    def add_delta(self, remote, dep: Dependency, destination: Path, base: Path):
+        """
+        Queue the download of the delta archive of a package.
+        :param remote: The remote database, with ``deltas``.
+        :param dep: Dependency from the remote catalog, with a ``delta_base``.
+        :param destination: Destination directory.
+        :param base: Local folder of the base build.
+        :return: The transfer.
+        """
+        transfer = Transfer(remote, dep, "delta", destination=destination, base=base)
+        self.queue.append(transfer)
+        return transfer
+
+    def add_push(self, remote, dep: Dependency, file: Path):
+        """
+        Queue the upload of a package archive.
+        :param remote: The remote database.
+        :param dep: Dependency's description.
+        :param file: The archive to send.
+        :return: The transfer.
+        """
+        transfer = Transfer(remote, dep, "push", file=file, size=file.stat().st_size)
+        self.queue.append(transfer)
+        return transfer
+
+    def add_push_stream(self, remote, dep: Dependency, source):
+        """
+        Queue the upload of a package archive produced while it is sent.
+        :param remote: The remote database, with ``streaming_push`` support.
+        :param dep: Dependency's description.
+        :param source: Object with ``start``, ``read``, ``finish`` methods and
+            a ``checksum`` attribute.
+        :return: The transfer.
+        """
+        transfer = Transfer(remote, dep, "push_stream", source=source)
+        self.queue.append(transfer)
+        return transfer
+
+    def run(self):
+        """
+        Run all the queued transfers.
+        :return: The transfers that have been run.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from rich.progress import (
+            Progress,
+            SpinnerColumn,
+            TextColumn,
+            BarColumn,
+            DownloadColumn,
+            TransferSpeedColumn,
+        )
+
+        queue, self.queue = self.queue, []
+        if len(queue) == 0:
+            return []
+        groups = {}
+        for transfer in sorted(queue, key=lambda item: item.size, reverse=True):
+            groups.setdefault(id(transfer.remote), []).append(transfer)
+        self.__total = sum(transfer.size for transfer in queue)
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            disable=not self.show_progress,
+        ) as progress:
+            overall = progress.add_task(
+                f"Transferring {len(queue)} archives", total=self.__total or None
+            )
+            executors = []
+            for group in groups.values():
+                workers = max(1, min(group[0].remote.max_transfers, len(group)))
+                executor = ThreadPoolExecutor(max_workers=workers)
+                for transfer in group:
+                    executor.submit(self.__execute, transfer, progress, overall)
+                executors.append(executor)
+            for executor in executors:
+                executor.shutdown(wait=True)
+        self.done += queue
+        return queue
+
+    def __execute(self, transfer: Transfer, progress, overall):
+        if not transfer.remote.valid_shape:
+            return
+        task = progress.add_task(transfer.label(), total=transfer.size or None)
+        expected = [transfer.size]
+
+        def callback(advance: int, total: int):
+            """
+            Forward the advance of one transfer to the progress display.
+            :param advance: Number of bytes just transferred.
+            :param total: Total size of the transfer, 0 if unknown.
+            """
+            with self.__lock:
+                transfer.bytes += advance
+                if total > 0 and total != expected[0]:
+                    self.__total += total - expected[0]
+                    expected[0] = total
+                overall_total = self.__total
+            progress.update(task, advance=advance, total=total or None)
+            progress.update(overall, advance=advance, total=overall_total or None)
+
+        try:
+            transfer.run(callback)
+        except Exception as err:
+            log.error(f"{transfer.label()}: {err}")
+            transfer.success = False
+        progress.remove_task(task)
+
+    def stats(self):
+        """
+        Get the statistics of the finished transfers.
+        :return: List of dictionaries.
+        """
+        return [
+            {
+                "name": transfer.dep.properties.get_as_str(),
+                "kind": transfer.kind,
+                "success": transfer.success,
+                "bytes": transfer.bytes,
+                "duration": transfer.duration,
+                "throughput": transfer.throughput(),
+            }
+            for transfer in self.done
+        ]
+
+    def report(self):
+        """
+        Log the statistics of the finished transfers: one debug line per
+        transfer and a summary.
+        """
+        total_bytes = 0
+        failures = 0
+        for stat in self.stats():
+            total_bytes += stat["bytes"]
+            failures += not stat["success"]
+            state = ["FAILED", "done"][stat["success"]]
+            log.debug(
+                f"{stat['kind']} {stat['name']}: {state}, {stat['bytes']} bytes"
+                f" in {stat['duration']:.2f} s ({stat['throughput'] / 1024 ** 2:.1f} MiB/s)."
+            )
+        if len(self.done) > 0:
+            log.info(
+                f"{len(self.done)} transfers ({failures} failed), {total_bytes} bytes."
+            )
@@ -168,7 +168,8 @@ def load_environment(
 
     # get list of packages
     log.debug(f"**getting {len(unique_queries)} packages...")
-    packages = []
+    found = []
+    to_pull = {}
     for q in unique_queries:
         log.info(f"getting package {q['name']}...")
         result = pacman.query(q | {"transitive": True})
@@ -178,13 +179,26 @@ def load_environment(
             continue
         if result[0].source != "local":
             log.debug(f"V Adding package {q['name']} from remote...")
-            pacman.add_from_remote(result[0], result[0].source)
+            to_pull.setdefault(result[0].source, []).append(result[0])
+        found.append((q, result[0]))
+    if len(to_pull) > 0:
+        # download all the remote packages together.
+        pacman.install_plans(
+            {
+                remote_name: pacman.plan_from_remote(deps, remote_name)
+                for remote_name, deps in to_pull.items()
+            }
+        )
+    packages = []
+    for q, package in found:
+        if package.source != "local":
             result = pacman.query(q)
             if len(result) == 0:
                 log.error(f"X Could not find package {q['name']} after addition.")
                 err_code = 1
                 continue
-        packages.append(result[0])
+            package = result[0]
+        packages.append(package)
 
     # create list of dir
     cmake_dirs = [
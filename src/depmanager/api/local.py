@@ -12,13 +12,19 @@ class LocalManager:
 
     version = "0.5.5"
 
-    def __init__(self, system=None):
+    def __init__(self, system=None, shared: bool = False):
+        """
+        Create the local manager.
+        :param system: The local system, created if None.
+        :param shared: For a new system, share the lock of the data with the
+            other readers.
+        """
         from depmanager.api.internal.system import LocalSystem
 
         if type(system) is LocalSystem:
             self.__sys = system
         else:
-            self.__sys = LocalSystem()
+            self.__sys = LocalSystem(shared)
         self.root_path = Path(__file__).resolve().parent.parent
 
     def get_sys(self):
@@ -53,5 +59,8 @@ class LocalManager:
         """
         Clean the Temp Folder.
         """
+        if self.__sys.released:
+            # the lock was released early: another process may use the folder.
+            return
         self.__sys.clear_tmp()
         self.__sys.release()
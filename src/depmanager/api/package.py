@@ -5,18 +5,32 @@ Manager for package.
 from pathlib import Path
 from shutil import rmtree
 
-from rich.progress import (
-    Progress,
-    SpinnerColumn,
-    TextColumn,
-    BarColumn,
-    DownloadColumn,
-    TransferSpeedColumn,
-)
-
 from depmanager.api.internal.messaging import log
 
 
+def transfer_progress():
+    """
+    Create the progress bar of an extraction or a compression.
+    :return: The rich progress, imported on first use.
+    """
+    from rich.progress import (
+        Progress,
+        SpinnerColumn,
+        TextColumn,
+        BarColumn,
+        DownloadColumn,
+        TransferSpeedColumn,
+    )
+
+    return Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+    )
+
+
 def get_folder_size(folder_path: Path) -> int:
     """
     Calculate total size of all files in a folder recursively.
@@ -116,10 +130,11 @@ class PackageManager:
             return args.name
         return ""
 
-    def add_from_location(self, source: Path):
+    def add_from_location(self, source: Path, link: bool = False):
         """
         Add a package to the local database
         :param source: Path to the package source
+        :param link: For a folder, hard link its files instead of copying them.
         :return:
         """
         if not source.exists():
@@ -129,74 +144,60 @@ class PackageManager:
             if not (source / "edp.info").exists():
                 log.warn(f"WARNING: Location {source} does not contains edp.info file.")
                 return
-            self.__sys.import_folder(source)
+            self.__sys.import_folder(source, link)
             return
         elif source.is_file():
             suffixes = []
             if len(source.suffixes) > 0:
                 suffixes = [source.suffixes[-1]]
-                if suffixes == [".gz"] and len(source.suffixes) > 1:
+                if suffixes in [[".gz"], [".zst"]] and len(source.suffixes) > 1:
                     suffixes = [source.suffixes[-2], source.suffixes[-1]]
             destination_dir = self.__sys.temp_path / "pack"
             if destination_dir.exists():
                 rmtree(destination_dir, ignore_errors=True)
             destination_dir.mkdir(parents=True)
-            if suffixes == ["zip"]:
-                from zipfile import ZipFile
-
-                log.debug(
-                    f"PackageManager::add_from_location - Extract ZIP from {source} to {destination_dir}"
+            if suffixes == [".zip"]:
+                kind = "ZIP"
+            elif suffixes in [[".tgz"], [".tar", ".gz"], [".tzst"], [".tar", ".zst"]]:
+                kind = "TGZ"
+            else:
+                kind = None
+            if kind is not None:
+                from depmanager.api.internal.extraction import (
+                    extract_tar_file,
+                    extract_zip,
                 )
-                with ZipFile(source) as archive:
-                    members = archive.infolist()
-                    total = sum(m.file_size for m in members)
-                    with Progress(
-                        SpinnerColumn(),
-                        TextColumn("[progress.description]{task.description}"),
-                        BarColumn(),
-                        DownloadColumn(),
-                        TransferSpeedColumn(),
-                    ) as progress:
-                        task = progress.add_task("Extracting ZIP...", total=total)
-                        for member in members:
-                            archive.extract(member, destination_dir)
-                            progress.update(task, advance=member.file_size)
-            elif suffixes in [[".tgz"], [".tar", ".gz"]]:
-                import tarfile
 
                 log.debug(
-                    f"PackageManager::add_from_location - Extract TGZ from {source} to {destination_dir}"
+                    f"PackageManager::add_from_location - Extract {kind} from {source} to {destination_dir}"
                 )
                 try:
-                    with tarfile.open(str(source), "r:gz") as archive:
-                        members = archive.getmembers()
-                        total = sum(m.size for m in members if m.isfile())
-                        with Progress(
-                            SpinnerColumn(),
-                            TextColumn("[progress.description]{task.description}"),
-                            BarColumn(),
-                            DownloadColumn(),
-                            TransferSpeedColumn(),
-                        ) as progress:
-                            task = progress.add_task("Extracting TGZ...", total=total)
-                            for member in members:
-                                archive.extract(member, destination_dir)
-                                if member.isfile():
-                                    progress.update(task, advance=member.size)
+                    with transfer_progress() as progress:
+                        task = progress.add_task(f"Extracting {kind}...", total=None)
+
+                        def advance(size: int, total: int):
+                            progress.update(task, advance=size, total=total)
+
+                        if kind == "ZIP":
+                            extract_zip(source, destination_dir, advance)
+                        else:
+                            # gzip or zstd, whatever the suffix.
+                            extract_tar_file(source, destination_dir, advance)
                 except Exception as e:
                     log.warn(f"WARNING: Error extracting {source}: {e}")
-                    self.__sys.clear_tmp()
+                    rmtree(destination_dir, ignore_errors=True)
                     return
             else:
                 log.warn(f"WARNING: File {source} has unsupported format.")
-                self.__sys.clear_tmp()
+                rmtree(destination_dir, ignore_errors=True)
                 return
             if destination_dir is not None:
                 if not (destination_dir / "edp.info").exists():
                     log.warn(f"WARNING: Archive does not contains package info.")
-                    self.__sys.clear_tmp()
+                    rmtree(destination_dir, ignore_errors=True)
                     return
                 self.__sys.import_folder(destination_dir)
+                rmtree(destination_dir, ignore_errors=True)
 
     def remove_package(self, pack, remote_name: str = ""):
         """
@@ -221,49 +222,336 @@ class PackageManager:
         :param dep: The dependency to get.
         :param remote_name: The remote server to use.
         """
+        self.add_list_from_remote([dep], remote_name)
+
+    def add_list_from_remote(self, deps, remote_name):
+        """
+        Get packages and their missing dependencies from remote to local.
+
+        :param deps: The dependencies to get.
+        :param remote_name: The remote server to use.
+        :return: List of installed dependencies.
+        """
+        plan = self.plan_from_remote(deps, remote_name)
+        if len(plan) == 0:
+            return []
+        return self.install_plan(plan, remote_name)
+
+    def plan_from_remote(self, deps, remote_name):
+        """
+        Compute the install plan of packages from the remote catalog.
+
+        The transitive closure of the requested packages is resolved up front,
+        without downloading anything. Packages already present locally are
+        skipped and each package appears once, identified by its hash.
+
+        :param deps: The dependencies to get.
+        :param remote_name: The remote server to use.
+        :return: List of remote dependencies to install, dependencies first.
+        """
         if remote_name == "default":
             remote_name = self.__sys.default_remote
         if remote_name not in self.__sys.remote_database:
             log.error(f"no remote named {remote_name} found.")
-            return
+            return []
         remote = self.__sys.remote_database[remote_name]
-        finds = remote.query(dep)
-        if len(finds) > 1:
-            log.warn("WARNING: more than 1 package matches the request:")
-            for find in finds:
-                log.warn(f"         {find.properties.get_as_str()}")
-            log.warn(
-                "         Precise your request, only one package per pull allowed."
-            )
-            return
-        if len(finds) == 0:
-            log.error("no package matches the request.")
-            return
-        depp = finds[0]
-        res = remote.pull(dep, self.__sys.temp_path)
-        if res is None:
-            file = self.__sys.temp_path / f"{dep.properties.hash()}.tgz"
-        else:
-            file = self.__sys.temp_path / f"{res}"
-        self.add_from_location(file)
-        if depp.has_dependency():
-            log.info("Package has dependencies, trying to get them...")
-            for sub_dep in depp.get_dependency_list():
-                if len(self.query(sub_dep)) == 0:
-                    log.info(
-                        f" Getting dependency {sub_dep['name']}/{sub_dep['version']}..."
-                    )
+        plan = []
+        seen = set()
+
+        def collect(depp):
+            key = depp.properties.hash()
+            if key in seen:
+                return
+            seen.add(key)
+            if depp.has_dependency():
+                log.info("Package has dependencies, trying to get them...")
+                for sub_dep in depp.get_dependency_list():
+                    if len(self.query(sub_dep)) != 0:
+                        log.info(
+                            f" Dependency {sub_dep['name']}/{sub_dep['version']} already present locally."
+                        )
+                        continue
                     sub_matches = remote.query(sub_dep)
                     if len(sub_matches) == 0:
                         log.error(
                             f"Cannot find dependency {sub_dep['name']}/{sub_dep['version']} on remote {remote_name}."
                         )
                         continue
-                    self.add_from_remote(sub_matches[0], remote_name)
-                else:
                     log.info(
-                        f" Dependency {sub_dep['name']}/{sub_dep['version']} already present locally."
+                        f" Getting dependency {sub_dep['name']}/{sub_dep['version']}..."
+                    )
+                    collect(sub_matches[0])
+            plan.append(depp)
+
+        for dep in deps:
+            finds = remote.query(dep)
+            if len(finds) > 1:
+                log.warn("WARNING: more than 1 package matches the request:")
+                for find in finds:
+                    log.warn(f"         {find.properties.get_as_str()}")
+                log.warn(
+                    "         Precise your request, only one package per pull allowed."
+                )
+                continue
+            if len(finds) == 0:
+                log.error("no package matches the request.")
+                continue
+            collect(finds[0])
+        return plan
+
+    def find_mirrors(self, dep, remote):
+        """
+        Find the other remotes holding the same build of a package.
+
+        :param dep: Dependency from the catalog of the remote.
+        :param remote: The remote database.
+        :return: List of (remote, dependency from its catalog), fastest first.
+        """
+        mirrors = []
+        for name in self.__sys.get_source_list()[1:]:
+            other = self.__sys.remote_database[name]
+            if other is remote or other.breaker.is_open():
+                continue
+            for match in other.query(dep):
+                if (
+                    match.properties.hash() == dep.properties.hash()
+                    and match.properties.build_date == dep.properties.build_date
+                ):
+                    mirrors.append((other, match))
+                    break
+        return mirrors
+
+    def find_delta_base(self, dep):
+        """
+        Find the local build of a package the delta of the remote applies to.
+
+        :param dep: Dependency from the remote catalog.
+        :return: Folder of the local build, None if not present.
+        """
+        from depmanager.api.internal.dependency import Props
+        from depmanager.api.internal.reproducible import tree_hash
+
+        if dep.delta_base in ["", None]:
+            return None
+        query = Props(dep.properties.to_dict(), query=True)
+        query.build_date = "*"
+        for local in self.__sys.local_database.query(query):
+            folder = Path(local.get_path())
+            if folder.is_dir() and tree_hash(folder) == dep.delta_base:
+                return folder
+        return None
+
+    def apply_delta(self, transfer):
+        """
+        Build a package from its local base build and a downloaded delta.
+
+        :param transfer: The delta transfer; on success, its result becomes
+            the folder of the new build.
+        :return: True if success.
+        """
+        from depmanager.api.internal.delta import apply_delta
+
+        dep = transfer.dep
+        staging = self.__sys.temp_path / f"delta-{dep.properties.hash()}"
+        content = apply_delta(transfer.base, dep.delta_base, transfer.result, staging)
+        transfer.result.unlink(missing_ok=True)
+        if content is None or content != dep.content:
+            rmtree(staging, ignore_errors=True)
+            return False
+        transfer.result = staging
+        return True
+
+    def install_plan(self, plan, remote_name):
+        """
+        Download then install the packages of a plan.
+
+        :param plan: List of remote dependencies, as given by plan_from_remote.
+        :param remote_name: The remote server to use.
+        :return: List of installed dependencies.
+        """
+        return self.install_plans({remote_name: plan})
+
+    def install_plans(self, plans: dict):
+        """
+        Download the packages of several plans together, then install them.
+
+        All the archives go through one TransferManager: the remotes are used
+        in parallel, each within its own concurrency limit. When the remote
+        supports it, archives are extracted while they are downloaded; a
+        failed streaming falls back to downloading the archive file. With an
+        archive cache, cached archives are not downloaded and the downloaded
+        ones are stored in the cache. Packages stored uncompressed on a folder
+        remote are hard-linked into the local database. With ``race_mirrors``,
+        an archive also held by another remote is downloaded from both, the
+        first complete one being kept.
+
+        :param plans: Dictionary remote name -> plan, as given by plan_from_remote.
+        :return: List of installed dependencies.
+        """
+        from depmanager.api.internal.streaming import StreamExtractor
+        from depmanager.api.internal.transfer import Transfer, TransferManager
+
+        cache = self.__sys.archive_cache
+        manager = TransferManager()
+        transfers = []
+        seen = set()
+        # packages locked by this call, and installed by other processes.
+        locked = []
+        busy = []
+        try:
+            for remote_name, plan in plans.items():
+                if remote_name == "default":
+                    remote_name = self.__sys.default_remote
+                if remote_name not in self.__sys.remote_database:
+                    log.error(f"no remote named {remote_name} found.")
+                    continue
+                remote = self.__sys.remote_database[remote_name]
+                for depp in plan:
+                    if depp.properties.hash() in seen:
+                        continue
+                    seen.add(depp.properties.hash())
+                    if not self.__sys.lock_package(
+                        depp.properties.hash(), blocking=False
+                    ):
+                        busy.append((remote_name, depp))
+                        continue
+                    locked.append(depp.properties.hash())
+                    folder = remote.package_folder(depp)
+                    if folder is not None:
+                        local = Transfer(remote, depp, "folder")
+                        local.success = True
+                        local.result = folder
+                        transfers.append(local)
+                        continue
+                    if cache is not None:
+                        file = cache.get(depp, self.__sys.temp_path)
+                        if file is not None:
+                            hit = Transfer(remote, depp, "cache")
+                            hit.success = True
+                            hit.result = file
+                            transfers.append(hit)
+                            continue
+                    if remote.deltas:
+                        base = self.find_delta_base(depp)
+                        if base is not None:
+                            transfers.append(
+                                manager.add_delta(
+                                    remote, depp, self.__sys.temp_path, base
+                                )
+                            )
+                            continue
+                    mirrors = []
+                    if self.__sys.race_mirrors:
+                        mirrors = self.find_mirrors(depp, remote)[:1]
+                    if len(mirrors) > 0:
+                        transfers.append(
+                            manager.add_race(
+                                remote, depp, self.__sys.temp_path, mirrors
+                            )
+                        )
+                    elif cache is not None:
+                        # keep the archive file to store it in the cache.
+                        transfers.append(
+                            manager.add_pull(remote, depp, self.__sys.temp_path)
+                        )
+                    elif self.__sys.stream_install and remote.streaming:
+                        staging = (
+                            self.__sys.temp_path / f"stream-{depp.properties.hash()}"
+                        )
+                        rmtree(staging, ignore_errors=True)
+                        transfer = manager.add_stream(
+                            remote, depp, StreamExtractor(staging)
+                        )
+                        transfers.append(transfer)
+                    else:
+                        transfers.append(
+                            manager.add_pull(remote, depp, self.__sys.temp_path)
+                        )
+            manager.run()
+            for i, transfer in enumerate(transfers):
+                if transfer.kind == "delta":
+                    if transfer.success and self.apply_delta(transfer):
+                        continue
+                    log.warn(
+                        f"Delta of {transfer.dep.properties.get_as_str()} not applied,"
+                        f" downloading the archive."
                     )
+                    transfers[i] = manager.add_pull(
+                        transfer.remote, transfer.dep, self.__sys.temp_path
+                    )
+                    continue
+                if transfer.kind != "stream" or transfer.success:
+                    continue
+                rmtree(transfer.sink.destination, ignore_errors=True)
+                if not transfer.remote.valid_shape:
+                    continue
+                log.warn(
+                    f"Streaming of {transfer.dep.properties.get_as_str()} failed,"
+                    f" downloading the archive."
+                )
+                transfers[i] = manager.add_pull(
+                    transfer.remote, transfer.dep, self.__sys.temp_path
+                )
+            manager.run()
+            manager.report()
+            self.__sys.record_transfers(transfers)
+            installed = []
+            for transfer in transfers:
+                if not transfer.success:
+                    log.error(f"Cannot pull {transfer.dep.properties.get_as_str()}.")
+                    continue
+                if transfer.kind == "folder":
+                    self.add_from_location(transfer.result, link=True)
+                elif transfer.kind == "delta":
+                    self.add_from_location(transfer.result, link=True)
+                    rmtree(transfer.result, ignore_errors=True)
+                elif transfer.kind == "stream":
+                    self.add_from_location(transfer.sink.destination)
+                    rmtree(transfer.sink.destination, ignore_errors=True)
+                else:
+                    if cache is not None and transfer.kind in ["pull", "race"]:
+                        cache.put(transfer.dep, transfer.result)
+                    self.add_from_location(transfer.result)
+                    transfer.result.unlink(missing_ok=True)
+                installed.append(transfer.dep)
+        finally:
+            for key in locked:
+                self.__sys.unlock_package(key)
+        # wait for the other processes, then install what they did not.
+        for remote_name, depp in busy:
+            log.info(
+                f"Package {depp.properties.get_as_str()}: installed by another process, waiting."
+            )
+            self.__sys.lock_package(depp.properties.hash())
+            try:
+                self.__sys.local_database.reload()
+                if self.is_installed(depp):
+                    installed.append(depp)
+                else:
+                    installed += self.install_plans({remote_name: [depp]})
+            finally:
+                self.__sys.unlock_package(depp.properties.hash())
+        return installed
+
+    def is_installed(self, dep):
+        """
+        Check if a build of a package, at least as recent as a remote one, is
+        in the local database.
+
+        :param dep: Dependency from the remote catalog.
+        :return: True if installed.
+        """
+        from depmanager.api.internal.dependency import Props
+
+        query = Props(dep.properties.to_dict(), query=True)
+        query.build_date = "*"
+        for local in self.__sys.local_database.query(query):
+            if (
+                local.properties.hash() == dep.properties.hash()
+                and local.properties.build_date >= dep.properties.build_date
+            ):
+                return True
+        return False
 
     def add_to_remote(self, dep, remote_name):
         """
@@ -272,28 +560,22 @@ class PackageManager:
         :param dep: The dependency to send.
         :param remote_name: The remote server to use.
         """
-        if remote_name == "default":
-            remote_name = self.__sys.default_remote
-        if remote_name not in self.__sys.remote_database:
-            log.error(f"no remote named {remote_name} found.")
-            return
-        log.info(f"Using remote named {remote_name}.")
-        remote = self.__sys.remote_database[remote_name]
-        finds = self.__sys.local_database.query(dep)
-        if len(finds) > 1:
-            log.warn("WARNING: more than 1 package matches the request:")
-            for find in finds:
-                log.warn(f"         {find.properties.get_as_str()}")
-            log.warn(
-                "         Precise your request, only one package per push allowed."
-            )
-            return
-        if len(finds) == 0:
-            log.error("no package matches the request.")
-            return
-        depp = finds[0]
+        self.add_list_to_remote([dep], remote_name)
+
+    def pack_for_push(self, depp, compression=None):
+        """
+        Compress a local package in the temp folder.
 
-        dep_path = self.__sys.temp_path / (Path(depp.get_path()).name + ".tgz")
+        :param depp: The local dependency to compress.
+        :param compression: The compression negotiated with the remote.
+        :return: Path to the archive or None.
+        """
+        if compression is None:
+            compression = self.__sys.compression.with_format("gzip")
+        archive_format = ["tgz", "tzst"][compression.format == "zstd"]
+        dep_path = self.__sys.temp_path / (
+            Path(depp.get_path()).name + compression.suffix
+        )
         log.info(f"Compressing library to file {dep_path}.")
 
         try:
@@ -301,13 +583,7 @@ class PackageManager:
             total_size = get_folder_size(folder_path)
 
             if total_size > 0:
-                with Progress(
-                    SpinnerColumn(),
-                    TextColumn("[progress.description]{task.description}"),
-                    BarColumn(),
-                    DownloadColumn(),
-                    TransferSpeedColumn(),
-                ) as progress:
+                with transfer_progress() as progress:
                     task = progress.add_task("Compressing...", total=total_size)
 
                     def progress_callback(bytes_processed: int) -> None:
@@ -321,40 +597,175 @@ class PackageManager:
                     self.__sys.local_database.pack(
                         depp,
                         self.__sys.temp_path,
-                        "tgz",
+                        archive_format,
                         progress_callback=progress_callback,
+                        compression=compression,
                     )
             else:
                 # Fallback without progress bar
-                self.__sys.local_database.pack(depp, self.__sys.temp_path, "tgz")
+                self.__sys.local_database.pack(
+                    depp, self.__sys.temp_path, archive_format, compression=compression
+                )
 
         except TypeError:
             # pack() doesn't support progress_callback parameter
             log.debug(
                 "Pack method doesn't support progress callback, using without progress bar"
             )
-            self.__sys.local_database.pack(depp, self.__sys.temp_path, "tgz")
+            self.__sys.local_database.pack(depp, self.__sys.temp_path, archive_format)
         except Exception as e:
             log.error(f"Compression failed: {e}")
-            return
+            return None
+        return dep_path
 
-        log.info(f"Starting upload.")
-        remote.push(depp, dep_path)
-        if depp.has_dependency():
-            log.info("Package has dependencies, trying to push them...")
-            for sub_dep in depp.get_dependency_list():
-                if len(remote.query(sub_dep)) == 0:
-                    log.info(
-                        f" Pushing dependency {sub_dep['name']}/{sub_dep['version']}..."
+    def collect_push_list(self, deps, remote):
+        """
+        Resolve packages to push and their dependencies missing on the remote.
+
+        :param deps: The dependencies to send.
+        :param remote: The remote database.
+        :return: List of local dependencies to push, dependencies first.
+        """
+        to_push = []
+        seen = set()
+
+        def collect(dep, is_sub: bool):
+            finds = self.__sys.local_database.query(dep)
+            if len(finds) > 1:
+                log.warn("WARNING: more than 1 package matches the request:")
+                for find in finds:
+                    log.warn(f"         {find.properties.get_as_str()}")
+                log.warn(
+                    "         Precise your request, only one package per push allowed."
+                )
+                return
+            if len(finds) == 0:
+                if is_sub:
+                    log.error(
+                        f"Cannot find dependency {dep['name']}/{dep['version']} in local database."
                     )
-                    sub_matches = self.__sys.local_database.query(sub_dep)
-                    if len(sub_matches) == 0:
-                        log.error(
-                            f"Cannot find dependency {sub_dep['name']}/{sub_dep['version']} in local database."
-                        )
-                        continue
-                    self.add_to_remote(sub_matches[0], remote_name)
                 else:
-                    log.info(
-                        f" Dependency {sub_dep['name']}/{sub_dep['version']} already present on remote."
-                    )
+                    log.error("no package matches the request.")
+                return
+            depp = finds[0]
+            key = (depp.properties.hash(), depp.properties.build_date)
+            if key in seen:
+                return
+            seen.add(key)
+            if depp.has_dependency():
+                log.info("Package has dependencies, trying to push them...")
+                for sub_dep in depp.get_dependency_list():
+                    if len(remote.query(sub_dep)) == 0:
+                        log.info(
+                            f" Pushing dependency {sub_dep['name']}/{sub_dep['version']}..."
+                        )
+                        collect(sub_dep, True)
+                    else:
+                        log.info(
+                            f" Dependency {sub_dep['name']}/{sub_dep['version']} already present on remote."
+                        )
+            to_push.append(depp)
+
+        for item in deps:
+            collect(item, False)
+        return to_push
+
+    def add_list_to_remote(self, deps, remote_name, force: bool = False):
+        """
+        Send packages from local to remote, committing the remote catalog once.
+
+        :param deps: The dependencies to send.
+        :param remote_name: The remote server to use.
+        :param force: If true re-upload packages that already exist.
+        :return: List of pushed dependencies.
+        """
+        if remote_name == "default":
+            remote_name = self.__sys.default_remote
+        if remote_name not in self.__sys.remote_database:
+            log.error(f"no remote named {remote_name} found.")
+            return []
+        from depmanager.api.internal.reproducible import (
+            content_hash,
+            tree_hash,
+            tree_manifest,
+        )
+
+        log.info(f"Using remote named {remote_name}.")
+        remote = self.__sys.remote_database[remote_name]
+        # the archives are compressed while they are uploaded, if possible.
+        stream = self.__sys.stream_push and remote.streaming_push
+        items = []
+        deltas = {}
+        for depp in self.collect_push_list(deps, remote):
+            manifest = None
+            if remote.deltas:
+                manifest = tree_manifest(Path(depp.get_path()))
+                depp.content = content_hash(manifest)
+            elif depp.content in ["", None]:
+                depp.content = tree_hash(Path(depp.get_path()))
+            if not force and remote.holds(depp):
+                # nothing to compress nor to upload.
+                log.info(
+                    f"Package {depp.properties.get_as_str()}: identical content already on remote."
+                )
+                continue
+            if manifest is not None:
+                deltas[depp.properties.hash()] = self.prepare_delta(
+                    depp, remote, manifest
+                )
+            if stream:
+                items.append((depp, Path(depp.get_path())))
+                continue
+            archive = self.pack_for_push(depp, remote.push_compression())
+            if archive is not None:
+                items.append((depp, archive))
+        if len(items) == 0:
+            return []
+        log.info(f"Starting upload.")
+        pushed = remote.push_batch(items, force)
+        if not stream:
+            for _, archive in items:
+                archive.unlink(missing_ok=True)
+        for dep in pushed:
+            if dep.properties.hash() in deltas:
+                remote.send_delta(dep, *deltas[dep.properties.hash()])
+        for file_list, delta in deltas.values():
+            file_list.unlink(missing_ok=True)
+            if delta is not None:
+                delta.unlink(missing_ok=True)
+        return pushed
+
+    def prepare_delta(self, depp, remote, manifest: dict):
+        """
+        Write the file list of a package to push and, if the remote keeps the
+        file list of a previous build, the delta from this build. The
+        ``delta_base`` of the package is set when a delta is written.
+
+        :param depp: The local dependency.
+        :param remote: The remote database, with ``deltas``.
+        :param manifest: The manifest of the package.
+        :return: (file list, delta archive or None).
+        """
+        from depmanager.api.internal.delta import make_delta, write_file_list
+        from depmanager.api.internal.reproducible import package_mtime
+
+        temp = self.__sys.temp_path
+        depp.delta_base = ""
+        base = remote.fetch_file_list(depp, temp)
+        delta = None
+        if base is not None and base[0] != depp.content:
+            delta = temp / f"{depp.properties.hash()}.delta.tgz"
+            if make_delta(
+                Path(depp.get_path()),
+                manifest,
+                base,
+                delta,
+                package_mtime(depp),
+                remote.push_compression(),
+            ):
+                depp.delta_base = base[0]
+            else:
+                delta = None
+        file_list = temp / f"{depp.properties.hash()}.files"
+        write_file_list(manifest, file_list)
+        return file_list, delta
@@ -2,6 +2,8 @@
 Instance of remotes manager.
 """
 
+from pathlib import Path
+
 from depmanager.api.internal.dependency import Props
 from depmanager.api.internal.messaging import log
 
@@ -135,6 +137,21 @@ class RemotesManager:
         """
         self.__sys.del_remote(name)
 
+    @staticmethod
+    def holds_content(remote_db, dep):
+        """
+        Check if a remote already stores the files of a local package, under
+        another build date: re-pushing it would change nothing.
+        :param remote_db: The remote.
+        :param dep: The local package.
+        :return: True if the remote holds the same content.
+        """
+        from depmanager.api.internal.reproducible import tree_hash
+
+        if dep.content in ["", None]:
+            dep.content = tree_hash(Path(dep.get_path()))
+        return remote_db.holds(dep)
+
     def sync_remote(
         self,
         name: str,
@@ -167,6 +184,7 @@ class RemotesManager:
             exit(-666)
         all_local = local_db.query()
         log.info(f"Syncing with server: {remote_db_name}")
+        to_push = []
 
         # Compare local and remote
         for single_local in all_local:
@@ -254,6 +272,11 @@ class RemotesManager:
                                         pkg_mgr.add_from_remote(
                                             filtered_list[0], remote_db_name
                                         )
+                                elif self.holds_content(remote_db, single_local):
+                                    log.info(
+                                        f" ---- Same content on server, not pushing."
+                                    )
+                                    is_up_to_date = True
                                 else:
                                     log.debug(
                                         f"suppress [{remote_db_name}] {filtered_list[0].properties.get_as_str()}"
@@ -269,9 +292,7 @@ class RemotesManager:
                                         pkg_mgr.remove_package(
                                             filtered_list[0], remote_db_name
                                         )
-                                        pkg_mgr.add_to_remote(
-                                            single_local, remote_db_name
-                                        )
+                                        to_push.append(single_local)
                             else:
                                 # newer version found!
                                 log.debug(
@@ -306,6 +327,9 @@ class RemotesManager:
                 if not single_local.is_newer(to_del.properties.build_date):
                     log.info(f"Newer version on the server, not pushing.")
                     continue
+                if self.holds_content(remote_db, single_local):
+                    log.info(f"Same content on the server, not pushing.")
+                    continue
             if to_del is not None:
                 log.info(
                     f"suppress [{remote_db_name}] {to_del.properties.get_as_str()}"
@@ -320,5 +344,7 @@ class RemotesManager:
             if not dry_run:
                 if to_del is not None:
                     pkg_mgr.remove_package(to_del, remote_db_name)
-                pkg_mgr.add_to_remote(single_local, remote_db_name)
+                to_push.append(single_local)
+        if len(to_push) > 0:
+            pkg_mgr.add_list_to_remote(to_push, remote_db_name)
         log.info("Syncing done.")
@@ -4,9 +4,7 @@ Build command.
 
 from pathlib import Path
 
-from depmanager.api.builder import Builder
 from depmanager.api.internal.messaging import log
-from depmanager.api.package import PackageManager
 
 
 def build(args, system=None):
@@ -15,6 +13,8 @@ def build(args, system=None):
     :param args: Command Line Arguments.
     :param system: The local system.
     """
+    from depmanager.api.builder import Builder
+    from depmanager.api.package import PackageManager
 
     location = Path(args.location).resolve()
     if not location.exists():
@@ -150,4 +150,4 @@ def add_build_parameters(sub_parsers):
         default=False,
         help="Force the use of single thread.",
     )
-    build_parser.set_defaults(func=build)
+    build_parser.set_defaults(func=build, shared_lock=False)
@@ -0,0 +1,81 @@
+"""
+The daemon subcommand
+"""
+
+from depmanager.api.internal.messaging import log, message
+
+possible_daemon = ["run", "stop", "status"]
+
+
+def daemon(args, system=None):
+    """
+    Daemon entrypoint.
+    :param args: The command line arguments.
+    :param system: The local system.
+    """
+    from depmanager.api.internal.daemon_client import request, socket_path
+
+    path = socket_path()
+    if args.what == "stop":
+        if request({"stop": True}) is None:
+            log.warn(f"No daemon listens on {path}.")
+            return 1
+        message("Daemon stopped.")
+        return 0
+    if args.what == "status":
+        status = request({"status": True})
+        if status is None:
+            message(f"No daemon listens on {path}.")
+            return 1
+        message(
+            f"Daemon {status['pid']} on {path}: {status['requests']} requests"
+            f" in {status['uptime']:.0f}s."
+        )
+        return 0
+    from depmanager.api.internal.daemon import DaemonServer, ResidentSystem
+
+    resident = ResidentSystem(system, args.catalog_ttl)
+    try:
+        server = DaemonServer(resident, path)
+    except OSError as err:
+        log.fatal(f"daemon: cannot listen on {path}: {err}")
+        return 1
+    message(f"Daemon listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        resident.close()
+    return 0
+
+
+def add_daemon_parameters(sub_parsers):
+    """
+    Defines the daemon arguments
+    :param sub_parsers: the parser
+    """
+    from depmanager.api.internal.common import (
+        add_common_arguments,
+        default_catalog_ttl,
+    )
+
+    daemon_parser = sub_parsers.add_parser("daemon")
+    daemon_parser.description = (
+        "Resident process answering the get, load and pack ls commands"
+    )
+    daemon_parser.add_argument(
+        "what",
+        type=str,
+        choices=possible_daemon,
+        help="Run the daemon in the foreground, stop it or get its status",
+    )
+    add_common_arguments(daemon_parser)  # add -v
+    daemon_parser.add_argument(
+        "--catalog-ttl",
+        type=float,
+        default=default_catalog_ttl,
+        help="Seconds during which the remote catalogs are reused.",
+    )
+    daemon_parser.set_defaults(func=daemon, shared_lock=True)
@@ -51,4 +51,4 @@ def add_get_parameters(sub_parsers):
     )
     add_common_arguments(get_parser)  # add -v
     add_query_arguments(get_parser)
-    get_parser.set_defaults(func=get)
+    get_parser.set_defaults(func=get, shared_lock=True)
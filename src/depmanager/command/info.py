@@ -69,4 +69,4 @@ def add_info_parameters(sub_parsers):
         choices=possible_info,
         help="The information you want about the program",
     )
-    info_parser.set_defaults(func=info)
+    info_parser.set_defaults(func=info, shared_lock=True)
@@ -5,7 +5,6 @@ The load subcommand
 from pathlib import Path
 
 from depmanager.api.internal.messaging import log, message, set_logging_level
-from depmanager.api.load import load_environment
 
 
 def load(args, system=None):
@@ -14,6 +13,8 @@ def load(args, system=None):
     :param args: The command line arguments.
     :param system: The local system.
     """
+    from depmanager.api.load import load_environment
+
     try:
         # check arguments.
         arg_check = True
@@ -86,7 +87,7 @@ def add_load_parameters(sub_parsers):
     load_parser = sub_parsers.add_parser("load")
     load_parser.description = "Tool to load cmake config based on config file."
 
-    load_parser.set_defaults(func=load)
+    load_parser.set_defaults(func=load, shared_lock=True)
     add_common_arguments(load_parser)  # add -v
     load_parser.add_argument(
         "--info", action="store_true", default=False, help="Print info messages"
@@ -5,7 +5,6 @@ Pack command
 from copy import deepcopy
 from pathlib import Path
 
-from depmanager.api.internal.dependency import Props
 from depmanager.api.internal.messaging import log, message, align_centered
 
 possible_info = ["pull", "push", "add", "rm", "ls", "clean", "info"]
@@ -68,9 +67,15 @@ def pack(args, system=None):
             suffixes = []
             if len(source_path.suffixes) > 0:
                 suffixes = [source_path.suffixes[-1]]
-                if suffixes == [".gz"] and len(source_path.suffixes) > 1:
+                if suffixes in [[".gz"], [".zst"]] and len(source_path.suffixes) > 1:
                     suffixes = [source_path.suffixes[-2], source_path.suffixes[-1]]
-            if suffixes not in [[".zip"], [".tgz"], [".tar", ".gz"]]:
+            if suffixes not in [
+                [".zip"],
+                [".tgz"],
+                [".tar", ".gz"],
+                [".tzst"],
+                [".tar", ".zst"],
+            ]:
                 log.fatal(f"source file {source_path} is in unsupported format.")
                 exit(-666)
 
@@ -159,6 +164,8 @@ def pack(args, system=None):
             for dep in deps:
                 message(f"{dep.properties.get_as_str()}")
             return
+        to_push = []
+        to_pull = []
         for dep in deps:
             if args.what in ["rm"]:
                 pacman.remove_package(dep, remote_name)
@@ -169,9 +176,19 @@ def pack(args, system=None):
             if len(result) >= 2 and result[0].version_greater(dep):
                 continue
             if args.what == "pull":
-                pacman.add_from_remote(dep, remote_name)
+                to_pull.append(dep)
             elif args.what == "push":
-                pacman.add_to_remote(dep, remote_name)
+                to_push.append(dep)
+        if len(to_pull) > 0:
+            plan = pacman.plan_from_remote(to_pull, remote_name)
+            if args.plan:
+                message(f"Install plan ({len(plan)} packages from {remote_name}):")
+                for dep in plan:
+                    message(f"  {dep.properties.get_as_str()}")
+            elif len(plan) > 0:
+                pacman.install_plan(plan, remote_name)
+        if len(to_push) > 0:
+            pacman.add_list_to_remote(to_push, remote_name)
         return
     if args.what in ["info"]:
         if len(deps) > 1 and not args.recurse:
@@ -214,7 +231,7 @@ def add_pack_parameters(sub_parsers):
         type=str,
         default="",
         help="""Location of the package to add. Provide a folder (with an edp.info file) of an archive.
-            supported archive format: zip, tar.gz or tgz.
+            supported archive format: zip, tar.gz, tgz, tar.zst or tzst.
             """,
     )
     pack_parser.add_argument(
@@ -231,4 +248,10 @@ def add_pack_parameters(sub_parsers):
         default=False,
         help="""Do a full cleaning, removing all local packages.""",
     )
-    pack_parser.set_defaults(func=pack)
+    pack_parser.add_argument(
+        "--plan",
+        action="store_true",
+        default=False,
+        help="""For pull: only print the packages that would be installed, dependencies first.""",
+    )
+    pack_parser.set_defaults(func=pack, shared_lock=["ls", "info"])
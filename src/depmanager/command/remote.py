@@ -205,4 +205,4 @@ def add_remote_parameters(sub_parsers):
         default=False,
         help="During sync, do the checks, but no transfer.",
     )
-    info_parser.set_defaults(func=remote)
+    info_parser.set_defaults(func=remote, shared_lock=["list", "ls", "info"])
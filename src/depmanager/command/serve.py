@@ -0,0 +1,133 @@
+"""
+The serve subcommand
+"""
+
+from depmanager.api.internal.messaging import log, message
+
+
+def serve(args, system=None):
+    """
+    Serve entrypoint.
+    :param args: The command line arguments.
+    :param system: The local system.
+    """
+    import os
+    from pathlib import Path
+
+    from depmanager.api.internal.archive_cache import parse_size
+    from depmanager.api.internal.proxy import CachingProxy, ProxyServer
+    from depmanager.api.remotes import RemotesManager
+
+    remotes = RemotesManager(system)
+    upstream = remotes.get_safe_remote(args.name, args.default)
+    if upstream is None:
+        log.fatal("serve: no upstream remote, give one with --name.")
+        return 1
+    max_size = parse_size(args.max_size)
+    if max_size is None:
+        log.fatal(f"serve: invalid cache size {args.max_size}.")
+        return 1
+    credentials = None
+    if not args.read_only:
+        password = args.passwd or os.environ.get("DEPMANAGER_PROXY_PASSWD", "")
+        if args.login in ["", None] or password == "":
+            log.fatal("serve: a writable proxy needs --login and --passwd.")
+            return 1
+        credentials = (args.login, password)
+    folder = args.cache
+    if folder in ["", None]:
+        folder = system.get_base_path() / "proxy"
+    proxy = CachingProxy(
+        upstream,
+        Path(folder).expanduser().resolve(),
+        max_size,
+        args.catalog_ttl,
+        args.read_only,
+        credentials,
+    )
+    # the proxy does not use the local data: let the other commands run.
+    system.get_sys().release()
+    try:
+        server = ProxyServer(proxy, args.host, args.port)
+    except OSError as err:
+        log.fatal(f"serve: cannot listen on {args.host}:{args.port}: {err}")
+        return 1
+    host, port = server.server_address[:2]
+    message(f"Serving {upstream.destination} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def add_serve_parameters(sub_parsers):
+    """
+    Defines the serve arguments
+    :param sub_parsers: the parser
+    """
+    from depmanager.api.internal.common import (
+        add_common_arguments,
+        add_remote_selection_arguments,
+        default_catalog_ttl,
+        default_max_size,
+    )
+
+    serve_parser = sub_parsers.add_parser("serve")
+    serve_parser.description = (
+        "Caching proxy of a remote, speaking the dependency server protocol"
+    )
+    add_common_arguments(serve_parser)  # add -v
+    add_remote_selection_arguments(serve_parser)  # add --name, -n, --default, -d
+    serve_parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address to listen on (127.0.0.1 by default, empty for all).",
+    )
+    serve_parser.add_argument(
+        "--port", "-p", type=int, default=8080, help="Port to listen on."
+    )
+    serve_parser.add_argument(
+        "--cache",
+        type=str,
+        default="",
+        help="Cache folder (default: proxy in the DEPMANAGER_HOME).",
+    )
+    serve_parser.add_argument(
+        "--max-size",
+        type=str,
+        default=f"{default_max_size}",
+        help="Size limit of the cached archives (like 500M or 20G).",
+    )
+    serve_parser.add_argument(
+        "--catalog-ttl",
+        type=float,
+        default=default_catalog_ttl,
+        help="Seconds during which the upstream catalog is reused.",
+    )
+    access = serve_parser.add_mutually_exclusive_group()
+    access.add_argument(
+        "--read-only",
+        action="store_true",
+        default=True,
+        help="Refuse pushes and deletions (default).",
+    )
+    access.add_argument(
+        "--writable",
+        dest="read_only",
+        action="store_false",
+        help="Forward the authenticated pushes and deletions to the upstream.",
+    )
+    serve_parser.add_argument(
+        "--login", "-l", type=str, default="", help="Login of the writers."
+    )
+    serve_parser.add_argument(
+        "--passwd",
+        type=str,
+        default="",
+        help="Password of the writers (or DEPMANAGER_PROXY_PASSWD).",
+    )
+    serve_parser.set_defaults(func=serve, shared_lock=False)
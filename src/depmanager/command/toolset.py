@@ -144,4 +144,4 @@ def add_toolset_parameters(sub_parsers):
         action="store_true",
         help="If the new toolset should become the default.",
     )
-    info_parser.set_defaults(func=toolset)
+    info_parser.set_defaults(func=toolset, shared_lock=["list", "ls"])
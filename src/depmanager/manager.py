@@ -2,62 +2,69 @@
 """
 Main entrypoint for library manager
 """
-from depmanager.api.internal.messaging import set_logging_level, set_raw_output
 
+# The subcommands: each is defined by add_<name>_parameters of command/<name>.py.
+commands = [
+    "info",
+    "remote",
+    "get",
+    "pack",
+    "build",
+    "load",
+    "toolset",
+    "serve",
+    "daemon",
+]
 
-def main():
+
+def get_parser(command: str = None):
     """
-    Main entrypoint for command-line use of manager
-    :return:
+    Build the command line parser.
+    :param command: If it is a known subcommand, only define this one: the
+        others are not needed to parse its arguments.
+    :return: The parser.
     """
     from argparse import ArgumentParser
+    from importlib import import_module
 
     parser = ArgumentParser(description="Dependency manager used alongside with cmake")
     sub_parsers = parser.add_subparsers(
         title="Sub Commands", help="Sub command Help", dest="command", required=True
     )
-    # ============================= INFO ==============================================
-    from depmanager.command.info import add_info_parameters
-
-    add_info_parameters(sub_parsers)
-    # ============================ REMOTE =============================================
-    from depmanager.command.remote import add_remote_parameters
-
-    add_remote_parameters(sub_parsers)
-    # ============================== GET ==============================================
-    from depmanager.command.get import add_get_parameters
-
-    add_get_parameters(sub_parsers)
-    # ============================= PACK ==============================================
-    from depmanager.command.pack import add_pack_parameters
+    for name in [command] if command in commands else commands:
+        module = import_module(f"depmanager.command.{name}")
+        getattr(module, f"add_{name}_parameters")(sub_parsers)
+    return parser
 
-    add_pack_parameters(sub_parsers)
-    # ============================ BUILD ==============================================
-    from depmanager.command.build import add_build_parameters
 
-    add_build_parameters(sub_parsers)
-    # ============================ LOAD ==============================================
-    from depmanager.command.load import add_load_parameters
-
-    add_load_parameters(sub_parsers)
-    # ============================ TOOLSET ==============================================
-    from depmanager.command.toolset import add_toolset_parameters
+def main():
+    """
+    Main entrypoint for command-line use of manager
+    :return:
+    """
+    import sys
 
-    add_toolset_parameters(sub_parsers)
+    from depmanager.api.internal.daemon_client import forward
 
+    # a running daemon answers at once.
+    ret = forward(sys.argv[1:])
+    if ret is not None:
+        return ret
+    parser = get_parser(sys.argv[1] if len(sys.argv) > 1 else None)
     args = parser.parse_args()
     if args.command in ["", None]:
         parser.print_help()
         return None
     else:
+        from depmanager.api.internal.common import apply_common_arguments
         from depmanager.api.local import LocalManager
 
-        logging_level = args.verbose + 2
-        if args.quiet:
-            logging_level = 0
-        set_logging_level(logging_level)
-        set_raw_output(args.raw)
-        local = LocalManager()
+        apply_common_arguments(args)
+        # commands only reading the local data share its lock.
+        shared_lock = args.shared_lock
+        if isinstance(shared_lock, list):
+            shared_lock = args.what in shared_lock
+        local = LocalManager(shared=shared_lock)
         ret = args.func(args, local)
         if ret is None:
             ret = 0
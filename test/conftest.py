@@ -69,3 +69,23 @@ def make_package(tmp_edm_home):
         return pkg_dir
 
     return _make
+
+
+@pytest.fixture
+def dep_line():
+    """
+    Factory building the catalog line of a test package, as remotes list them.
+
+    :return: Callable(name, version, build_date, glibc) -> str.
+    """
+
+    def _line(
+        name: str,
+        version: str = "1.0.0",
+        build_date: str = "2024-01-01T00:00:00+00:00",
+        glibc: str = "",
+    ) -> str:
+        glibc = f", {glibc}" if glibc else ""
+        return f"{name}/{version} ({build_date}) [x86_64, static, Linux, gnu{glibc}]"
+
+    return _line
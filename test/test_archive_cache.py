@@ -0,0 +1,108 @@
+"""
+Tests for the machine-wide ``ArchiveCache``.
+
+Several cache instances on the same directory stand in for independent
+DEPMANAGER_HOME instances sharing the cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+
+from depmanager.api.internal.archive_cache import ArchiveCache, parse_size
+from depmanager.api.internal.dependency import Dependency
+
+
+def _dep(line: str, sha256: str = "", size: int = 0) -> Dependency:
+    dep = Dependency(line)
+    dep.sha256 = sha256
+    dep.size = size
+    return dep
+
+
+def _archive(tmp_path, name: str, size: int):
+    file = tmp_path / f"{name}.tgz"
+    file.write_bytes(b"x" * size)
+    return file
+
+
+def test_parse_size():
+    assert parse_size(1024) == 1024
+    assert parse_size("500M") == 500 * 1024**2
+    assert parse_size("2GiB") == 2 * 1024**3
+    assert parse_size("1.5k") == 1536
+    assert parse_size("lots") is None
+    assert parse_size("0") is None
+    assert parse_size("-5M") is None
+
+
+def test_entry_shared_between_instances(tmp_path, dep_line):
+    sha256 = hashlib.sha256(b"x" * 100).hexdigest()
+    dep = _dep(dep_line("lib"), sha256=sha256, size=100)
+    ArchiveCache(tmp_path / "cache").put(dep, _archive(tmp_path, "lib", 100))
+    other = ArchiveCache(tmp_path / "cache")
+    file = other.get(dep, tmp_path / "home2")
+    assert file.read_bytes() == b"x" * 100
+    assert other.entry(dep).parent.name == sha256[:2]
+
+
+def test_entry_without_checksum_uses_package_hash(tmp_path, dep_line):
+    cache = ArchiveCache(tmp_path / "cache")
+    dep = _dep(dep_line("lib"))
+    cache.put(dep, _archive(tmp_path, "lib", 10))
+    assert cache.entry(dep).parent.name == "package"
+    assert cache.get(dep, tmp_path / "out") is not None
+    assert cache.get(_dep(dep_line("other")), tmp_path / "out") is None
+
+
+def test_damaged_entry_is_dropped(tmp_path, dep_line):
+    cache = ArchiveCache(tmp_path / "cache")
+    dep = _dep(dep_line("lib"), sha256="cd" * 32, size=100)
+    cache.put(dep, _archive(tmp_path, "lib", 50))
+    assert cache.get(dep, tmp_path / "out") is None
+    assert not cache.entry(dep).exists()
+
+
+def test_corrupted_entry_is_dropped(tmp_path, dep_line):
+    cache = ArchiveCache(tmp_path / "cache")
+    sha256 = hashlib.sha256(b"x" * 100).hexdigest()
+    dep = _dep(dep_line("lib"), sha256=sha256, size=100)
+    cache.put(dep, _archive(tmp_path, "lib", 100))
+    # same size, other content.
+    cache.entry(dep).write_bytes(b"y" * 100)
+    assert cache.get(dep, tmp_path / "out") is None
+    assert not cache.entry(dep).exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, dep_line):
+    cache = ArchiveCache(tmp_path / "cache", max_size=250)
+    deps = [_dep(dep_line(f"lib{i}")) for i in range(3)]
+    for i, dep in enumerate(deps[:2]):
+        cache.put(dep, _archive(tmp_path, dep.properties.name, 100))
+        os.utime(cache.entry(dep), (1000 + i, 1000 + i))
+    # lib0 is used again: lib1 becomes the oldest.
+    cache.get(deps[0], tmp_path / "out")
+    cache.put(deps[2], _archive(tmp_path, "lib2", 100))
+    assert cache.entry(deps[0]).exists()
+    assert not cache.entry(deps[1]).exists()
+    assert cache.entry(deps[2]).exists()
+
+
+def test_concurrent_writers_leave_one_complete_entry(tmp_path, dep_line):
+    dep = _dep(dep_line("lib"), sha256="ef" * 32, size=4096)
+    archive = _archive(tmp_path, "lib", 4096)
+    writers = [
+        threading.Thread(
+            target=ArchiveCache(tmp_path / "cache").put, args=(dep, archive)
+        )
+        for _ in range(8)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    entry = ArchiveCache(tmp_path / "cache").entry(dep)
+    assert entry.read_bytes() == b"x" * 4096
+    assert [file.name for file in entry.parent.iterdir()] == [entry.name]
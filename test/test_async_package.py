@@ -0,0 +1,224 @@
+"""
+Tests for ``AsyncPackageManager``.
+
+The remote is the in-memory ``FakeServer`` of the asynchronous client tests,
+serving real package archives, in front of a ``LocalSystem`` living in a
+temporary DEPMANAGER_HOME.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import tarfile
+import threading
+import time
+from shutil import rmtree
+
+import pytest
+from test_remote_server_async import FakeServer
+
+from depmanager.api.async_package import AsyncPackageManager
+from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+from depmanager.api.internal.dependency import Dependency
+
+
+class PackageServer(FakeServer):
+    """Fake server whose downloads are package archives."""
+
+    def __init__(self, deps):
+        super().__init__([dep.catalog_str() for dep in deps])
+        self.packages = {}
+        self.pulls = []
+        # names of the packages whose download raises.
+        self.broken = set()
+
+    def get_download_url(self, dep):
+        url = super().get_download_url(dep)
+        self.packages[url] = dep
+        return url
+
+    def download(self, url, file_name, callback=None, checksum=None):
+        super().download(url, file_name)
+        dep = self.packages[url]
+        if dep.properties.name in self.broken:
+            raise ConnectionError(f"{dep.properties.name} unreachable")
+        self.pulls.append(dep.properties.name)
+        source = file_name.with_suffix(".src")
+        dep.properties.to_edp_file(source / "edp.info")
+        with tarfile.open(file_name, "w:gz") as tar:
+            tar.add(source / "edp.info", arcname="edp.info")
+        rmtree(source)
+        return True
+
+
+class CountingInstalls:
+    """Package manager counting the installs running at the same time."""
+
+    def __init__(self, pacman):
+        self.pacman = pacman
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def query(self, query, remote_name: str = ""):
+        return self.pacman.query(query, remote_name)
+
+    def add_from_location(self, source):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        self.pacman.add_from_location(source)
+        with self.lock:
+            self.running -= 1
+
+
+@pytest.fixture
+def system(tmp_edm_home):
+    from depmanager.api.internal.system import LocalSystem
+
+    system = LocalSystem()
+    yield system
+    system.release()
+
+
+@pytest.fixture
+def package(dep_line):
+    """
+    Factory building a catalog dependency needing other packages.
+
+    :return: Callable(name, *needs) -> Dependency.
+    """
+
+    def _package(name: str, *needs: str) -> Dependency:
+        dep = Dependency(dep_line(name))
+        dep.properties.dependencies = [
+            {"name": need, "version": "1.0.0"} for need in needs
+        ]
+        return dep
+
+    return _package
+
+
+def _serve(system, deps):
+    server = PackageServer(deps)
+    system.remote_database["fake"] = server
+    return server
+
+
+def _local_names(manager):
+    return sorted(dep.properties.name for dep in manager.pacman.query({}))
+
+
+def test_add_from_remote_installs_dependencies(system, package):
+    server = _serve(
+        system, [package("app", "lib"), package("lib", "base"), package("base")]
+    )
+    manager = AsyncPackageManager(system)
+    assert asyncio.run(manager.add_from_remote({"name": "app"}, "fake"))
+    assert _local_names(manager) == ["app", "base", "lib"]
+    assert sorted(server.pulls) == ["app", "base", "lib"]
+
+
+def test_shared_dependency_is_pulled_once(system, package):
+    server = _serve(
+        system, [package("left", "base"), package("right", "base"), package("base")]
+    )
+    manager = AsyncPackageManager(system)
+    results = asyncio.run(
+        manager.add_many_from_remote([{"name": "left"}, {"name": "right"}], "fake")
+    )
+    assert results == [True, True]
+    assert server.pulls.count("base") == 1
+    assert _local_names(manager) == ["base", "left", "right"]
+
+
+def test_dependency_cycle_is_installed(system, package):
+    _serve(system, [package("liba", "libb"), package("libb", "liba")])
+    manager = AsyncPackageManager(system)
+
+    async def run():
+        return await asyncio.wait_for(
+            manager.add_many_from_remote([{"name": "liba"}, {"name": "libb"}], "fake"),
+            timeout=10,
+        )
+
+    assert asyncio.run(run()) == [True, True]
+    assert _local_names(manager) == ["liba", "libb"]
+
+
+def test_failed_pull_is_retried(system, package):
+    server = _serve(system, [package("app", "lib"), package("lib")])
+    server.broken = {"app"}
+    manager = AsyncPackageManager(system)
+    with pytest.raises(ConnectionError):
+        asyncio.run(manager.add_from_remote({"name": "app"}, "fake"))
+    # the dependency pull started before the failure is awaited.
+    assert _local_names(manager) == ["lib"]
+    server.broken = set()
+    assert asyncio.run(manager.add_from_remote({"name": "app"}, "fake"))
+    assert _local_names(manager) == ["app", "lib"]
+
+
+def test_removed_package_is_installed_again(system, package):
+    server = _serve(system, [package("liba")])
+    manager = AsyncPackageManager(system)
+    for _ in range(2):
+        # a new event loop each time.
+        assert asyncio.run(manager.add_from_remote({"name": "liba"}, "fake"))
+        assert _local_names(manager) == ["liba"]
+        assert asyncio.run(manager.remove_package({"name": "liba"}))
+    assert server.pulls == ["liba", "liba"]
+
+
+def test_installs_are_serialized(system, package):
+    names = [f"lib{i}" for i in range(4)]
+    _serve(system, [package(name) for name in names])
+    manager = AsyncPackageManager(system)
+    manager.pacman = CountingInstalls(manager.pacman)
+    results = asyncio.run(
+        manager.add_many_from_remote([{"name": name} for name in names], "fake")
+    )
+    assert results == [True] * 4
+    assert manager.pacman.max_running == 1
+    assert _local_names(manager) == names
+
+
+def test_add_many_to_remote(system, package):
+    source = _serve(system, [package("liba"), package("libb")])
+    manager = AsyncPackageManager(system)
+    names = [{"name": "liba"}, {"name": "libb"}]
+    assert asyncio.run(manager.add_many_from_remote(names, "fake")) == [True, True]
+    system.remote_database["mirror"] = FakeServer([])
+    mirror = system.remote_database["mirror"]
+    assert asyncio.run(manager.add_many_to_remote(names, "mirror")) == [True, True]
+    assert sorted(mirror.uploads) == ["liba", "libb"]
+    # already there: only a forced push uploads again.
+    assert asyncio.run(manager.add_many_to_remote(names[:1], "mirror")) == [False]
+    assert asyncio.run(manager.add_many_to_remote(names[:1], "mirror", True)) == [True]
+    assert source.uploads == []
+
+
+def test_remove_package(system, package):
+    server = _serve(system, [package("liba"), package("libb")])
+    manager = AsyncPackageManager(system)
+
+    async def run():
+        await manager.add_from_remote({"name": "liba"}, "fake")
+        local = await manager.remove_package({"name": "liba"})
+        remote = await manager.remove_package(package("libb"), "fake")
+        return local, remote, await manager.query({"name": "libb"}, "fake")
+
+    assert asyncio.run(run()) == (True, True, [])
+    assert _local_names(manager) == []
+    assert server.catalog == [package("liba").catalog_str()]
+
+
+def test_get_client_rejects_other_remotes(system, tmp_path, package):
+    system.remote_database["folder"] = RemoteDatabaseFolder(str(tmp_path / "folder"))
+    manager = AsyncPackageManager(system)
+    assert manager.get_client("folder") is None
+    assert manager.get_client("missing") is None
+    assert not asyncio.run(manager.add_from_remote({"name": "liba"}, "folder"))
+    _serve(system, [package("liba")])
+    assert manager.get_client("fake") is manager.get_client("fake")
@@ -0,0 +1,136 @@
+"""
+Tests for the archive compression: parallel gzip and format negotiation.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import random
+import tarfile
+import zlib
+
+import pytest
+
+from depmanager.api.internal import compression as compression_module
+from depmanager.api.internal import database_remote_server
+from depmanager.api.internal.compression import (
+    Compression,
+    ParallelGzipWriter,
+    block_size,
+    open_tar_file,
+    open_tar_stream,
+    parse_formats,
+)
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+
+
+def _sample(size: int) -> bytes:
+    rng = random.Random(42)
+    words = [bytes(rng.choices(b"abcdefghij", k=rng.randint(2, 9))) for _ in range(500)]
+    return b" ".join(rng.choice(words) for _ in range(size // 5))[:size]
+
+
+def _compress(data: bytes, threads: int, piece: int = 10240) -> bytes:
+    out = io.BytesIO()
+    with ParallelGzipWriter(out, 6, threads) as writer:
+        for start in range(0, len(data), piece):
+            writer.write(data[start : start + piece])
+    return out.getvalue()
+
+
+def test_parallel_gzip_is_a_standard_stream():
+    data = _sample(10 * block_size + 123)
+    result = _compress(data, 4)
+    assert gzip.decompress(result) == data
+    # a single member: zlib reads it to the end without leftover.
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(result) == data
+    assert decompressor.eof and decompressor.unused_data == b""
+    # the dictionary keeps the ratio of a single-threaded compression.
+    assert len(result) < len(gzip.compress(data, 6)) * 1.01 + 1024
+
+
+def test_parallel_gzip_output_does_not_depend_on_threads():
+    data = _sample(5 * block_size)
+    assert _compress(data, 1) == _compress(data, 8, piece=777)
+    assert gzip.decompress(_compress(b"", 2)) == b""
+
+
+def test_tar_through_compression(tmp_path):
+    folder = tmp_path / "pack"
+    (folder / "lib").mkdir(parents=True)
+    (folder / "lib" / "big.a").write_bytes(_sample(3 * block_size))
+    (folder / "edp.info").write_text("name = pack\n")
+    archive = tmp_path / "pack.tgz"
+    with open(archive, "wb") as fp, Compression(threads=2).writer(
+        fp
+    ) as writer, tarfile.open(fileobj=writer, mode="w|") as tar:
+        tar.add(folder / "edp.info", arcname="edp.info")
+        tar.add(folder / "lib" / "big.a", arcname="lib/big.a")
+    with tarfile.open(archive, "r:gz") as tar:
+        assert sorted(tar.getnames()) == ["edp.info", "lib/big.a"]
+    with open_tar_file(archive) as tar:
+        assert tar.extractfile("lib/big.a").read() == _sample(3 * block_size)
+    with open(archive, "rb") as fp, open_tar_stream(fp) as tar:
+        assert [member.name for member in tar] == ["edp.info", "lib/big.a"]
+
+
+def test_configuration():
+    default = Compression.from_config({})
+    assert (default.format, default.level, default.threads) == ("gzip", 6, 0)
+    zstd = Compression.from_config({"format": "zstd", "level": 19, "threads": 4})
+    assert (zstd.format, zstd.level, zstd.threads) == ("zstd", 19, 4)
+    assert Compression.from_config({"format": "zstd", "level": 19}).suffix == ".tar.zst"
+    assert Compression.from_config({"level": 19}) is None
+    assert Compression.from_config({"format": "lz4"}) is None
+    assert Compression.from_config({"threads": -1}) is None
+    assert parse_formats(["zstd", "brotli"]) == ["gzip", "zstd"]
+    assert parse_formats("gzip") == ["gzip"]
+
+
+def test_zstd_is_used_only_when_accepted(monkeypatch):
+    wanted = Compression("zstd", 10, 2)
+    monkeypatch.setattr(compression_module, "zstd_available", lambda: True)
+    assert wanted.negotiate(["gzip", "zstd"]) is wanted
+    fallback = wanted.negotiate(["gzip"])
+    assert (fallback.format, fallback.level, fallback.threads) == ("gzip", 4, 2)
+    # the levels keep their place in the range of the other format.
+    assert Compression("zstd", 22).with_format("gzip").level == 9
+    assert Compression("zstd", 1).with_format("gzip").level == 1
+    assert Compression("zstd").with_format("gzip").level == 6
+    assert Compression("gzip", 9).with_format("zstd").level == 22
+    monkeypatch.setattr(compression_module, "zstd_available", lambda: False)
+    assert wanted.negotiate(["gzip", "zstd"]).format == "gzip"
+
+
+def test_server_announces_its_formats(monkeypatch):
+    class Answer:
+        status_code = 200
+        text = "version: 1.0\napi_version: 2.1.0\nformats: gzip, zstd\n"
+
+    monkeypatch.setattr(database_remote_server, "http_post", lambda url, **kw: Answer)
+    remote = RemoteDatabaseServer("fake.server")
+    remote.compression = Compression("zstd")
+    assert remote.archive_formats == ["gzip"]
+    remote.connect()
+    assert remote.archive_formats == ["gzip", "zstd"]
+
+
+def test_zstd_archive_round_trip(tmp_path):
+    pytest.importorskip("zstandard")
+    data = _sample(2 * block_size)
+    archive = tmp_path / "pack.tgz"
+    info = tarfile.TarInfo("lib/big.a")
+    info.size = len(data)
+    with open(archive, "wb") as fp, Compression("zstd").writer(
+        fp
+    ) as writer, tarfile.open(fileobj=writer, mode="w|") as tar:
+        tar.addfile(info, io.BytesIO(data))
+    # recognized by its content, despite the name.
+    with open_tar_file(archive) as tar:
+        assert tar.extractfile("lib/big.a").read() == data
+    # the temporary file goes with the archive.
+    assert tar.fileobj.closed
+    with open(archive, "rb") as fp, open_tar_stream(fp) as tar:
+        assert [member.name for member in tar] == ["lib/big.a"]
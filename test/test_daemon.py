@@ -0,0 +1,107 @@
+"""
+Tests for the resident daemon and its client.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+
+import pytest
+
+from depmanager.api.internal.daemon_client import (
+    forward,
+    is_served,
+    request,
+    socket_path,
+)
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="no Unix sockets"
+)
+
+
+def test_only_reading_commands_are_served():
+    assert is_served(["get", "-p", "pack"])
+    assert not is_served(["load", "--config", "."])
+    assert is_served(["pack", "ls"])
+    assert not is_served(["pack", "rm", "-p", "pack"])
+    assert not is_served(["remote", "sync"])
+    assert not is_served([])
+
+
+def test_without_daemon_commands_run_locally(tmp_edm_home):
+    assert forward(["pack", "ls"]) is None
+    # a socket left by a crashed daemon.
+    socket_path().parent.mkdir(parents=True)
+    socket_path().touch()
+    assert forward(["pack", "ls"]) is None
+
+
+@pytest.fixture
+def daemon(tmp_edm_home):
+    from depmanager.api.internal.daemon import DaemonServer, ResidentSystem
+
+    resident = ResidentSystem()
+    server = DaemonServer(resident, socket_path())
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield resident
+    assert request({"stop": True}) == {"stopped": True}
+    thread.join(5)
+    server.server_close()
+    resident.close()
+    assert not socket_path().exists()
+
+
+def _package(resident, line: str):
+    from depmanager.api.internal.dependency import Props
+
+    props = Props(line)
+    data = resident.local.get_sys().data_path
+    props.to_edp_file(data / f"{props.name}{props.hash()}" / "edp.info")
+
+
+def test_daemon_runs_the_commands(daemon, capsys, tmp_path, dep_line):
+    _package(daemon, dep_line("first", glibc="2.17"))
+    assert forward(["pack", "ls", "--raw"]) == 0
+    assert "first/1.0.0" in capsys.readouterr().out
+    # packages installed since are seen.
+    _package(daemon, dep_line("second", glibc="2.17"))
+    assert forward(["pack", "ls", "--raw", "-p", "second"]) == 0
+    out = capsys.readouterr().out
+    assert "second/1.0.0" in out and "first" not in out
+    # the commands run in the folder of the client.
+    answer = request({"argv": ["pack", "ls"], "cwd": str(tmp_path / "missing")})
+    assert answer["code"] == 1 and "cannot run in" in answer["stderr"]
+    # installing packages is not done by the daemon.
+    assert request({"argv": ["load", "--config", "."], "cwd": "."})["code"] == 2
+    assert request({"argv": ["pack", "rm"], "cwd": "."})["code"] == 2
+    assert request({"status": True})["requests"] == 3
+    # the data is not locked between the commands.
+    assert daemon.local.get_sys().locker.mode is None
+
+
+def test_daemon_waits_for_the_writers(daemon, capsys, dep_line):
+    from depmanager.api.internal.data_locking import Locker
+
+    # the local database is loaded.
+    assert forward(["pack", "ls", "--raw"]) == 0
+    writer = Locker(daemon.local.get_sys().base_path)
+    assert writer.request_lock()
+    codes = []
+    thread = threading.Thread(
+        target=lambda: codes.append(forward(["pack", "ls", "--raw", "-p", "third"]))
+    )
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()
+    # the other clients do not wait for it: they run their command locally.
+    assert request({"argv": ["pack", "ls"], "cwd": "."}) == {"busy": True}
+    assert forward(["pack", "ls"]) is None
+    # the writer installs a package meanwhile.
+    _package(daemon, dep_line("third", glibc="2.17"))
+    writer.release_lock()
+    thread.join(5)
+    assert codes == [0]
+    assert "third/1.0.0" in capsys.readouterr().out
@@ -0,0 +1,215 @@
+"""
+Tests for the reader/writer lock of the local data.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from depmanager.api.internal.data_locking import Locker, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="flock is not available")
+
+
+def _take(locker: Locker, shared: bool, done: threading.Event):
+    locker.request_lock(shared)
+    done.set()
+
+
+def test_readers_share_the_lock(tmp_path):
+    first, second = Locker(tmp_path), Locker(tmp_path)
+    assert first.request_lock(shared=True)
+    assert second.request_lock(shared=True)
+    assert (first.mode, second.mode) == ("shared", "shared")
+    assert second.metrics()["waits"] == 0
+    first.release_lock()
+    second.release_lock()
+    assert not first.is_locked()
+
+
+def test_writer_waits_for_the_readers(tmp_path):
+    reader, writer = Locker(tmp_path), Locker(tmp_path)
+    assert reader.request_lock(shared=True)
+    done = threading.Event()
+    thread = threading.Thread(target=_take, args=(writer, False, done))
+    thread.start()
+    assert not done.wait(0.2)
+    reader.release_lock()
+    thread.join(5)
+    assert writer.mode == "exclusive"
+    metrics = writer.metrics()
+    assert (metrics["requests"], metrics["waits"]) == (1, 1)
+    assert metrics["max_wait"] >= 0.2
+    # a reader now waits for the writer.
+    done = threading.Event()
+    thread = threading.Thread(target=_take, args=(reader, True, done))
+    thread.start()
+    assert not done.wait(0.1)
+    writer.release_lock()
+    thread.join(5)
+    assert reader.mode == "shared"
+    reader.release_lock()
+
+
+def test_shared_lock_turns_exclusive(tmp_path):
+    locker = Locker(tmp_path)
+    assert locker.request_lock(shared=True)
+    assert locker.request_lock()
+    assert locker.mode == "exclusive"
+    # an exclusive lock already covers the readers.
+    assert locker.request_lock(shared=True)
+    assert locker.mode == "exclusive"
+    other = Locker(tmp_path)
+    done = threading.Event()
+    thread = threading.Thread(target=_take, args=(other, True, done))
+    thread.start()
+    assert not done.wait(0.1)
+    locker.release_lock()
+    thread.join(5)
+    other.release_lock()
+
+
+def test_failed_upgrade_keeps_the_shared_lock(tmp_path):
+    first, second = Locker(tmp_path), Locker(tmp_path)
+    assert first.request_lock(shared=True)
+    assert second.request_lock(shared=True)
+    assert not first.request_lock(blocking=False)
+    assert first.mode == "shared" and first.holds_lock()
+    second.release_lock()
+    # the first reader still holds the lock: a writer cannot take it.
+    writer = Locker(tmp_path)
+    assert not writer.request_lock(blocking=False)
+    assert not writer.holds_lock() and writer.is_locked()
+    first.release_lock()
+    assert not writer.is_locked()
+    assert writer.request_lock(blocking=False)
+    writer.release_lock()
+
+
+def test_lock_of_a_crashed_process_is_released(tmp_path):
+    script = (
+        "import os, sys, time\n"
+        "from pathlib import Path\n"
+        "from depmanager.api.internal.data_locking import Locker\n"
+        f"Locker(Path({str(tmp_path)!r})).request_lock()\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(60)\n"
+    )
+    holder = subprocess.Popen(
+        [sys.executable, "-c", script], stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        locker = Locker(tmp_path)
+        done = threading.Event()
+        thread = threading.Thread(target=_take, args=(locker, False, done))
+        thread.start()
+        assert not done.wait(0.2)
+        start = time.monotonic()
+        holder.kill()
+        thread.join(5)
+        assert locker.mode == "exclusive"
+        assert time.monotonic() - start < 5
+        locker.release_lock()
+    finally:
+        holder.kill()
+        holder.wait()
+        holder.stdout.close()
+
+
+def test_processes_have_their_own_temp_folder(tmp_edm_home):
+    from depmanager.api.internal.system import LocalSystem
+
+    first, second = LocalSystem(shared=True), LocalSystem(shared=True)
+    assert first.temp_path != second.temp_path
+    assert first.temp_path.parent == second.temp_path.parent
+    (second.temp_path / "pack").mkdir()
+    # left by a process that crashed.
+    stale = first.temp_root / "12-deadbeef"
+    (stale / "pack").mkdir(parents=True)
+    first.clear_tmp()
+    assert not stale.exists()
+    assert (second.temp_path / "pack").is_dir()
+    second.release()
+    assert not second.temp_path.exists()
+    first.release()
+    assert list(first.temp_root.iterdir()) == []
+
+
+def test_same_package_is_installed_once(tmp_edm_home, tmp_path, monkeypatch, dep_line):
+    from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+    from depmanager.api.internal.dependency import Dependency
+    from depmanager.api.internal.system import LocalSystem
+    from depmanager.api.package import PackageManager
+
+    dep = Dependency(dep_line("pack", glibc="2.17"))
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    fetched = []
+    monkeypatch.setattr(remote, "fetch", lambda dep, *args: fetched.append(dep))
+    first, second = LocalSystem(shared=True), LocalSystem(shared=True)
+    second.remote_database = {"remote": remote}
+    second.stream_install = False
+    key = dep.properties.hash()
+    assert first.lock_package(key)
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(
+            PackageManager(second).install_plan([dep], "remote")
+        )
+    )
+    thread.start()
+    time.sleep(0.2)
+    assert thread.is_alive()
+    # the first process installs the package meanwhile.
+    source = tmp_path / "pack"
+    dep.properties.to_edp_file(source / "edp.info")
+    first.import_folder(source)
+    first.unlock_package(key)
+    thread.join(5)
+    assert results == [[dep]]
+    assert fetched == []
+    assert second.locks_path == first.locks_path
+    first.release()
+    second.release()
+
+
+def test_failed_reimport_keeps_the_package(
+    tmp_edm_home, tmp_path, monkeypatch, dep_line
+):
+    import os
+
+    from depmanager.api.internal.dependency import Dependency, Props
+    from depmanager.api.internal.system import LocalSystem
+
+    system = LocalSystem()
+    source = tmp_path / "pack"
+    Dependency(dep_line("pack")).properties.to_edp_file(source / "edp.info")
+    (source / "version.txt").write_text("first")
+    system.import_folder(source)
+    props = Props()
+    props.from_edp_file(source / "edp.info")
+    folder = system.local_database.base_path / f"pack{props.hash()}"
+    (source / "version.txt").write_text("second")
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        # the installed version is moved aside, the new one cannot come in.
+        if Path(dst) == folder and not Path(src).name.endswith(".old"):
+            raise OSError("cannot rename")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        system.import_folder(source)
+    monkeypatch.undo()
+    assert (folder / "version.txt").read_text() == "first"
+    system.import_folder(source)
+    assert (folder / "version.txt").read_text() == "second"
+    assert [path.name for path in folder.parent.iterdir() if path.name[0] == "."] == []
+    system.release()
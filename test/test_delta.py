@@ -0,0 +1,155 @@
+"""
+Tests for the delta packages between two builds of the same version.
+"""
+
+from __future__ import annotations
+
+import tarfile
+from pathlib import Path
+
+import yaml
+
+from depmanager.api.internal.compression import Compression
+from depmanager.api.internal.database_local import LocalDatabase
+from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+from depmanager.api.internal.delta import (
+    apply_delta,
+    make_delta,
+    read_file_list,
+    write_file_list,
+)
+from depmanager.api.internal.reproducible import content_hash, tree_manifest
+from depmanager.api.package import PackageManager
+
+BIG = bytes(range(256)) * 1000
+
+
+def _build(folder: Path, date: str, header: bytes, extra: bool = False):
+    (folder / "lib").mkdir(parents=True, exist_ok=True)
+    (folder / "include").mkdir(exist_ok=True)
+    info = {
+        "name": "pack",
+        "version": "1.0.0",
+        "os": "Linux",
+        "arch": "x86_64",
+        "kind": "static",
+        "abi": "gnu",
+        "build_date": date,
+        "dependencies": [],
+    }
+    (folder / "info.yaml").write_text(yaml.dump(info))
+    (folder / "lib" / "libpack.a").write_bytes(BIG)
+    (folder / "include" / "pack.h").write_bytes(header)
+    old = folder / "include" / "old.h"
+    if extra:
+        (folder / "include" / "new.h").write_bytes(b"new")
+        old.unlink(missing_ok=True)
+    else:
+        old.write_bytes(b"old")
+    return folder
+
+
+def _base(folder: Path):
+    manifest = tree_manifest(folder)
+    return content_hash(manifest), manifest
+
+
+def test_delta_carries_only_the_changes(tmp_path):
+    old = _build(tmp_path / "a", "2024-01-01T00:00:00+00:00", b"v1")
+    new = _build(tmp_path / "b", "2024-01-02T00:00:00+00:00", b"v2", extra=True)
+    delta = tmp_path / "pack.delta.tgz"
+    assert make_delta(new, tree_manifest(new), _base(old), delta)
+    with tarfile.open(delta, "r:gz") as archive:
+        names = archive.getnames()
+    assert names == [".edm-delta", "include/new.h", "include/pack.h", "info.yaml"]
+
+    content = apply_delta(old, _base(old)[0], delta, tmp_path / "c")
+    assert content == _base(new)[0]
+    assert not (tmp_path / "c" / "include" / "old.h").exists()
+    assert not (tmp_path / "c" / ".edm-delta").exists()
+    # the base build is left untouched.
+    assert (old / "include" / "pack.h").read_bytes() == b"v1"
+    assert apply_delta(old, "0" * 64, delta, tmp_path / "d") is None
+
+
+def test_large_changes_give_no_delta(tmp_path):
+    old = _build(tmp_path / "a", "2024-01-01T00:00:00+00:00", b"v1")
+    new = _build(tmp_path / "b", "2024-01-02T00:00:00+00:00", b"v2")
+    (new / "lib" / "libpack.a").write_bytes(BIG[::-1])
+    assert not make_delta(new, tree_manifest(new), _base(old), tmp_path / "d.tgz")
+
+
+def test_file_list_round_trip(tmp_path):
+    tree = _build(tmp_path / "a", "2024-01-01T00:00:00+00:00", b"v1")
+    write_file_list(tree_manifest(tree), tmp_path / "list")
+    assert read_file_list(tmp_path / "list") == _base(tree)
+    (tmp_path / "bad").write_text("garbage\n")
+    assert read_file_list(tmp_path / "bad") is None
+
+
+class FakeSystem:
+    def __init__(self, data: Path, remote, tmp: Path):
+        self.local_database = LocalDatabase(data)
+        self.remote_database = {"remote": remote}
+        self.default_remote = "remote"
+        self.temp_path = tmp
+        self.stream_push = True
+        self.stream_install = False
+        self.archive_cache = None
+        self.race_mirrors = False
+        self.compression = Compression()
+
+    def record_transfers(self, transfers):
+        self.transfers = transfers
+
+    def lock_package(self, key, blocking=True):
+        return True
+
+    def unlock_package(self, key):
+        pass
+
+
+def _manager(system):
+    pm = PackageManager.__new__(PackageManager)
+    pm._PackageManager__sys = system
+    return pm
+
+
+def test_nightly_build_is_pulled_as_a_delta(tmp_path, monkeypatch):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    remote.apply_deltas({"deltas": True})
+    tmp = tmp_path / "tmp"
+    tmp.mkdir()
+    # the builder pushes build A, then build B of the same version.
+    build = _build(tmp_path / "builder" / "pack", "2024-01-01T00:00:00+00:00", b"v1")
+    builder = _manager(FakeSystem(build.parent, remote, tmp))
+    first = builder.add_list_to_remote([{"name": "pack"}], "remote")
+    assert len(first) == 1 and first[0].delta_base == ""
+    remote.delete(first[0])
+    _build(build, "2024-01-02T00:00:00+00:00", b"v2", extra=True)
+    builder = _manager(FakeSystem(build.parent, remote, tmp))
+    second = builder.add_list_to_remote([{"name": "pack"}], "remote")
+    assert second[0].delta_base == first[0].content
+    assert (tmp_path / "remote" / remote.delta_name(second[0])).exists()
+    assert list(tmp.iterdir()) == []
+
+    # a client holding build A downloads the delta only.
+    _build(tmp_path / "client" / "pack", "2024-01-01T00:00:00+00:00", b"v1")
+    client = _manager(FakeSystem(tmp_path / "client", remote, tmp))
+    installed = []
+    monkeypatch.setattr(
+        client,
+        "add_from_location",
+        lambda path, link=False: installed.append(_base(path)[0]),
+    )
+    fetched = []
+    monkeypatch.setattr(remote, "fetch", lambda dep, *args: fetched.append(dep))
+    plan = remote.query({"name": "pack"})
+    assert plan[0].delta_base == first[0].content
+    assert len(client.install_plan(plan, "remote")) == 1
+    assert installed == [second[0].content]
+    assert fetched == []
+    # without the base build, the full archive is downloaded.
+    stranger = _manager(FakeSystem(tmp_path / "stranger", remote, tmp))
+    stranger.install_plan(plan, "remote")
+    assert len(fetched) == 1
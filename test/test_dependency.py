@@ -224,3 +224,38 @@ class TestDependencyVersionCompare:
         assert d.version_greater("2.5.0") is False
         assert d.version_greater("3.0.0") is False
         assert d.version_greater("") is True
+
+
+class TestDependencyIntegrity:
+    def test_catalog_line_round_trip(self, dep_line):
+        line = dep_line("x", "1.0")
+        d = Dependency(f"{line} | deps: [] # sha256: abc123 | size: 42")
+        assert d.sha256 == "abc123"
+        assert d.size == 42
+        assert d.properties.get_as_str() == line
+        assert d.catalog_str() == f"{line} | deps: [] # sha256: abc123 | size: 42"
+
+    def test_integrity_fields_keep_dependencies(self, dep_line):
+        line = dep_line("x", "1.0")
+        d = Dependency(f"{line} | deps: [{{'name': 'y'}}] # sha256: ab | size: 1")
+        assert d.get_dependency_list() == [{"name": "y"}]
+        assert d.sha256 == "ab"
+
+    def test_former_parser_reads_catalog_line(self, dep_line, caplog):
+        d = Dependency(dep_line("x", "1.0"))
+        d.properties.dependencies = [{"name": "y"}]
+        d.sha256 = "ab"
+        d.size = 1
+        d.content = "cd"
+        # Props.from_str is the parser of the released versions.
+        props = Props(d.catalog_str())
+        assert props == d.properties
+        assert props.dependencies == [{"name": "y"}]
+        assert "Invalid dependencies format" not in caplog.text
+
+    def test_line_without_integrity(self, dep_line):
+        line = dep_line("x", "1.0")
+        d = Dependency(line)
+        assert d.sha256 == ""
+        assert d.integrity_str() == ""
+        assert d.check_integrity(None)
@@ -0,0 +1,152 @@
+"""
+Tests for the archive extraction: parallel zip, single pass tar, data filter.
+"""
+
+from __future__ import annotations
+
+import io
+import tarfile
+from pathlib import Path
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from depmanager.api.internal.compression import Compression
+from depmanager.api.internal.extraction import (
+    extract_tar,
+    extract_tar_file,
+    extract_zip,
+)
+from depmanager.api.package import PackageManager
+
+FILES = {
+    "edp.info": b"name = pack\n",
+    "include/pack.h": b"#pragma once\n" * 100,
+    "lib/libpack.a": bytes(range(256)) * 4000,
+    "lib/cmake/pack/packConfig.cmake": b"set(PACK_FOUND TRUE)\n",
+}
+
+
+def _content(folder: Path):
+    return {
+        path.relative_to(folder).as_posix(): path.read_bytes()
+        for path in folder.rglob("*")
+        if path.is_file()
+    }
+
+
+def _tar(archive: Path, members):
+    with open(archive, "wb") as fp, Compression().writer(fp) as writer, tarfile.open(
+        fileobj=writer, mode="w|"
+    ) as tar:
+        for info, data in members:
+            tar.addfile(info, io.BytesIO(data) if data is not None else None)
+
+
+def _file(name: str, data: bytes, mode: int = 0o644):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = 1700000000
+    return info, data
+
+
+def _link(name: str, target: str):
+    info = tarfile.TarInfo(name)
+    info.type, info.linkname = tarfile.SYMTYPE, target
+    return info, None
+
+
+def test_zip_extraction_on_several_threads(tmp_path):
+    archive = tmp_path / "pack.zip"
+    with ZipFile(archive, "w", ZIP_DEFLATED) as zf:
+        zf.writestr("lib/cmake/", b"")
+        for name, data in FILES.items():
+            zf.writestr(name, data)
+    seen = []
+    report = extract_zip(
+        archive, tmp_path / "out", lambda size, total: seen.append((size, total)), 3
+    )
+    assert _content(tmp_path / "out") == FILES
+    assert (report.files, report.size) == (len(FILES), sum(map(len, FILES.values())))
+    assert sum(size for size, _ in seen) == report.size
+    assert {total for _, total in seen} == {report.size}
+
+
+def test_tar_extraction_in_a_single_pass(tmp_path):
+    archive = tmp_path / "pack.tgz"
+    script = tarfile.TarInfo("bin/run")
+    script.size, script.mode = 3, 0o4777
+    _tar(
+        archive,
+        [_file(name, data) for name, data in FILES.items()]
+        + [(script, b"run"), _link("lib/libpack.so", "libpack.a")],
+    )
+    seen = []
+    report = extract_tar_file(
+        archive, tmp_path / "out", lambda size, total: seen.append(size)
+    )
+    out = tmp_path / "out"
+    assert report.files == len(FILES) + 1
+    assert (out / "lib" / "libpack.so").is_symlink()
+    assert (out / "lib" / "libpack.so").read_bytes() == FILES["lib/libpack.a"]
+    assert (out / "edp.info").stat().st_mtime == 1700000000
+    # no setuid bit nor write permission for group and others.
+    assert (out / "bin" / "run").stat().st_mode & 0o7777 == 0o755
+    assert sum(seen) == archive.stat().st_size
+
+
+@pytest.mark.parametrize(
+    "member",
+    [
+        _file("../escape.txt", b"x"),
+        _link("evil", "/etc/passwd"),
+        _link("evil", "../../outside"),
+    ],
+)
+def test_tar_members_leaving_the_destination_are_refused(tmp_path, member):
+    archive = tmp_path / "evil.tgz"
+    _tar(archive, [member])
+    with pytest.raises(tarfile.TarError):
+        with tarfile.open(archive, "r:gz") as tar:
+            extract_tar(tar, tmp_path / "out")
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_tar_absolute_members_stay_in_the_destination(tmp_path):
+    archive = tmp_path / "absolute.tgz"
+    _tar(archive, [_file("/absolute.txt", b"x")])
+    with tarfile.open(archive, "r:gz") as tar:
+        extract_tar(tar, tmp_path / "out")
+    assert (tmp_path / "out" / "absolute.txt").read_bytes() == b"x"
+
+
+def test_zip_members_leaving_the_destination_are_refused(tmp_path):
+    archive = tmp_path / "evil.zip"
+    with ZipFile(archive, "w") as zf:
+        zf.writestr("../escape.txt", b"x")
+    with pytest.raises(ValueError):
+        extract_zip(archive, tmp_path / "out")
+    assert not (tmp_path / "escape.txt").exists()
+
+
+class FakeSystem:
+    def __init__(self, temp_path: Path):
+        self.temp_path = temp_path
+        self.imported = []
+
+    def import_folder(self, source: Path, link: bool = False):
+        self.imported.append(_content(source))
+
+
+def test_add_from_location_extracts_zip(tmp_path):
+    archive = tmp_path / "pack.zip"
+    with ZipFile(archive, "w", ZIP_DEFLATED) as zf:
+        for name, data in FILES.items():
+            zf.writestr(name, data)
+    system = FakeSystem(tmp_path / "tmp")
+    pm = PackageManager.__new__(PackageManager)
+    pm._PackageManager__sys = system
+    pm.add_from_location(archive)
+    assert system.imported == [FILES]
+    assert not (tmp_path / "tmp" / "pack").exists()
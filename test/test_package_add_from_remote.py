@@ -53,6 +53,22 @@ class FakeRemote:
         self.pull_calls.append(dep.properties.name)
         return self.pull_returns
 
+    # transfer contract used by the TransferManager
+    valid_shape = True
+    max_transfers = 1
+    streaming = False
+    deltas = False
+
+    def archive_size(self, dep):
+        return 0
+
+    def package_folder(self, dep):
+        return None
+
+    def fetch(self, dep, destination, callback=None, checksum=None):
+        self.pull(dep, destination)
+        return None
+
 
 class FakeLocalDB:
     def __init__(self, present_names: set | None = None):
@@ -71,10 +87,22 @@ class FakeSystem:
         self.local_database = local
         self.temp_path = tmp
         self.default_remote = "testremote"
+        self.stream_install = True
+        self.archive_cache = None
+        self.race_mirrors = False
 
     def get_source_list(self):
         return ["local", "testremote"]
 
+    def record_transfers(self, transfers):
+        pass
+
+    def lock_package(self, key, blocking=True):
+        return True
+
+    def unlock_package(self, key):
+        pass
+
 
 def _make_manager(sys_):
     pm = PackageManager.__new__(PackageManager)
@@ -117,8 +145,8 @@ def test_transitive_dict_dep_resolved_not_passed_raw(monkeypatch, fixture_tmp):
     # Must not raise AttributeError.
     pm.add_from_remote(root, "testremote")
 
-    # Both root and the resolved leaf get pulled — order matters (root first).
-    assert remote.pull_calls == ["root", "leaf"]
+    # Both root and the resolved leaf get pulled — dependencies first.
+    assert remote.pull_calls == ["leaf", "root"]
 
 
 def test_transitive_dep_already_local_skips_remote(monkeypatch, fixture_tmp):
@@ -169,3 +197,148 @@ def test_missing_transitive_on_remote_logs_but_does_not_crash(monkeypatch, fixtu
     pm.add_from_remote(root, "testremote")
 
     assert remote.pull_calls == ["root"]
+
+
+def _needs(*names):
+    return [
+        {
+            "name": name,
+            "version": "1.0.0",
+            "os": "Linux",
+            "arch": "x86_64",
+            "kind": "static",
+            "abi": "gnu",
+        }
+        for name in names
+    ]
+
+
+def test_plan_is_deduplicated_closure_dependencies_first(monkeypatch, fixture_tmp):
+    """A diamond app -> (left, right) -> base is planned once, base first."""
+    catalog = {}
+    for name, needs in [
+        ("app", ("left", "right")),
+        ("left", ("base",)),
+        ("right", ("base",)),
+        ("base", ()),
+    ]:
+        catalog[name] = Dependency(_dep_str(name, "1.0.0"))
+        catalog[name].properties.dependencies = _needs(*needs)
+    remote = FakeRemote(catalog)
+    pm = _make_manager(FakeSystem(remote, FakeLocalDB(), fixture_tmp))
+
+    plan = pm.plan_from_remote([catalog["app"]], "testremote")
+
+    assert [dep.properties.name for dep in plan] == ["base", "left", "right", "app"]
+    assert remote.pull_calls == []  # planning downloads nothing
+
+
+class StreamingRemote(FakeRemote):
+    """Remote whose streamed archive is not a valid one."""
+
+    streaming = True
+
+    def stream(self, dep, sink, callback=None):
+        sink.write(b"not a gzip stream")
+        return True
+
+
+def test_failed_stream_falls_back_to_archive(monkeypatch, fixture_tmp):
+    root = Dependency(_dep_str("root", "1.0.0"))
+    remote = StreamingRemote({"root": root})
+    pm = _make_manager(FakeSystem(remote, FakeLocalDB(), fixture_tmp))
+    monkeypatch.setattr(pm, "add_from_location", lambda path: None)
+
+    pm.add_from_remote(root, "testremote")
+
+    assert remote.pull_calls == ["root"]
+    assert list(fixture_tmp.iterdir()) == []
+
+
+def test_cached_archive_is_not_downloaded(monkeypatch, fixture_tmp, tmp_path):
+    from depmanager.api.internal.archive_cache import ArchiveCache
+
+    root = Dependency(_dep_str("root", "1.0.0"))
+    cache = ArchiveCache(tmp_path / "cache")
+    archive = tmp_path / "root.tgz"
+    archive.write_bytes(b"archive")
+    cache.put(root, archive)
+    remote = FakeRemote({"root": root})
+    sys_ = FakeSystem(remote, FakeLocalDB(), fixture_tmp)
+    sys_.archive_cache = cache
+    pm = _make_manager(sys_)
+    installed = []
+    monkeypatch.setattr(
+        pm, "add_from_location", lambda path: installed.append(path.read_bytes())
+    )
+
+    pm.add_from_remote(root, "testremote")
+
+    assert remote.pull_calls == []
+    assert installed == [b"archive"]
+    assert cache.entry(root).exists()
+    assert list(fixture_tmp.iterdir()) == []
+
+
+class UncompressedRemote(FakeRemote):
+    """Remote holding the packages as extracted trees."""
+
+    def __init__(self, catalog, root: Path):
+        super().__init__(catalog)
+        self.root = root
+
+    def package_folder(self, dep):
+        return self.root / dep.properties.name
+
+
+def test_uncompressed_package_is_linked(monkeypatch, fixture_tmp, tmp_path):
+    root = Dependency(_dep_str("root", "1.0.0"))
+    remote = UncompressedRemote({"root": root}, tmp_path / "trees")
+    pm = _make_manager(FakeSystem(remote, FakeLocalDB(), fixture_tmp))
+    installed = []
+    monkeypatch.setattr(
+        pm, "add_from_location", lambda path, link=False: installed.append((path, link))
+    )
+
+    pm.add_from_remote(root, "testremote")
+
+    assert remote.pull_calls == []
+    assert installed == [(tmp_path / "trees" / "root", True)]
+
+
+class LockingSystem(FakeSystem):
+    """System recording the package locks held."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.held = set()
+
+    def lock_package(self, key, blocking=True):
+        self.held.add(key)
+        return True
+
+    def unlock_package(self, key):
+        self.held.discard(key)
+
+
+def test_failed_install_releases_the_locks(monkeypatch, fixture_tmp, tmp_path):
+    from depmanager.api.internal.archive_cache import ArchiveCache
+
+    root = Dependency(_dep_str("root", "1.0.0"))
+    cache = ArchiveCache(tmp_path / "cache")
+    archive = tmp_path / "root.tgz"
+    archive.write_bytes(b"archive")
+    cache.put(root, archive)
+    sys_ = LockingSystem(FakeRemote({"root": root}), FakeLocalDB(), fixture_tmp)
+    sys_.archive_cache = cache
+    pm = _make_manager(sys_)
+
+    def broken(path):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pm, "add_from_location", broken)
+
+    with pytest.raises(OSError):
+        pm.add_from_remote(root, "testremote")
+
+    assert sys_.held == set()
@@ -0,0 +1,155 @@
+"""
+Tests for ``PackageManager.add_list_to_remote``.
+
+The packages to push and their missing dependencies must all go through a
+single ``push_batch`` call, so that the remote catalog is committed once.
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from depmanager.api.internal.compression import Compression
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.package import PackageManager
+
+
+def _sub(name: str) -> dict:
+    return {
+        "name": name,
+        "version": "1.0.0",
+        "os": "Linux",
+        "arch": "x86_64",
+        "kind": "static",
+        "abi": "gnu",
+    }
+
+
+class FakeLocalDB:
+    def __init__(self, deps):
+        self.deps = deps
+
+    def query(self, q):
+        return [dep for dep in self.deps if dep.match(q)]
+
+
+class FakeRemote:
+    def __init__(self, present=(), streaming_push=False, contents=()):
+        self.present = set(present)
+        self.contents = set(contents)
+        self.streaming_push = streaming_push
+        self.deltas = False
+        self.batches = []
+        self.items = []
+
+    def query(self, q):
+        name = q.get("name") if isinstance(q, dict) else q.properties.name
+        return [name] if name in self.present else []
+
+    def holds(self, dep):
+        return dep.content in self.contents
+
+    def push_compression(self):
+        return Compression()
+
+    def push_batch(self, items, force=False):
+        self.batches.append([dep.properties.name for dep, _ in items])
+        self.items += items
+        return [dep for dep, _ in items]
+
+
+class FakeSystem:
+    def __init__(self, local, remote, tmp):
+        self.local_database = local
+        self.remote_database = {"testremote": remote}
+        self.default_remote = "testremote"
+        self.temp_path = tmp
+        self.stream_push = True
+
+
+@pytest.fixture
+def manager_factory(tmp_path, monkeypatch):
+    def _make(local_deps, remote):
+        pm = PackageManager.__new__(PackageManager)
+        pm._PackageManager__sys = FakeSystem(FakeLocalDB(local_deps), remote, tmp_path)
+
+        pm.packed = []
+
+        def fake_pack(depp, compression=None):
+            pm.packed.append(depp.properties.name)
+            archive = tmp_path / f"{depp.properties.name}.tgz"
+            archive.write_bytes(b"data")
+            return archive
+
+        monkeypatch.setattr(pm, "pack_for_push", fake_pack)
+        return pm
+
+    return _make
+
+
+def test_dependencies_pushed_in_same_batch(manager_factory, dep_line):
+    leaf = Dependency(dep_line("leaf"))
+    root = Dependency(dep_line("root"))
+    root.properties.dependencies = [_sub("leaf")]
+    remote = FakeRemote()
+    pm = manager_factory([root, leaf], remote)
+
+    pm.add_to_remote(root, "testremote")
+
+    assert remote.batches == [["leaf", "root"]]
+
+
+def test_list_push_is_one_batch_without_duplicates(manager_factory, dep_line):
+    leaf = Dependency(dep_line("leaf"))
+    one = Dependency(dep_line("one"))
+    two = Dependency(dep_line("two"))
+    one.properties.dependencies = [_sub("leaf")]
+    two.properties.dependencies = [_sub("leaf")]
+    remote = FakeRemote()
+    pm = manager_factory([one, two, leaf], remote)
+
+    pm.add_list_to_remote([one, two], "testremote")
+
+    assert remote.batches == [["leaf", "one", "two"]]
+
+
+def test_dependency_already_on_remote_not_pushed(manager_factory, dep_line):
+    leaf = Dependency(dep_line("leaf"))
+    root = Dependency(dep_line("root"))
+    root.properties.dependencies = [_sub("leaf")]
+    remote = FakeRemote(present={"leaf"})
+    pm = manager_factory([root, leaf], remote)
+
+    pm.add_to_remote(root, "testremote")
+
+    assert remote.batches == [["root"]]
+
+
+def test_streaming_remote_receives_package_folders(manager_factory, tmp_path, dep_line):
+    leaf = Dependency(dep_line("leaf"))
+    leaf.base_path = tmp_path / "leaf"
+    remote = FakeRemote(streaming_push=True)
+    pm = manager_factory([leaf], remote)
+
+    pm.add_to_remote(leaf, "testremote")
+
+    assert pm.packed == []
+    assert [file for _, file in remote.items] == [tmp_path / "leaf"]
+
+
+def test_identical_content_is_neither_packed_nor_pushed(
+    manager_factory, tmp_path, dep_line
+):
+    from depmanager.api.internal.reproducible import tree_hash
+
+    leaf = Dependency(dep_line("leaf"))
+    leaf.base_path = tmp_path / "leaf"
+    leaf.base_path.mkdir()
+    (leaf.base_path / "libleaf.a").write_bytes(b"leaf")
+    remote = FakeRemote(contents={tree_hash(leaf.base_path)})
+    pm = manager_factory([leaf], remote)
+
+    assert pm.add_list_to_remote([leaf], "testremote") == []
+    assert pm.packed == [] and remote.batches == []
+    pm.add_list_to_remote([leaf], "testremote", force=True)
+    assert remote.batches == [["leaf"]]
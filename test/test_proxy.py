@@ -0,0 +1,256 @@
+"""
+Tests for the caching proxy of ``depmanager serve``.
+
+The proxy runs on a local port in front of a folder remote, and is used by a
+real ``RemoteDatabaseServer`` client, as an agent would.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.proxy import (
+    CachingProxy,
+    Coalescer,
+    ProxyServer,
+    code_to_dep,
+)
+
+
+class CountingFolder(RemoteDatabaseFolder):
+    """Folder remote counting (and optionally slowing) its downloads."""
+
+    def __init__(self, path, delay: float = 0.0):
+        super().__init__(path)
+        self.fetches = 0
+        self.delay = delay
+
+    def fetch(self, dep, destination, callback=None, checksum=None):
+        self.fetches += 1
+        time.sleep(self.delay)
+        return super().fetch(dep, destination, callback, checksum)
+
+
+@pytest.fixture
+def upstream(tmp_path, dep_line):
+    remote = CountingFolder(str(tmp_path / "upstream"))
+    archive = tmp_path / "liba.tgz"
+    archive.write_bytes(b"archive of liba" * 1000)
+    remote.push(Dependency(dep_line("liba")), archive)
+    return remote
+
+
+def _start(tmp_path, upstream, read_only: bool = False, cred: str = "secret"):
+    proxy = CachingProxy(
+        upstream,
+        tmp_path / "proxy",
+        1024**2,
+        read_only=read_only,
+        credentials=("writer", "secret"),
+    )
+    server = ProxyServer(proxy, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = RemoteDatabaseServer(
+        "127.0.0.1", port=server.server_address[1], user="writer", cred=cred
+    )
+    return server, client
+
+
+@pytest.fixture
+def served(tmp_path, upstream):
+    server, client = _start(tmp_path, upstream)
+    yield client
+    server.shutdown()
+    server.server_close()
+
+
+def test_code_round_trip(dep_line):
+    client = RemoteDatabaseServer("fake.server")
+    client.server_api_version = "2.1.0"
+    dep = Dependency(dep_line("liba"))
+    dep.properties.dependencies = [{"name": "libb", "version": "2.0"}]
+    dep.sha256 = "ab" * 32
+    dep.size = 12
+    decoded = code_to_dep(client.dep_to_code(dep))
+    assert decoded == dep
+    assert decoded.properties.dependencies == dep.properties.dependencies
+    assert (decoded.sha256, decoded.size) == (dep.sha256, dep.size)
+    assert code_to_dep({"name": "liba", "version": "1", "os": "?"}) is None
+
+
+def test_query_and_pull_through_proxy(served, upstream, tmp_path):
+    found = served.query({"name": "liba"})
+    assert [dep.properties.name for dep in found] == ["liba"]
+    assert found[0].sha256 != ""
+    for attempt in range(2):
+        name = served.pull(found[0], tmp_path / f"pull{attempt}")
+        assert (tmp_path / f"pull{attempt}" / name).read_bytes() == (
+            b"archive of liba" * 1000
+        )
+    assert upstream.fetches == 1
+
+
+def test_concurrent_pulls_share_one_download(tmp_path, dep_line):
+    upstream = CountingFolder(str(tmp_path / "upstream"), delay=0.3)
+    archive = tmp_path / "liba.tgz"
+    archive.write_bytes(b"liba")
+    upstream.push(Dependency(dep_line("liba")), archive)
+    server, client = _start(tmp_path, upstream)
+    try:
+        dep = client.query({"name": "liba"})[0]
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda i=i: results.append(
+                    client.pull(dep, tmp_path / f"pull{i}")
+                )
+            )
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(results) == 4 and None not in results
+    assert upstream.fetches == 1
+
+
+def test_push_and_delete_reach_upstream(served, tmp_path, dep_line):
+    served.query()
+    archive = tmp_path / "libb.tgz"
+    archive.write_bytes(b"archive of libb")
+    served.push(Dependency(dep_line("libb")), archive)
+    package = tmp_path / "libc"
+    (package / "include").mkdir(parents=True)
+    (package / "include" / "c.h").write_text("int c();")
+    served.streaming_push = True
+    served.push_batch([(Dependency(dep_line("libc")), package)])
+    reader = RemoteDatabaseFolder(str(tmp_path / "upstream"))
+    assert sorted(dep.properties.name for dep in reader.query()) == [
+        "liba",
+        "libb",
+        "libc",
+    ]
+    served.delete(Dependency(dep_line("liba")))
+    reader = RemoteDatabaseFolder(str(tmp_path / "upstream"))
+    assert sorted(dep.properties.name for dep in reader.query()) == ["libb", "libc"]
+    served.connected = False
+    served.initiated = False
+    assert sorted(dep.properties.name for dep in served.query()) == ["libb", "libc"]
+
+
+def test_read_only_proxy_refuses_push(tmp_path, upstream, monkeypatch, dep_line):
+    monkeypatch.chdir(tmp_path)  # the refusal is written to error.log
+    server, client = _start(tmp_path, upstream, read_only=True)
+    try:
+        client.query()
+        archive = tmp_path / "libb.tgz"
+        archive.write_bytes(b"archive of libb")
+        assert client.push_batch([(Dependency(dep_line("libb")), archive)]) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+    reader = RemoteDatabaseFolder(str(tmp_path / "upstream"))
+    assert [dep.properties.name for dep in reader.query()] == ["liba"]
+
+
+def test_proxy_refuses_unauthenticated_writes(
+    tmp_path, upstream, monkeypatch, dep_line
+):
+    monkeypatch.chdir(tmp_path)  # the refusal is written to error.log
+    server, client = _start(tmp_path, upstream, cred="guess")
+    try:
+        client.query()
+        archive = tmp_path / "libb.tgz"
+        archive.write_bytes(b"archive of libb")
+        assert client.push_batch([(Dependency(dep_line("libb")), archive)]) == []
+        assert not client.delete(Dependency(dep_line("liba")))
+    finally:
+        server.shutdown()
+        server.server_close()
+    reader = RemoteDatabaseFolder(str(tmp_path / "upstream"))
+    assert [dep.properties.name for dep in reader.query()] == ["liba"]
+    proxy = CachingProxy(upstream, tmp_path / "proxy", 1024**2, read_only=False)
+    assert not proxy.authorized("Basic d3JpdGVyOnNlY3JldA==")
+
+
+def test_catalog_survives_upstream_outage(tmp_path, upstream):
+    first = CachingProxy(upstream, tmp_path / "proxy", 1024**2)
+    assert [dep.properties.name for dep in first.catalog()] == ["liba"]
+    broken = RemoteDatabaseFolder(str(tmp_path / "missing"))
+    broken.connect = lambda: setattr(broken, "valid_shape", False)
+    second = CachingProxy(broken, tmp_path / "proxy", 1024**2)
+    assert [dep.properties.name for dep in second.catalog()] == ["liba"]
+
+
+def test_dependencies_go_through_proxy(tmp_path, upstream, dep_line):
+    dep = Dependency(dep_line("libb"))
+    dep.properties.dependencies = [{"name": "liba", "version": "1.0.0"}]
+    archive = tmp_path / "libb.tgz"
+    archive.write_bytes(b"libb")
+    upstream.push(dep, archive)
+    server, client = _start(tmp_path, upstream)
+    try:
+        found = client.query({"name": "libb"})
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert found[0].properties.dependencies == dep.properties.dependencies
+    assert found[0].sha256 != ""
+    # the saved catalog keeps them too.
+    broken = RemoteDatabaseFolder(str(tmp_path / "missing"))
+    broken.connect = lambda: setattr(broken, "valid_shape", False)
+    saved = CachingProxy(broken, tmp_path / "proxy", 1024**2)
+    (libb,) = [item for item in saved.catalog() if item.properties.name == "libb"]
+    assert libb.properties.dependencies == dep.properties.dependencies
+    assert libb.sha256 == found[0].sha256
+
+
+def test_coalescer_runs_once():
+    coalescer = Coalescer()
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(coalescer.run("key", work)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["done"] * 3
+    assert len(calls) == 1
+
+
+def test_read_only_option_does_not_share_the_data_lock():
+    from depmanager.manager import get_parser
+
+    args = get_parser("serve").parse_args(["serve", "--read-only"])
+    assert args.read_only and args.shared_lock is False
+
+
+def test_serve_defaults_to_a_local_read_only_proxy():
+    from depmanager.manager import get_parser
+
+    args = get_parser("serve").parse_args(["serve"])
+    assert args.read_only and args.host == "127.0.0.1"
+    args = get_parser("serve").parse_args(["serve", "--writable", "-l", "writer"])
+    assert not args.read_only and args.login == "writer"
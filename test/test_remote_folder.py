@@ -0,0 +1,261 @@
+"""
+Tests for the journaled catalog of ``RemoteDatabaseFolder``.
+
+Several remote instances pointing at the same folder stand in for concurrent
+writers sharing a network folder: each one keeps its own (possibly stale)
+in-memory catalog, none of them may lose the others' updates.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import tarfile
+
+import pytest
+
+import depmanager.api.internal.database_remote_folder as folder_module
+from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.streaming import StreamExtractor
+from depmanager.api.internal.transfer import TransferManager
+
+
+def _push(remote: RemoteDatabaseFolder, tmp_path, line: str):
+    dep = Dependency(line)
+    archive = tmp_path / f"{dep.properties.name}.tgz"
+    archive.write_bytes(b"data")
+    remote.push(dep, archive)
+
+
+def _names(remote: RemoteDatabaseFolder):
+    return sorted(dep.properties.name for dep in remote.query())
+
+
+def test_concurrent_writers_do_not_lose_updates(tmp_path, dep_line):
+    writer_a = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    writer_b = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    writer_a.query()
+    writer_b.query()  # both views loaded before any push
+    _push(writer_a, tmp_path, dep_line("liba"))
+    _push(writer_b, tmp_path, dep_line("libb"))
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert _names(reader) == ["liba", "libb"]
+
+
+def test_push_appends_to_journal_only(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    assert remote.snapshot_file().read_text() == ""
+    journal = remote.journal_file(remote.get_generation()).read_text()
+    digest = hashlib.sha256(b"data").hexdigest()
+    assert journal == f"+ {dep_line('liba')} | deps: [] # sha256: {digest} | size: 4\n"
+
+
+def test_delete_is_replayed(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    _push(remote, tmp_path, dep_line("libb"))
+    remote.delete(Dependency(dep_line("liba")))
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert _names(reader) == ["libb"]
+
+
+def test_torn_record_is_ignored(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    with open(remote.journal_file(remote.get_generation()), "a") as fp:
+        fp.write(f"+ {dep_line('half')}")
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert _names(reader) == ["liba"]
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path, monkeypatch, dep_line):
+    monkeypatch.setattr(folder_module, "journal_compaction_threshold", 3)
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    for name in ["liba", "libb", "libc"]:
+        _push(remote, tmp_path, dep_line(name))
+    assert remote.get_generation() == 1
+    assert [gen for gen, _ in remote.get_journals()] == []
+    snapshot = remote.snapshot_file().read_text().splitlines()
+    assert len(snapshot) == 3
+    _push(remote, tmp_path, dep_line("libd"))
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert _names(reader) == ["liba", "libb", "libc", "libd"]
+
+
+class CompactedWhileRead(RemoteDatabaseFolder):
+    """Folder remote whose catalog is compacted by another writer while read."""
+
+    def __init__(self, path, after_listing: bool):
+        super().__init__(path)
+        self.after_listing = after_listing
+        self.compactor = RemoteDatabaseFolder(path)
+
+    def get_journals(self):
+        if not self.after_listing:
+            self.compact_once()
+        journals = super().get_journals()
+        if self.after_listing:
+            self.compact_once()
+        return journals
+
+    def compact_once(self):
+        if self.compactor is not None:
+            compactor, self.compactor = self.compactor, None
+            assert compactor.compact()
+
+
+@pytest.mark.parametrize("after_listing", [False, True])
+def test_read_during_compaction_keeps_records(tmp_path, dep_line, after_listing):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    for name in ["liba", "libb"]:
+        _push(remote, tmp_path, dep_line(name))
+    reader = CompactedWhileRead(str(tmp_path / "remote"), after_listing)
+    assert _names(reader) == ["liba", "libb"]
+    assert reader.compactor is None
+
+
+def test_compaction_skipped_when_locked(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    (remote.destination / "deplist.compact.lock").touch()
+    assert remote.compact() is False
+    assert remote.get_generation() == 0
+
+
+def test_push_batch_commits_catalog_once(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    items = []
+    for name in ["liba", "libb", "libc"]:
+        archive = tmp_path / f"{name}.tgz"
+        archive.write_bytes(b"data")
+        items.append((Dependency(dep_line(name)), archive))
+    commits = []
+    original = remote.append_journal
+    remote.append_journal = lambda records: commits.append(records) or original(records)
+    pushed = remote.push_batch(items)
+    assert len(pushed) == 3
+    assert len(commits) == 1
+    assert (remote.destination / "libb" / f"{pushed[1].properties.hash()}.tgz").exists()
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert _names(reader) == ["liba", "libb", "libc"]
+
+
+def test_push_batch_skips_existing_unless_forced(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    archive = tmp_path / "liba.tgz"
+    assert remote.push_batch([(Dependency(dep_line("liba")), archive)]) == []
+    forced = remote.push_batch([(Dependency(dep_line("liba")), archive)], force=True)
+    assert len(forced) == 1
+    assert len(remote.query({"name": "liba"})) == 1
+
+
+def _archive(file, content: bytes):
+    with tarfile.open(file, "w:gz") as tar:
+        info = tarfile.TarInfo("edp.info")
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+
+
+def test_stream_extracts_without_local_archive(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    archive = tmp_path / "liba.tgz"
+    _archive(archive, b"name: lib")
+    dep = Dependency(dep_line("liba"))
+    remote.push(dep, archive)
+    archive.unlink()
+    manager = TransferManager(show_progress=False)
+    transfer = manager.add_stream(remote, dep, StreamExtractor(tmp_path / "out"))
+    manager.run()
+    assert transfer.success
+    assert transfer.bytes == remote.archive_size(dep)
+    assert (tmp_path / "out" / "edp.info").read_bytes() == b"name: lib"
+    assert not archive.exists()
+
+
+def test_push_records_archive_checksum(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    digest = hashlib.sha256(b"data").hexdigest()
+    journal = remote.journal_file(remote.get_generation()).read_text()
+    assert journal == f"+ {dep_line('liba')} | deps: [] # sha256: {digest} | size: 4\n"
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert reader.query()[0].sha256 == digest
+
+
+def test_corrupted_archive_is_rejected(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    _push(remote, tmp_path, dep_line("liba"))
+    dep = Dependency(dep_line("liba"))
+    (remote.destination / remote.archive_name(dep)).write_bytes(b"dat!")
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert reader.pull(dep, tmp_path / "out") is None
+    assert list((tmp_path / "out").iterdir()) == []
+
+
+def test_stream_rejects_archive_not_matching_catalog(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    archive = tmp_path / "liba.tgz"
+    _archive(archive, b"name: lib")
+    dep = Dependency(dep_line("liba"))
+    remote.push(dep, archive)
+    # another valid archive replaces the pushed one.
+    _archive(remote.destination / remote.archive_name(dep), b"name: bad")
+    manager = TransferManager(show_progress=False)
+    transfer = manager.add_stream(remote, dep, StreamExtractor(tmp_path / "out"))
+    manager.run()
+    assert not transfer.success
+
+
+def test_uncompressed_remote_stores_trees(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"), uncompressed=True)
+    archive = tmp_path / "liba.tgz"
+    _archive(archive, b"name: lib")
+    dep = Dependency(dep_line("liba"))
+    remote.push(dep, archive)
+    tree = remote.package_folder(dep)
+    assert (tree / "edp.info").read_bytes() == b"name: lib"
+    assert not (remote.destination / remote.archive_name(dep)).exists()
+    # the catalog entry has no archive checksum.
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert reader.query()[0].sha256 == ""
+    # a compressed client can still get an archive.
+    file = reader.fetch(reader.query()[0], tmp_path / "out")
+    with tarfile.open(file) as tar:
+        assert tar.getnames() == ["edp.info"]
+    reader.delete(dep)
+    assert remote.package_folder(dep) is None
+
+
+def _package(folder):
+    (folder / "lib").mkdir(parents=True)
+    (folder / "edp.info").write_bytes(b"name: lib")
+    (folder / "lib" / "liba.a").write_bytes(b"static library")
+    return folder
+
+
+def test_folder_push_is_compressed_while_written(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    dep = Dependency(dep_line("liba"))
+    pushed = remote.push_batch([(dep, _package(tmp_path / "pkg"))])
+    assert len(pushed) == 1
+    archive = remote.destination / remote.archive_name(dep)
+    assert dep.sha256 == hashlib.sha256(archive.read_bytes()).hexdigest()
+    assert dep.size == archive.stat().st_size
+    with tarfile.open(archive) as tar:
+        assert sorted(tar.getnames()) == ["edp.info", "lib/liba.a"]
+    assert [path.name for path in archive.parent.iterdir()] == [archive.name]
+    reader = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    assert reader.pull(reader.query()[0], tmp_path / "out") is not None
+
+
+def test_folder_push_to_uncompressed_remote_is_extracted(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"), uncompressed=True)
+    dep = Dependency(dep_line("liba"))
+    remote.push_batch([(dep, _package(tmp_path / "pkg"))])
+    tree = remote.package_folder(dep)
+    assert (tree / "lib" / "liba.a").read_bytes() == b"static library"
+    assert dep.sha256 == ""
+    assert [path.name for path in tree.parent.iterdir()] == [tree.name]
@@ -0,0 +1,267 @@
+"""
+Tests for the session handling of ``RemoteDatabaseFtp``.
+
+``ftplib.FTP`` is replaced by an in-memory fake recording the commands it
+receives, so the tests can count round-trips: directory listings, ``MKD``,
+keep-alive ``NOOP`` and reconnections.
+"""
+
+from __future__ import annotations
+
+import ftplib
+import hashlib
+import io
+import tarfile
+import threading
+import time
+
+import pytest
+
+from depmanager.api.internal import resilience
+from depmanager.api.internal.database_remote_ftp import RemoteDatabaseFtp
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.transfer import TransferManager
+
+
+class FakeFTP:
+    """In-memory FTP server shared by every session."""
+
+    files: dict = {}
+    dirs: set = set()
+    commands: list = []
+    sessions: int = 0
+    mlsd_supported = True
+    drop_next = False
+    refuse = False
+    refused: int = 0
+    lock = threading.Lock()
+    active: int = 0
+    max_active: int = 0
+    delay: float = 0.0
+    rests: list = []
+    cut_after = None
+
+    def connect(self, host, port, timeout=None):
+        if FakeFTP.refuse:
+            FakeFTP.refused += 1
+            raise ConnectionRefusedError("connection refused")
+        with FakeFTP.lock:
+            FakeFTP.sessions += 1
+
+    def login(self, user, passwd):
+        pass
+
+    def cwd(self, path):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def voidcmd(self, cmd):
+        FakeFTP.commands.append(cmd)
+        if FakeFTP.drop_next:
+            FakeFTP.drop_next = False
+            raise EOFError("connection dropped")
+        return "200 OK"
+
+    def _children(self, path):
+        prefix = f"{path}/" if path else ""
+        names = set()
+        for entry in FakeFTP.dirs | set(FakeFTP.files):
+            if entry.startswith(prefix) and "/" not in entry[len(prefix) :]:
+                names.add(entry[len(prefix) :])
+        return names
+
+    def mlsd(self, path="", facts=None):
+        FakeFTP.commands.append("MLSD")
+        if not FakeFTP.mlsd_supported:
+            raise ftplib.error_perm("500 unknown command")
+        return [(name, {"type": "dir"}) for name in self._children(path)]
+
+    def nlst(self, *args):
+        FakeFTP.commands.append("NLST")
+        return sorted(self._children(args[0] if args else ""))
+
+    def mkd(self, path):
+        FakeFTP.commands.append("MKD")
+        FakeFTP.dirs.add(path)
+
+    def _transfer(self, cmd):
+        with FakeFTP.lock:
+            FakeFTP.commands.append(cmd)
+            FakeFTP.active += 1
+            FakeFTP.max_active = max(FakeFTP.max_active, FakeFTP.active)
+        time.sleep(FakeFTP.delay)
+        with FakeFTP.lock:
+            FakeFTP.active -= 1
+
+    def storbinary(self, cmd, handler, blocksize=8192, callback=None):
+        self._transfer("STOR")
+        data = handler.read()
+        FakeFTP.files[cmd.split(" ", 1)[1]] = data
+        if callback:
+            callback(data)
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        self._transfer("RETR")
+        FakeFTP.rests.append(rest)
+        data = FakeFTP.files[cmd.split(" ", 1)[1]][rest or 0 :]
+        if FakeFTP.cut_after is not None:
+            callback(data[: FakeFTP.cut_after])
+            FakeFTP.cut_after = None
+            raise EOFError("connection dropped")
+        callback(data)
+
+    def size(self, path):
+        if path not in FakeFTP.files:
+            raise ftplib.error_perm("550 no such file")
+        return len(FakeFTP.files[path])
+
+    def delete(self, path):
+        FakeFTP.files.pop(path)
+
+
+@pytest.fixture
+def remote(monkeypatch):
+    FakeFTP.files = {}
+    FakeFTP.dirs = set()
+    FakeFTP.commands = []
+    FakeFTP.sessions = 0
+    FakeFTP.mlsd_supported = True
+    FakeFTP.drop_next = False
+    FakeFTP.refuse = False
+    FakeFTP.refused = 0
+    FakeFTP.active = 0
+    FakeFTP.max_active = 0
+    FakeFTP.delay = 0.0
+    FakeFTP.rests = []
+    FakeFTP.cut_after = None
+    monkeypatch.setattr(RemoteDatabaseFtp, "ftp_factory", FakeFTP)
+    monkeypatch.setattr(resilience, "backoff_base", 0.0)
+    return RemoteDatabaseFtp("ftp.example.com/packages")
+
+
+def _upload_many(remote, tmp_path, count=100, names=10):
+    source = tmp_path / "archive.tgz"
+    source.write_bytes(b"data")
+    for i in range(count):
+        remote.send_file(source, f"lib{i % names}/{i}.tgz")
+
+
+def test_directories_listed_once_per_session(remote, tmp_path):
+    _upload_many(remote, tmp_path)
+    assert FakeFTP.commands.count("MLSD") == 1
+    assert FakeFTP.commands.count("MKD") == 10
+    assert FakeFTP.commands.count("STOR") == 100
+    assert FakeFTP.sessions == 1
+
+
+def test_nlst_fallback_without_mlsd(remote, tmp_path):
+    FakeFTP.mlsd_supported = False
+    FakeFTP.dirs.add("lib0")
+    _upload_many(remote, tmp_path, count=20, names=2)
+    assert FakeFTP.commands.count("NLST") == 1
+    assert FakeFTP.commands.count("MKD") == 1
+
+
+def test_idle_session_checked_with_noop(remote, tmp_path, monkeypatch):
+    monkeypatch.setattr(RemoteDatabaseFtp, "keepalive_interval", -1.0)
+    _upload_many(remote, tmp_path, count=3, names=1)
+    assert FakeFTP.commands.count("NOOP") == 2
+    assert FakeFTP.sessions == 1
+
+
+def test_dropped_session_reconnects(remote, tmp_path, monkeypatch):
+    _upload_many(remote, tmp_path, count=1, names=1)
+    monkeypatch.setattr(RemoteDatabaseFtp, "keepalive_interval", -1.0)
+    FakeFTP.drop_next = True
+    remote.get_file("lib0/0.tgz", tmp_path)
+    assert FakeFTP.sessions == 2
+    assert (tmp_path / "0.tgz").read_bytes() == b"data"
+
+
+def test_unreachable_server_is_skipped(remote):
+    FakeFTP.refuse = True
+    assert remote.query() == []
+    assert FakeFTP.refused == remote.attempts
+    assert remote.breaker.is_open()
+    assert remote.query() == []
+    assert FakeFTP.refused == remote.attempts
+    assert not remote.valid_shape
+
+
+def test_batch_push_uses_the_session_pool(remote, tmp_path, dep_line):
+    FakeFTP.files["deplist.txt"] = b""
+    FakeFTP.delay = 0.02
+    source = tmp_path / "archive.tgz"
+    source.write_bytes(b"data")
+    items = [(Dependency(dep_line(f"lib{i}")), source) for i in range(12)]
+    pushed = remote.push_batch(items)
+    assert len(pushed) == 12
+    assert FakeFTP.commands.count("STOR") == 13  # archives + one catalog
+    assert 1 < FakeFTP.max_active <= remote.connections
+    assert FakeFTP.sessions <= remote.connections
+
+
+def test_folder_push_is_compressed_while_sent(remote, tmp_path, dep_line):
+    FakeFTP.files["deplist.txt"] = b""
+    package = tmp_path / "pkg"
+    package.mkdir()
+    (package / "edp.info").write_bytes(b"name: lib")
+    dep = Dependency(dep_line("liba"))
+    assert len(remote.push_batch([(dep, package)])) == 1
+    data = FakeFTP.files[remote.archive_name(dep)]
+    assert dep.sha256 == hashlib.sha256(data).hexdigest()
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+        assert tar.getnames() == ["edp.info"]
+    assert remote.query()[0].size == len(data)
+
+
+def test_batch_pull_runs_in_parallel(remote, tmp_path, dep_line):
+    deps = [Dependency(dep_line(f"lib{i}")) for i in range(8)]
+    FakeFTP.files["deplist.txt"] = "".join(
+        f"{dep.properties.get_as_str()}\n" for dep in deps
+    ).encode()
+    for dep in deps:
+        FakeFTP.files[f"{dep.properties.name}/{dep.properties.hash()}.tgz"] = b"x"
+    FakeFTP.delay = 0.02
+    # the package manager queues the pulls of a plan this way.
+    manager = TransferManager()
+    for dep in deps:
+        manager.add_pull(remote, remote.query(dep)[0], tmp_path)
+    manager.run()
+    assert FakeFTP.commands.count("RETR") == 9
+    assert FakeFTP.max_active > 1
+    assert all((tmp_path / f"{dep.properties.hash()}.tgz").exists() for dep in deps)
+
+
+def test_single_connection_is_sequential(remote, tmp_path, dep_line):
+    remote = RemoteDatabaseFtp("ftp.example.com", connections=1)
+    FakeFTP.files["deplist.txt"] = b""
+    FakeFTP.delay = 0.01
+    source = tmp_path / "archive.tgz"
+    source.write_bytes(b"data")
+    remote.push_batch([(Dependency(dep_line(f"lib{i}")), source) for i in range(4)])
+    assert FakeFTP.commands.count("STOR") == 5
+    assert FakeFTP.max_active == 1
+    assert FakeFTP.sessions == 1
+
+
+def test_interrupted_download_resumes_with_rest(remote, tmp_path):
+    FakeFTP.files["lib0/0.tgz"] = bytes(range(256)) * 4
+    FakeFTP.cut_after = 300
+    remote.get_file("lib0/0.tgz", tmp_path)
+    assert FakeFTP.rests == [None, 300]
+    assert (tmp_path / "0.tgz").read_bytes() == FakeFTP.files["lib0/0.tgz"]
+    assert not (tmp_path / "0.tgz.part").exists()
+
+
+def test_partial_file_of_previous_run_is_resumed(remote, tmp_path):
+    FakeFTP.files["lib0/0.tgz"] = b"0123456789"
+    (tmp_path / "0.tgz.part").write_bytes(b"0123")
+    remote.get_file("lib0/0.tgz", tmp_path)
+    assert FakeFTP.rests == [4]
+    assert (tmp_path / "0.tgz").read_bytes() == b"0123456789"
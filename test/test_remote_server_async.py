@@ -0,0 +1,103 @@
+"""
+Tests for ``AsyncRemoteDatabaseServer``.
+
+The HTTP layer of ``RemoteDatabaseServer`` is replaced by an in-memory fake so
+the tests exercise the asynchronous orchestration only: catalog
+initialisation, bounded concurrency and the push/pull/delete flow.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+from depmanager.api.internal.database_remote_server_async import (
+    AsyncRemoteDatabaseServer,
+)
+from depmanager.api.internal.dependency import Dependency
+
+
+class FakeServer(RemoteDatabaseServer):
+    """Server remote whose HTTP primitives work in memory."""
+
+    def __init__(self, lines):
+        super().__init__("fake.server")
+        self.catalog = list(lines)
+        self.running = 0
+        self.max_running = 0
+        self.catalog_fetches = 0
+        self.uploads = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        self.connected = True
+        self.valid_shape = True
+
+    def get_dep_list(self):
+        self.catalog_fetches += 1
+        self.deps_from_strings(self.catalog)
+
+    def get_download_url(self, dep):
+        return f"/data/{dep.properties.name}{dep.properties.hash()}.tgz"
+
+    def download(self, url, file_name, callback=None, checksum=None):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        file_name.write_bytes(b"payload")
+        with self.lock:
+            self.running -= 1
+        return True
+
+    def upload(self, dep, file, callback=None):
+        self.uploads.append(dep.properties.name)
+        self.catalog.append(dep.properties.get_as_str())
+        return True
+
+    def remove(self, dep):
+        self.catalog.remove(dep.properties.get_as_str())
+        return True
+
+
+def test_pull_many_is_bounded(tmp_path, dep_line):
+    names = [f"lib{i}" for i in range(8)]
+    server = FakeServer([dep_line(n) for n in names])
+    client = AsyncRemoteDatabaseServer(server, max_concurrency=3)
+
+    async def run():
+        return await asyncio.gather(
+            *[client.pull(Dependency(dep_line(n)), tmp_path) for n in names]
+        )
+
+    files = asyncio.run(run())
+    assert all(f is not None and f.exists() for f in files)
+    assert server.max_running <= 3
+    assert server.max_running > 1
+    assert server.catalog_fetches == 1
+
+
+def test_pull_unknown_package_returns_none(tmp_path, dep_line):
+    client = AsyncRemoteDatabaseServer(FakeServer([dep_line("libfoo")]))
+    assert asyncio.run(client.pull(Dependency(dep_line("nope")), tmp_path)) is None
+
+
+def test_push_then_delete(tmp_path, dep_line):
+    server = FakeServer([])
+    client = AsyncRemoteDatabaseServer(server)
+    archive = tmp_path / "libnew.tgz"
+    archive.write_bytes(b"data")
+    dep = Dependency(dep_line("libnew"))
+
+    async def run():
+        pushed = await client.push(dep, archive)
+        again = await client.push(dep, archive)
+        found = await client.query({"name": "libnew"})
+        deleted = await client.delete(dep)
+        remaining = await client.query({"name": "libnew"})
+        return pushed, again, len(found), deleted, len(remaining)
+
+    assert asyncio.run(run()) == (True, False, 1, True, 0)
+    assert server.uploads == ["libnew"]
@@ -0,0 +1,204 @@
+"""
+Tests for the resumable downloads of ``RemoteDatabaseServer``.
+
+``requests.get`` is replaced by a fake serving an in-memory file, honouring
+``Range`` headers and able to drop the connection in the middle of a body.
+The body is read from the raw stream, as the download path does. Chunked
+uploads go through a fake ``requests.post`` collecting the generated body.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+
+import pytest
+from urllib3.exceptions import ProtocolError
+
+from depmanager.api.internal import database_remote_server
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.streaming import Checksum
+
+PAYLOAD = bytes(range(256)) * 16
+
+
+class FakeResponse:
+    def __init__(self, status_code, body, headers, cut_after=None):
+        self.status_code = status_code
+        self.reason = "fake"
+        self.body = body
+        self.headers = headers
+        self.content = b""
+        self.cut_after = cut_after
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    @property
+    def raw(self):
+        return self
+
+    def readinto(self, buffer):
+        if self.cut_after is not None and self.sent >= self.cut_after:
+            raise ProtocolError("connection dropped")
+        size = min(len(buffer), 1024, len(self.body) - self.sent)
+        buffer[:size] = self.body[self.sent : self.sent + size]
+        self.sent += size
+        return size
+
+
+class FakeHttp:
+    def __init__(self, payload, ranges=True):
+        self.payload = payload
+        self.ranges = ranges
+        self.requests = []
+        self.cuts = []
+
+    def __call__(self, url, auth=None, headers=None, stream=False, timeout=None):
+        requested = (headers or {}).get("Range")
+        self.requests.append(requested)
+        cut = self.cuts.pop(0) if self.cuts else None
+        if requested is None or not self.ranges:
+            return FakeResponse(
+                200, self.payload, {"content-length": str(len(self.payload))}, cut
+            )
+        start = int(requested.split("=")[1].rstrip("-"))
+        if start >= len(self.payload):
+            return FakeResponse(416, b"", {})
+        body = self.payload[start:]
+        headers = {
+            "content-length": str(len(body)),
+            "content-range": f"bytes {start}-{len(self.payload) - 1}/{len(self.payload)}",
+        }
+        return FakeResponse(206, body, headers, cut)
+
+
+@pytest.fixture
+def server():
+    return RemoteDatabaseServer("fake.server")
+
+
+def _use(monkeypatch, fake):
+    monkeypatch.setattr(database_remote_server, "http_get", fake)
+    return fake
+
+
+def test_dropped_download_resumes_with_range(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    fake.cuts = [1024, 2048]
+    target = tmp_path / "pkg.tgz"
+    assert server.download("/data/pkg.tgz", target)
+    assert fake.requests == [None, "bytes=1024-", "bytes=3072-"]
+    assert target.read_bytes() == PAYLOAD
+    assert not (tmp_path / "pkg.tgz.part").exists()
+
+
+def test_partial_file_of_previous_run_is_resumed(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    (tmp_path / "pkg.tgz.part").write_bytes(PAYLOAD[:100])
+    assert server.download("/data/pkg.tgz", tmp_path / "pkg.tgz")
+    assert fake.requests == ["bytes=100-"]
+    assert (tmp_path / "pkg.tgz").read_bytes() == PAYLOAD
+
+
+def test_server_without_ranges_restarts(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD, ranges=False))
+    fake.cuts = [1024]
+    assert server.download("/data/pkg.tgz", tmp_path / "pkg.tgz")
+    assert (tmp_path / "pkg.tgz").read_bytes() == PAYLOAD
+
+
+def test_oversized_partial_file_is_discarded(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    (tmp_path / "pkg.tgz.part").write_bytes(PAYLOAD + b"garbage")
+    assert server.download("/data/pkg.tgz", tmp_path / "pkg.tgz")
+    assert fake.requests == [f"bytes={len(PAYLOAD) + 7}-", None]
+    assert (tmp_path / "pkg.tgz").read_bytes() == PAYLOAD
+
+
+def test_gives_up_after_repeated_drops(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    fake.cuts = [0] * 10
+    assert not server.download("/data/pkg.tgz", tmp_path / "pkg.tgz")
+    assert len(fake.requests) == database_remote_server.download_attempts
+    assert not (tmp_path / "pkg.tgz").exists()
+
+
+def test_stream_writes_the_whole_body(server, monkeypatch):
+    _use(monkeypatch, FakeHttp(PAYLOAD))
+    monkeypatch.setattr(server, "connect", lambda: None)
+    monkeypatch.setattr(server, "get_download_url", lambda dep: "/data/pkg.tgz")
+    sink = io.BytesIO()
+    assert server.stream(None, sink)
+    assert sink.getvalue() == PAYLOAD
+
+
+def test_interrupted_stream_is_a_failure(server, monkeypatch):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    fake.cuts = [1024]
+    monkeypatch.setattr(server, "connect", lambda: None)
+    monkeypatch.setattr(server, "get_download_url", lambda dep: "/data/pkg.tgz")
+    assert not server.stream(None, io.BytesIO())
+    assert fake.requests == [None]
+
+
+def test_checksum_spans_resumed_parts(server, monkeypatch, tmp_path):
+    fake = _use(monkeypatch, FakeHttp(PAYLOAD))
+    fake.cuts = [1024]
+    (tmp_path / "pkg.tgz.part").write_bytes(PAYLOAD[:100])
+    checksum = Checksum()
+    assert server.download("/data/pkg.tgz", tmp_path / "pkg.tgz", None, checksum)
+    assert checksum.size == len(PAYLOAD)
+    assert checksum.hexdigest() == hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class Source(io.BytesIO):
+    """Archive stream with the checksum of the data read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.checksum = Checksum()
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.checksum.write(data)
+        return data
+
+
+class FakePost:
+    def __init__(self):
+        self.body = b""
+        self.headers = {}
+
+    def __call__(self, url, auth=None, data=None, headers=None, timeout=None):
+        self.url = url
+        self.headers = headers
+        self.body = b"".join(data)
+        return FakeResponse(200, b"", {})
+
+
+def test_chunked_upload_sends_checksum_after_archive(monkeypatch, dep_line):
+    fake = FakePost()
+    monkeypatch.setattr(database_remote_server, "http_post", fake)
+    remote = RemoteDatabaseServer("fake.server", chunked_upload=True)
+    remote.server_api_version = "2.1.0"
+    dep = Dependency(dep_line("liba"))
+    source = Source(PAYLOAD)
+    assert remote.streaming_push
+    assert remote.send_stream(dep, source)
+    digest = hashlib.sha256(PAYLOAD).hexdigest()
+    assert fake.url.endswith("/upload")
+    boundary = fake.headers["Content-Type"].split("boundary=")[1]
+    parts = fake.body.split(f"--{boundary}".encode())
+    names = [part.split(b'name="')[1].split(b'"')[0] for part in parts[1:-1]]
+    assert names.index(b"package") < names.index(b"sha256")
+    assert PAYLOAD in parts[names.index(b"package") + 1]
+    assert digest.encode() in parts[names.index(b"sha256") + 1]
+    assert parts[-1] == b"--\r\n"
+    assert dep.sha256 == digest
+    assert dep.size == len(PAYLOAD)
@@ -0,0 +1,64 @@
+"""
+Tests for the persisted latency and throughput of the remotes.
+"""
+
+from __future__ import annotations
+
+import json
+
+from depmanager.api.internal.remote_stats import RemoteStats, min_measured_size
+
+
+def test_measures_are_averaged_and_persisted(tmp_path):
+    file = tmp_path / "remote_stats.json"
+    stats = RemoteStats(file)
+    stats.record_latency("mirror", 1.0)
+    stats.record_latency("mirror", 2.0)
+    stats.record_transfer("mirror", 4 * min_measured_size, 2.0)
+    stats.save()
+    entry = json.loads(file.read_text())["mirror"]
+    assert 1.0 < entry["latency"] < 2.0
+    assert entry["throughput"] == 2 * min_measured_size
+    assert RemoteStats(file).remotes == stats.remotes
+
+
+def test_small_transfers_do_not_tell_the_throughput(tmp_path):
+    stats = RemoteStats(tmp_path / "remote_stats.json")
+    stats.record_transfer("mirror", 1024, 0.001)
+    assert stats.remotes == {}
+    stats.save()
+    assert not (tmp_path / "remote_stats.json").exists()
+
+
+def test_fastest_remotes_first(tmp_path):
+    stats = RemoteStats(tmp_path / "remote_stats.json")
+    stats.record_latency("near", 0.01)
+    stats.record_latency("far", 0.5)
+    stats.record_latency("slow", 0.01)
+    stats.record_transfer("slow", 10 * min_measured_size, 100.0)
+    names = ["default", "slow", "far", "near", "unknown"]
+    assert stats.order(names) == ["near", "far", "slow", "default", "unknown"]
+
+
+def test_damaged_file_is_ignored(tmp_path):
+    (tmp_path / "remote_stats.json").write_text("{not json")
+    assert RemoteStats(tmp_path / "remote_stats.json").remotes == {}
+
+
+def test_default_remote_stays_first(tmp_edm_home, tmp_path):
+    from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+    from depmanager.api.internal.system import LocalSystem
+
+    system = LocalSystem()
+    system.remote_database = {
+        name: RemoteDatabaseFolder(str(tmp_path / name))
+        for name in ["main", "far", "near"]
+    }
+    system.default_remote = "main"
+    system.remote_stats.record_latency("near", 0.01)
+    system.remote_stats.record_latency("far", 0.5)
+    # the configuration order unless asked otherwise.
+    assert system.get_source_list() == ["local", "main", "far", "near"]
+    system.remote_order = "speed"
+    assert system.get_source_list() == ["local", "main", "near", "far"]
+    system.release()
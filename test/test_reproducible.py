@@ -0,0 +1,116 @@
+"""
+Tests for the reproducible archives and the content hash skipping pushes.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import tarfile
+from zipfile import ZipFile
+
+from depmanager.api.internal.database_local import LocalDatabase
+from depmanager.api.internal.database_remote_folder import RemoteDatabaseFolder
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.reproducible import tree_hash
+from depmanager.api.internal.streaming import StreamPacker, copy_stream
+
+
+def _tree(folder, mtime: int = 1700000000):
+    (folder / "lib").mkdir(parents=True, exist_ok=True)
+    (folder / "include").mkdir(exist_ok=True)
+    (folder / "info.yaml").write_text("name: pack\n")
+    (folder / "lib" / "libpack.a").write_bytes(bytes(range(256)) * 100)
+    (folder / "include" / "pack.h").write_text("#pragma once\n")
+    for path in folder.rglob("*"):
+        os.utime(path, (mtime, mtime))
+    return folder
+
+
+def _packed(folder, mtime=None):
+    packer = StreamPacker(folder, mtime=mtime)
+    packer.start()
+    target = io.BytesIO()
+    copy_stream(packer, target)
+    assert packer.finish(True)
+    return target.getvalue()
+
+
+def test_packing_is_reproducible(tmp_path):
+    first = _packed(_tree(tmp_path / "one", 1700000000), 1234)
+    # same files, other mtimes, other creation order.
+    (tmp_path / "two" / "include").mkdir(parents=True)
+    (tmp_path / "two" / "include" / "pack.h").write_text("#pragma once\n")
+    second = _packed(_tree(tmp_path / "two", 1800000000), 1234)
+    assert first == second
+    with tarfile.open(fileobj=io.BytesIO(first), mode="r:gz") as archive:
+        members = archive.getmembers()
+    assert [member.name for member in members] == [
+        "include/pack.h",
+        "info.yaml",
+        "lib/libpack.a",
+    ]
+    assert {(m.mtime, m.uid, m.gid, m.uname, m.mode) for m in members} == {
+        (1234, 0, 0, "", 0o644)
+    }
+
+
+def test_local_packs_are_reproducible(make_package, tmp_edm_home, tmp_path):
+    folder = make_package("pack")
+    (folder / "lib").mkdir()
+    (folder / "lib" / "libpack.a").write_bytes(bytes(range(256)) * 100)
+    database = LocalDatabase(tmp_edm_home / "data")
+    for archive_format in ["tgz", "zip"]:
+        database.pack({"name": "pack"}, tmp_path / "a", archive_format)
+        os.utime(folder / "lib" / "libpack.a", (0, 0))
+        database.pack({"name": "pack"}, tmp_path / "b", archive_format)
+        name = f"{folder.name}.{archive_format}"
+        first = (tmp_path / "a" / name).read_bytes()
+        assert first == (tmp_path / "b" / name).read_bytes()
+    with ZipFile(tmp_path / "a" / f"{folder.name}.zip") as archive:
+        assert archive.namelist() == ["info.yaml", "lib/libpack.a"]
+
+
+def test_content_hash_ignores_the_metadata(tmp_path):
+    tree = _tree(tmp_path / "pack")
+    reference = tree_hash(tree)
+    (tree / "info.yaml").write_text("name: pack\nbuild_date: tomorrow\n")
+    os.utime(tree / "lib" / "libpack.a", (0, 0))
+    assert tree_hash(tree) == reference
+    os.chmod(tree / "lib" / "libpack.a", 0o755)
+    assert tree_hash(tree) != reference
+    os.chmod(tree / "lib" / "libpack.a", 0o644)
+    (tree / "include" / "pack.h").write_text("#pragma twice\n")
+    assert tree_hash(tree) != reference
+
+
+def test_content_is_kept_in_the_catalog(tmp_path, dep_line):
+    dep = Dependency(dep_line("pack"))
+    dep.content = "ab" * 32
+    line = RemoteDatabaseFolder.dep_to_string(dep)
+    assert line.endswith(f" | deps: [] # content: {dep.content}")
+    assert Dependency(line).content == dep.content
+    assert Dependency(line).properties == dep.properties
+
+
+def test_identical_content_is_not_pushed_again(tmp_path, dep_line):
+    remote = RemoteDatabaseFolder(str(tmp_path / "remote"))
+    tree = _tree(tmp_path / "pack")
+    built = Dependency(dep_line("pack"))
+    assert [dep.properties.name for dep in remote.push_batch([(built, tree)])] == [
+        "pack"
+    ]
+    assert built.content == tree_hash(tree)
+    # rebuilt later with the same result: nothing to upload.
+    rebuilt = Dependency(dep_line("pack", build_date="2025-01-01T00:00:00+00:00"))
+    assert remote.holds(Dependency(dep_line("pack"))) is False
+    rebuilt.content = built.content
+    assert remote.holds(rebuilt)
+    assert remote.push_batch([(rebuilt, tree)]) == []
+    # same files, other dependencies: a different package.
+    rebuilt.properties.dependencies = [{"name": "base", "version": "1.0.0"}]
+    assert not remote.holds(rebuilt)
+    rebuilt.properties.dependencies = []
+    (tree / "include" / "pack.h").write_text("#pragma twice\n")
+    rebuilt.content = tree_hash(tree)
+    assert not remote.holds(rebuilt)
@@ -0,0 +1,156 @@
+"""
+Tests for the retries and the circuit breaker of remote operations.
+
+``requests`` is replaced by a fake answering from a scripted list of status
+codes (or exceptions), so the tests count the requests a remote sends.
+"""
+
+from __future__ import annotations
+
+import pytest
+from requests import ConnectionError as HttpConnectionError
+
+from depmanager.api.internal import database_remote_server, resilience
+from depmanager.api.internal.database_remote_server import RemoteDatabaseServer
+from depmanager.api.internal.resilience import (
+    CircuitBreaker,
+    RemoteUnavailable,
+    backoff_delay,
+    parse_retries,
+    parse_timeout,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, text=""):
+        self.status_code = status_code
+        self.reason = "fake"
+        self.text = text
+        self.content = text.encode()
+
+    def close(self):
+        pass
+
+
+class ScriptedHttp:
+    """Answer each request with the next scripted status or exception."""
+
+    def __init__(self, script, default=200, text=""):
+        self.script = list(script)
+        self.default = default
+        self.text = text
+        self.calls = []
+
+    def __call__(self, url, **kwargs):
+        self.calls.append((url, kwargs))
+        answer = self.script.pop(0) if self.script else self.default
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer, self.text if answer == 200 else "")
+
+
+@pytest.fixture(autouse=True)
+def no_delay(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_base", 0.0)
+
+
+def _use(monkeypatch, get=None, post=None):
+    monkeypatch.setattr(database_remote_server, "http_get", get or ScriptedHttp([]))
+    version = ScriptedHttp([], text="version: 1.0\napi_version: 2.1.0")
+    monkeypatch.setattr(database_remote_server, "http_post", post or version)
+
+
+def test_backoff_is_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_base", 1.0)
+    monkeypatch.setattr(resilience, "backoff_max", 4.0)
+    delays = [backoff_delay(attempt) for attempt in range(1, 6) for _ in range(50)]
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert max(backoff_delay(1) for _ in range(50)) <= 1.0
+
+
+def test_timeout_configuration():
+    assert parse_timeout(5) == (5.0, 5.0)
+    assert parse_timeout([3, 120]) == (3.0, 120.0)
+    assert parse_timeout("soon") is None
+    assert parse_timeout(0) is None
+    assert parse_timeout([3, -1]) is None
+    assert parse_timeout("nan") is None
+    remote = RemoteDatabaseServer("fake.server")
+    remote.apply_resilience({"timeout": [2, 30], "retries": 0})
+    assert remote.timeout == (2.0, 30.0)
+    assert remote.attempts == 1
+
+
+def test_invalid_retries_are_ignored():
+    assert parse_retries(2) == 2
+    assert parse_retries("3") == 3
+    for value in ["three", None, -1, 2.5, True]:
+        assert parse_retries(value) is None
+    remote = RemoteDatabaseServer("fake.server")
+    attempts = remote.attempts
+    remote.apply_resilience({"retries": "three"})
+    remote.apply_resilience({"retries": None})
+    assert remote.attempts == attempts
+
+
+def test_breaker_opens_then_lets_one_probe(monkeypatch):
+    breaker = CircuitBreaker("remote", threshold=2, cooldown=10.0)
+    clock = [100.0]
+    monkeypatch.setattr(resilience, "monotonic", lambda: clock[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open() and not breaker.allow()
+    clock[0] += 11.0
+    assert breaker.allow()
+    # the probe is running: other callers are still refused.
+    assert not breaker.allow()
+    breaker.record_success()
+    assert not breaker.is_open() and breaker.allow()
+
+
+def test_transient_error_is_retried(monkeypatch):
+    get = ScriptedHttp([502, 503])
+    _use(monkeypatch, get=get)
+    remote = RemoteDatabaseServer("fake.server")
+    assert len(remote.query()) == 0
+    assert remote.valid_shape
+    assert len(get.calls) == 3
+    assert get.calls[0][1]["timeout"] == remote.timeout
+
+
+def test_upload_is_not_retried(monkeypatch):
+    post = ScriptedHttp([502])
+    _use(monkeypatch, post=post)
+    remote = RemoteDatabaseServer("fake.server")
+    resp = remote.request(
+        database_remote_server.http_post, "http://fake.server/upload", False
+    )
+    assert resp.status_code == 502
+    assert len(post.calls) == 1
+
+
+def test_failed_catalog_is_fetched_again_on_next_use(monkeypatch):
+    get = ScriptedHttp([502] * 3)
+    _use(monkeypatch, get=get)
+    remote = RemoteDatabaseServer("fake.server")
+    remote.breaker.threshold = 10
+    assert remote.query() == []
+    assert not remote.valid_shape
+    remote.query()
+    assert remote.valid_shape
+    assert len(get.calls) == 4
+
+
+def test_remote_down_is_skipped(monkeypatch):
+    post = ScriptedHttp([], default=HttpConnectionError("refused"))
+    _use(monkeypatch, post=post)
+    remote = RemoteDatabaseServer("fake.server")
+    assert remote.query() == []
+    assert len(post.calls) == remote.attempts
+    assert remote.breaker.is_open()
+    for _ in range(5):
+        assert remote.query() == []
+    assert len(post.calls) == remote.attempts
+    with pytest.raises(RemoteUnavailable):
+        remote.request(database_remote_server.http_get, "http://fake.server/api")
@@ -0,0 +1,63 @@
+"""
+Tests for the start of the command line: what it loads and writes.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+
+def test_info_loads_only_what_it_needs(tmp_edm_home):
+    env = dict(os.environ, DEPMANAGER_NO_DAEMON="1")
+    command = [sys.executable, "-m", "depmanager.manager", "info", "--raw", "basedir"]
+    # the first run warns that there is no configuration yet.
+    subprocess.run(command, env=env, capture_output=True, check=True)
+    result = subprocess.run(
+        command[:1] + ["-X", "importtime"] + command[1:],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == str(tmp_edm_home / ".edm")
+    modules = {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+    for heavy in [
+        "rich",
+        "requests",
+        "cryptography",
+        "ftplib",
+        "depmanager.command.build",
+        "depmanager.api.internal.database_local",
+    ]:
+        assert heavy not in modules
+
+
+def test_unchanged_configuration_is_not_written(tmp_edm_home):
+    from depmanager.api.internal.system import LocalSystem
+
+    system = LocalSystem(shared=True)
+    written = system.file.stat().st_mtime_ns
+    system.release()
+    system = LocalSystem(shared=True)
+    assert system.file.stat().st_mtime_ns == written
+    # no password to decrypt: no key is created.
+    assert not (system.base_path / ".key").exists()
+    system.release()
+
+
+def test_import_leaves_the_root_logger_alone():
+    code = (
+        "import logging, sys\n"
+        "from depmanager.api.internal import dependency\n"
+        "assert logging.getLogger().handlers == []\n"
+        "assert logging.getLogger('depmanager').handlers != []\n"
+        "assert 'depmanager.api.internal.machine' not in sys.modules\n"
+        "assert dependency.mac is dependency.local_machine()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,173 @@
+"""
+Tests for the buffered stream copy, compression and extraction used by
+transfers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import tarfile
+
+from depmanager.api.internal import streaming
+from depmanager.api.internal.streaming import (
+    StreamExtractor,
+    StreamPacker,
+    ThrottledCallback,
+    copy_file,
+    copy_stream,
+)
+
+
+class ReadOnly:
+    """Stream without ``readinto``."""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size):
+        return self.stream.read(size)
+
+
+def test_copy_through_readinto(monkeypatch):
+    monkeypatch.setattr(streaming, "stream_buffer_size", 1000)
+    data = bytes(range(256)) * 20
+    target = io.BytesIO()
+    assert copy_stream(io.BytesIO(data), target) == len(data)
+    assert target.getvalue() == data
+
+
+def test_copy_through_read():
+    data = b"payload" * 1000
+    target = io.BytesIO()
+    assert copy_stream(ReadOnly(data), target) == len(data)
+    assert target.getvalue() == data
+
+
+def test_progress_is_throttled_and_complete(monkeypatch):
+    monkeypatch.setattr(streaming, "stream_buffer_size", 10)
+    reports = []
+    copy_stream(
+        io.BytesIO(b"x" * 1000),
+        io.BytesIO(),
+        lambda advance, total: reports.append((advance, total)),
+        1000,
+    )
+    # a fast copy fits in one interval: a single report on flush.
+    assert reports == [(1000, 1000)]
+
+
+def test_throttled_callback_reports_after_interval():
+    reports = []
+    progress = ThrottledCallback(lambda a, t: reports.append(a), 10, interval=0.0)
+    progress(3)
+    progress(4)
+    progress.flush()
+    assert reports == [3, 4]
+
+
+def _tgz(files: dict) -> bytes:
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return data.getvalue()
+
+
+def test_extractor_unpacks_streamed_archive(monkeypatch, tmp_path):
+    monkeypatch.setattr(streaming, "stream_buffer_size", 4096)
+    payload = bytes(range(256)) * 1000
+    data = _tgz({"edp.info": b"name: lib", "lib/liblib.a": payload})
+    extractor = StreamExtractor(tmp_path / "out")
+    extractor.start()
+    copy_stream(io.BytesIO(data), extractor)
+    assert extractor.finish()
+    assert (tmp_path / "out" / "edp.info").read_bytes() == b"name: lib"
+    assert (tmp_path / "out" / "lib" / "liblib.a").read_bytes() == payload
+
+
+def test_extractor_reports_corrupt_stream(tmp_path):
+    extractor = StreamExtractor(tmp_path / "out")
+    extractor.start()
+    failed = False
+    try:
+        # larger than the pipe: the writer must not block once extraction failed.
+        for _ in range(64):
+            extractor.write(b"garbage!" * 8192)
+    except BrokenPipeError:
+        failed = True
+    assert not extractor.finish(True)
+    assert failed
+    assert extractor.error is not None
+
+
+def test_extractor_fails_on_interrupted_transfer(tmp_path):
+    data = _tgz({"edp.info": b"name: lib"})
+    extractor = StreamExtractor(tmp_path / "out")
+    extractor.start()
+    extractor.write(data)
+    assert not extractor.finish(False)
+
+
+def test_copy_file_can_link(tmp_path):
+    source = tmp_path / "a.tgz"
+    source.write_bytes(b"archive")
+    assert copy_file(source, tmp_path / "b.tgz", link=True) == "link"
+    assert (tmp_path / "b.tgz").stat().st_ino == source.stat().st_ino
+
+
+def test_copy_file_without_link_makes_a_copy(tmp_path):
+    source = tmp_path / "a.tgz"
+    source.write_bytes(bytes(range(256)) * 4096)
+    method = copy_file(source, tmp_path / "b.tgz")
+    assert method in ["reflink", "copy_file_range", "copy"]
+    assert (tmp_path / "b.tgz").read_bytes() == source.read_bytes()
+    assert (tmp_path / "b.tgz").stat().st_ino != source.stat().st_ino
+
+
+def test_packer_produces_the_archive_and_its_checksum(tmp_path):
+    (tmp_path / "pkg" / "lib").mkdir(parents=True)
+    (tmp_path / "pkg" / "edp.info").write_bytes(b"name: lib")
+    (tmp_path / "pkg" / "lib" / "liba.a").write_bytes(bytes(range(256)) * 4096)
+    packer = StreamPacker(tmp_path / "pkg")
+    packer.start()
+    target = io.BytesIO()
+    copy_stream(packer, target)
+    assert packer.finish(True)
+    data = target.getvalue()
+    assert packer.checksum.size == len(data)
+    assert packer.checksum.hexdigest() == hashlib.sha256(data).hexdigest()
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as archive:
+        assert sorted(archive.getnames()) == ["edp.info", "lib/liba.a"]
+        assert archive.extractfile("lib/liba.a").read() == bytes(range(256)) * 4096
+
+
+def test_packer_error_is_not_a_complete_archive(tmp_path, monkeypatch):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "edp.info").write_bytes(b"name: lib")
+
+    def broken_add(*args, **kwargs):
+        raise PermissionError("unreadable")
+
+    monkeypatch.setattr(tarfile.TarFile, "addfile", broken_add)
+    packer = StreamPacker(tmp_path / "pkg")
+    packer.start()
+    failed = False
+    try:
+        copy_stream(packer, io.BytesIO())
+    except OSError:
+        failed = True
+    assert failed
+    assert not packer.finish(True)
+
+
+def test_aborted_upload_stops_the_packer(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "big.bin").write_bytes(os.urandom(8 * 1024 * 1024))
+    packer = StreamPacker(tmp_path / "pkg")
+    packer.start()
+    packer.read(1024)
+    assert not packer.finish(False)
@@ -0,0 +1,228 @@
+"""
+Tests for the ``TransferManager`` scheduler.
+
+Remotes are in-memory fakes implementing the transfer contract (``fetch``,
+``send_package``, ``archive_size``, ``max_transfers``) and recording the
+order and the concurrency of the transfers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+
+from depmanager.api.internal.dependency import Dependency
+from depmanager.api.internal.transfer import (
+    TransferManager,
+    fetch_verified,
+    integrity_attempts,
+    race_fetch,
+)
+
+
+class FakeRemote:
+    def __init__(self, sizes: dict, max_transfers: int = 1, delay: float = 0.0):
+        self.sizes = sizes
+        self.max_transfers = max_transfers
+        self.delay = delay
+        self.valid_shape = True
+        self.order = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def archive_size(self, dep):
+        return self.sizes.get(dep.properties.name, 0)
+
+    def _transfer(self, name, callback):
+        with self.lock:
+            self.order.append(name)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        size = self.sizes.get(name, 10)
+        if callback:
+            callback(size // 2, size)
+            callback(size - size // 2, size)
+        with self.lock:
+            self.running -= 1
+
+    def fetch(self, dep, destination, callback=None, checksum=None):
+        name = dep.properties.name
+        self._transfer(name, callback)
+        file = destination / f"{name}.tgz"
+        file.write_bytes(b"x" * self.sizes.get(name, 10))
+        return file
+
+    def send_package(self, dep, file, callback=None):
+        self._transfer(dep.properties.name, callback)
+        return True
+
+
+def test_largest_transfers_start_first(tmp_path, dep_line):
+    remote = FakeRemote({"small": 10, "big": 1000, "medium": 100})
+    manager = TransferManager(show_progress=False)
+    for name in ["small", "big", "medium"]:
+        manager.add_pull(remote, Dependency(dep_line(name)), tmp_path)
+    manager.run()
+    assert remote.order == ["big", "medium", "small"]
+
+
+def test_concurrency_is_limited_per_remote(tmp_path, dep_line):
+    fast = FakeRemote({}, max_transfers=3, delay=0.05)
+    slow = FakeRemote({}, max_transfers=1, delay=0.05)
+    manager = TransferManager(show_progress=False)
+    for i in range(9):
+        manager.add_pull(fast, Dependency(dep_line(f"fast{i}")), tmp_path)
+    for i in range(3):
+        manager.add_pull(slow, Dependency(dep_line(f"slow{i}")), tmp_path)
+    start = time.monotonic()
+    transfers = manager.run()
+    elapsed = time.monotonic() - start
+    assert all(transfer.success for transfer in transfers)
+    assert 1 < fast.max_running <= 3
+    assert slow.max_running == 1
+    # both remotes run side by side: about 3 delays, not 6.
+    assert elapsed < 0.25
+
+
+def test_statistics_are_recorded(tmp_path, dep_line):
+    remote = FakeRemote({"lib": 4096})
+    archive = tmp_path / "lib.tgz"
+    archive.write_bytes(b"x" * 4096)
+    manager = TransferManager(show_progress=False)
+    manager.add_push(remote, Dependency(dep_line("lib")), archive)
+    manager.add_pull(remote, Dependency(dep_line("other")), tmp_path)
+    manager.run()
+    stats = {stat["kind"]: stat for stat in manager.stats()}
+    assert stats["push"]["bytes"] == 4096
+    assert stats["push"]["success"]
+    assert stats["pull"]["bytes"] == 10
+    assert stats["pull"]["duration"] > 0
+    assert stats["pull"]["throughput"] > 0
+
+
+def test_broken_remote_skips_remaining_transfers(tmp_path, dep_line):
+    remote = FakeRemote({})
+    remote.valid_shape = False
+    manager = TransferManager(show_progress=False)
+    transfer = manager.add_pull(remote, Dependency(dep_line("lib")), tmp_path)
+    manager.run()
+    assert not transfer.success
+    assert remote.order == []
+
+
+class CorruptingRemote(FakeRemote):
+    """Remote sending a damaged archive a given number of times."""
+
+    def __init__(self, payload: bytes, corrupted: int):
+        super().__init__({})
+        self.payload = payload
+        self.corrupted = corrupted
+        self.fetches = 0
+
+    def fetch(self, dep, destination, callback=None, checksum=None):
+        self.fetches += 1
+        data = self.payload
+        if self.fetches <= self.corrupted:
+            data = b"\0" + data[1:]
+        file = destination / "lib.tgz"
+        file.write_bytes(data)
+        if checksum is not None:
+            checksum.write(data)
+        return file
+
+
+def _checked_dep(line: str, payload: bytes):
+    dep = Dependency(line)
+    dep.sha256 = hashlib.sha256(payload).hexdigest()
+    dep.size = len(payload)
+    return dep
+
+
+def test_corrupted_download_is_retried(tmp_path, dep_line):
+    remote = CorruptingRemote(b"archive" * 100, corrupted=1)
+    file = fetch_verified(
+        remote, _checked_dep(dep_line("lib"), remote.payload), tmp_path
+    )
+    assert remote.fetches == 2
+    assert file.read_bytes() == remote.payload
+
+
+def test_always_corrupted_download_fails(tmp_path, dep_line):
+    remote = CorruptingRemote(b"archive" * 100, corrupted=100)
+    assert (
+        fetch_verified(remote, _checked_dep(dep_line("lib"), remote.payload), tmp_path)
+        is None
+    )
+    assert remote.fetches == integrity_attempts
+    assert list(tmp_path.iterdir()) == []
+
+
+class MirrorRemote(FakeRemote):
+    """Remote sending an archive by chunks, at a given pace."""
+
+    def __init__(self, payload: bytes, delay: float, fails: bool = False):
+        super().__init__({})
+        self.destination = f"mirror-{delay}"
+        self.payload = payload
+        self.delay = delay
+        self.fails = fails
+        self.cancelled = False
+
+    def fetch(self, dep, destination, callback=None, checksum=None):
+        destination.mkdir(parents=True, exist_ok=True)
+        file = destination / "lib.tgz"
+        with open(file, "wb") as fp:
+            for start in range(0, len(self.payload), 100):
+                time.sleep(self.delay)
+                if self.fails:
+                    return None
+                chunk = self.payload[start : start + 100]
+                fp.write(chunk)
+                if checksum is not None:
+                    checksum.write(chunk)
+                try:
+                    callback(len(chunk), len(self.payload))
+                except Exception:
+                    self.cancelled = True
+                    raise
+        return file
+
+
+def test_race_keeps_the_fastest_mirror(tmp_path, dep_line):
+    payload = b"archive" * 100
+    fast = MirrorRemote(payload, 0.001)
+    slow = MirrorRemote(payload, 0.05)
+    reports = []
+    file, remote, dep = race_fetch(
+        [
+            (slow, _checked_dep(dep_line("lib"), payload)),
+            (fast, _checked_dep(dep_line("lib"), payload)),
+        ],
+        tmp_path,
+        lambda advance, total: reports.append(advance),
+    )
+    assert remote is fast
+    assert file.read_bytes() == payload
+    assert slow.cancelled
+    assert sum(reports) == len(payload)
+    assert [path.name for path in tmp_path.iterdir()] == ["lib.tgz"]
+
+
+def test_race_survives_a_failing_mirror(tmp_path, dep_line):
+    payload = b"archive" * 100
+    broken = MirrorRemote(payload, 0.0, fails=True)
+    slow = MirrorRemote(payload, 0.01)
+    manager = TransferManager(show_progress=False)
+    transfer = manager.add_race(
+        broken,
+        _checked_dep(dep_line("lib"), payload),
+        tmp_path,
+        [(slow, _checked_dep(dep_line("lib"), payload))],
+    )
+    manager.run()
+    assert transfer.success
+    assert transfer.remote is slow
+    assert transfer.result.read_bytes() == payload